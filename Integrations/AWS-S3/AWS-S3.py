@@ -3,10 +3,13 @@ from CommonServerPython import *
 from CommonServerUserPython import *
 
 import boto3
-import io
 import math
 import json
+import time
+import calendar
+import hashlib
 from datetime import datetime, date
+from boto3.s3.transfer import TransferConfig
 from botocore.config import Config
 from botocore.parsers import ResponseParserError
 import urllib3.util
@@ -31,11 +34,69 @@ config = Config(
     ),
     proxies=proxies
 )
+# multipart transfers are streamed straight from and to disk, with the parts sent in parallel
+TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024,
+    multipart_chunksize=8 * 1024 * 1024,
+    max_concurrency=10,
+    use_threads=True
+)
+# assumed role credentials are reused until this many seconds before they expire
+ROLE_CREDENTIALS_EXPIRY_MARGIN = 5 * 60
 
 
 """HELPER FUNCTIONS"""
 
 
+def get_role_credentials_cache_key(assume_role_kwargs, aws_access_key_id=None):
+    """
+    Returns the key of assumed role credentials in the integration context - the role ARN and session name, and a hash
+    of the access key and the rest of the role assumption arguments, so the access key is not kept in the context.
+    """
+    other_kwargs = {key: value for key, value in assume_role_kwargs.items()
+                    if key not in ('RoleArn', 'RoleSessionName')}
+    digest = hashlib.sha256(json.dumps([aws_access_key_id, other_kwargs], sort_keys=True).encode('utf-8'))
+    return '{}|{}|{}'.format(assume_role_kwargs.get('RoleArn'), assume_role_kwargs.get('RoleSessionName'),
+                             digest.hexdigest())
+
+
+def get_role_credentials(assume_role_kwargs, aws_access_key_id=None, aws_secret_access_key=None):
+    """
+    Assumes the role, or returns credentials of a previous assumption of it which are not about to expire.
+    Credentials are kept in the integration context, so they are shared between command runs.
+    """
+    cache_key = get_role_credentials_cache_key(assume_role_kwargs, aws_access_key_id)
+    now = time.time()
+    integration_context = demisto.getIntegrationContext() or {}
+    cached_credentials = integration_context.get('role_credentials') or {}
+    cached = cached_credentials.get(cache_key)
+    if cached and cached['expiration'] - ROLE_CREDENTIALS_EXPIRY_MARGIN > now:
+        return cached['credentials']
+
+    sts_client = boto3.client(
+        service_name='sts',
+        aws_access_key_id=aws_access_key_id,
+        aws_secret_access_key=aws_secret_access_key,
+        verify=VERIFY_CERTIFICATE,
+        config=config
+    )
+    sts_response = sts_client.assume_role(**assume_role_kwargs)
+    credentials = {
+        'AccessKeyId': sts_response['Credentials']['AccessKeyId'],
+        'SecretAccessKey': sts_response['Credentials']['SecretAccessKey'],
+        'SessionToken': sts_response['Credentials']['SessionToken']
+    }
+    cached_credentials = {key: value for key, value in cached_credentials.items()
+                          if value['expiration'] - ROLE_CREDENTIALS_EXPIRY_MARGIN > now}
+    cached_credentials[cache_key] = {
+        'credentials': credentials,
+        'expiration': calendar.timegm(sts_response['Credentials']['Expiration'].utctimetuple())
+    }
+    integration_context['role_credentials'] = cached_credentials
+    demisto.setIntegrationContext(integration_context)
+    return credentials
+
+
 def aws_session(service='s3', region=None, roleArn=None, roleSessionName=None, roleSessionDuration=None,
                 rolePolicy=None):
     kwargs = {}
@@ -60,71 +121,40 @@ def aws_session(service='s3', region=None, roleArn=None, roleSessionName=None, r
     elif AWS_ROLE_POLICY is not None:
         kwargs.update({'Policy': AWS_ROLE_POLICY})
     if kwargs and AWS_ACCESS_KEY_ID is None:
-
-        if AWS_ACCESS_KEY_ID is None:
-            sts_client = boto3.client('sts', config=config, verify=VERIFY_CERTIFICATE)
-            sts_response = sts_client.assume_role(**kwargs)
-            if region is not None:
-                client = boto3.client(
-                    service_name=service,
-                    region_name=region,
-                    aws_access_key_id=sts_response['Credentials']['AccessKeyId'],
-                    aws_secret_access_key=sts_response['Credentials']['SecretAccessKey'],
-                    aws_session_token=sts_response['Credentials']['SessionToken'],
-                    verify=VERIFY_CERTIFICATE,
-                    config=config
-                )
-            else:
-                client = boto3.client(
-                    service_name=service,
-                    region_name=AWS_DEFAULT_REGION,
-                    aws_access_key_id=sts_response['Credentials']['AccessKeyId'],
-                    aws_secret_access_key=sts_response['Credentials']['SecretAccessKey'],
-                    aws_session_token=sts_response['Credentials']['SessionToken'],
-                    verify=VERIFY_CERTIFICATE,
-                    config=config
-                )
-    elif AWS_ACCESS_KEY_ID and AWS_ROLE_ARN:
-        sts_client = boto3.client(
-            service_name='sts',
-            aws_access_key_id=AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
+        credentials = get_role_credentials(kwargs)
+        client = boto3.client(
+            service_name=service,
+            region_name=region if region is not None else AWS_DEFAULT_REGION,
+            aws_access_key_id=credentials['AccessKeyId'],
+            aws_secret_access_key=credentials['SecretAccessKey'],
+            aws_session_token=credentials['SessionToken'],
             verify=VERIFY_CERTIFICATE,
             config=config
         )
+    elif AWS_ACCESS_KEY_ID and AWS_ROLE_ARN:
         kwargs.update({
             'RoleArn': AWS_ROLE_ARN,
             'RoleSessionName': AWS_ROLE_SESSION_NAME,
         })
-        sts_response = sts_client.assume_role(**kwargs)
+        credentials = get_role_credentials(kwargs, AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY)
         client = boto3.client(
             service_name=service,
             region_name=AWS_DEFAULT_REGION,
-            aws_access_key_id=sts_response['Credentials']['AccessKeyId'],
-            aws_secret_access_key=sts_response['Credentials']['SecretAccessKey'],
-            aws_session_token=sts_response['Credentials']['SessionToken'],
+            aws_access_key_id=credentials['AccessKeyId'],
+            aws_secret_access_key=credentials['SecretAccessKey'],
+            aws_session_token=credentials['SessionToken'],
             verify=VERIFY_CERTIFICATE,
             config=config
         )
     else:
-        if region is not None:
-            client = boto3.client(
-                service_name=service,
-                region_name=region,
-                aws_access_key_id=AWS_ACCESS_KEY_ID,
-                aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-                verify=VERIFY_CERTIFICATE,
-                config=config
-            )
-        else:
-            client = boto3.client(
-                service_name=service,
-                region_name=AWS_DEFAULT_REGION,
-                aws_access_key_id=AWS_ACCESS_KEY_ID,
-                aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-                verify=VERIFY_CERTIFICATE,
-                config=config
-            )
+        client = boto3.client(
+            service_name=service,
+            region_name=region if region is not None else AWS_DEFAULT_REGION,
+            aws_access_key_id=AWS_ACCESS_KEY_ID,
+            aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
+            verify=VERIFY_CERTIFICATE,
+            config=config
+        )
 
     return client
 
@@ -283,10 +313,10 @@ def download_file_command(args):
         roleSessionName=args.get('roleSessionName'),
         roleSessionDuration=args.get('roleSessionDuration'),
     )
-    data = io.BytesIO()
-    client.download_fileobj(args.get('bucket').lower(), args.get('key'), data)
+    file_name = demisto.uniqueFile()
+    client.download_file(args.get('bucket').lower(), args.get('key'), file_name, Config=TRANSFER_CONFIG)
 
-    demisto.results(fileResult(args.get('key'), data.getvalue()))
+    demisto.results(file_result_existing_file(file_name, args.get('key')))
 
 
 def list_objects_command(args):
@@ -297,13 +327,19 @@ def list_objects_command(args):
         roleSessionDuration=args.get('roleSessionDuration'),
     )
     data = []
-    response = client.list_objects(Bucket=args.get('bucket'))
-    for key in response['Contents']:
-        data.append({
-            'Key': key['Key'],
-            'Size': convert_size(key['Size']),
-            'LastModified': datetime.strftime(key['LastModified'], '%Y-%m-%dT%H:%M:%S')
-        })
+    kwargs = {'Bucket': args.get('bucket')}
+    if args.get('prefix') is not None:
+        kwargs.update({'Prefix': args.get('prefix')})
+    if args.get('limit') is not None:
+        kwargs.update({'PaginationConfig': {'MaxItems': int(args.get('limit'))}})
+    paginator = client.get_paginator('list_objects')
+    for response in paginator.paginate(**kwargs):
+        for key in response.get('Contents', []):
+            data.append({
+                'Key': key['Key'],
+                'Size': convert_size(key['Size']),
+                'LastModified': datetime.strftime(key['LastModified'], '%Y-%m-%dT%H:%M:%S')
+            })
 
     ec = {'AWS.S3.Buckets(val.BucketName === args.get("bucket")).Objects': data}
     human_readable = tableToMarkdown('AWS S3 Bucket Objects', data)
@@ -325,55 +361,61 @@ def upload_file_command(args):
     path = get_file_path(args.get('entryID'))
 
     try:
-        with open(path['path'], 'rb') as data:
-            client.upload_fileobj(data, args.get('bucket'), args.get('key'))
-            demisto.results('File {file} was uploaded successfully to {bucket}'.format(
-                file=args.get('key'), bucket=args.get('bucket')))
+        client.upload_file(path['path'], args.get('bucket'), args.get('key'), Config=TRANSFER_CONFIG)
+        demisto.results('File {file} was uploaded successfully to {bucket}'.format(
+            file=args.get('key'), bucket=args.get('bucket')))
     except (OSError, IOError) as e:
         return_error("Could not read file: {path}\n {msg}".format(path=path, msg=e.message))
 
 
 """COMMAND BLOCK"""
-try:
-    LOG('Command being called is {command}'.format(command=demisto.command()))
-    if demisto.command() == 'test-module':
-        client = aws_session()
-        response = client.list_buckets()
-        if response['ResponseMetadata']['HTTPStatusCode'] == 200:
-            demisto.results('ok')
 
-    elif demisto.command() == 'aws-s3-create-bucket':
-        create_bucket_command(demisto.args())
 
-    elif demisto.command() == 'aws-s3-delete-bucket':
-        delete_bucket_command(demisto.args())
+def main():
+    try:
+        LOG('Command being called is {command}'.format(command=demisto.command()))
+        if demisto.command() == 'test-module':
+            client = aws_session()
+            response = client.list_buckets()
+            if response['ResponseMetadata']['HTTPStatusCode'] == 200:
+                demisto.results('ok')
+
+        elif demisto.command() == 'aws-s3-create-bucket':
+            create_bucket_command(demisto.args())
+
+        elif demisto.command() == 'aws-s3-delete-bucket':
+            delete_bucket_command(demisto.args())
+
+        elif demisto.command() == 'aws-s3-list-buckets':
+            list_buckets_command(demisto.args())
+
+        elif demisto.command() == 'aws-s3-get-bucket-policy':
+            get_bucket_policy_command(demisto.args())
 
-    elif demisto.command() == 'aws-s3-list-buckets':
-        list_buckets_command(demisto.args())
+        elif demisto.command() == 'aws-s3-put-bucket-policy':
+            put_bucket_policy_command(demisto.args())
 
-    elif demisto.command() == 'aws-s3-get-bucket-policy':
-        get_bucket_policy_command(demisto.args())
+        elif demisto.command() == 'aws-s3-delete-bucket-policy':
+            delete_bucket_policy_command(demisto.args())
 
-    elif demisto.command() == 'aws-s3-put-bucket-policy':
-        put_bucket_policy_command(demisto.args())
+        elif demisto.command() == 'aws-s3-download-file':
+            download_file_command(demisto.args())
 
-    elif demisto.command() == 'aws-s3-delete-bucket-policy':
-        delete_bucket_policy_command(demisto.args())
+        elif demisto.command() == 'aws-s3-list-bucket-objects':
+            list_objects_command(demisto.args())
 
-    elif demisto.command() == 'aws-s3-download-file':
-        download_file_command(demisto.args())
+        elif demisto.command() == 'aws-s3-upload-file':
+            upload_file_command(demisto.args())
 
-    elif demisto.command() == 'aws-s3-list-bucket-objects':
-        list_objects_command(demisto.args())
+    except ResponseParserError as e:
+        return_error('Could not connect to the AWS endpoint. Please check that the region is valid.\n {error}'.format(
+            error=type(e)))
+        LOG(e.message)
 
-    elif demisto.command() == 'aws-s3-upload-file':
-        upload_file_command(demisto.args())
+    except Exception as e:
+        return_error('Error has occurred in the AWS S3 Integration: {error}\n {message}'.format(
+            error=type(e), message=e.message))
 
-except ResponseParserError as e:
-    return_error('Could not connect to the AWS endpoint. Please check that the region is valid.\n {error}'.format(
-        error=type(e)))
-    LOG(e.message)
 
-except Exception as e:
-    return_error('Error has occurred in the AWS S3 Integration: {error}\n {message}'.format(
-        error=type(e), message=e.message))
+if __name__ in ('__builtin__', 'builtins'):
+    main()
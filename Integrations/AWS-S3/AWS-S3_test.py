@@ -0,0 +1,126 @@
+import demistomock as demisto
+from datetime import datetime, timedelta
+from importlib import import_module
+
+aws_s3 = import_module('AWS-S3')
+
+
+class STSClientStandIn(object):
+    def __init__(self, expiration):
+        self.expiration = expiration
+        self.calls = []
+
+    def assume_role(self, **kwargs):
+        self.calls.append(kwargs)
+        return {'Credentials': {
+            'AccessKeyId': 'ASIA{}'.format(len(self.calls)),
+            'SecretAccessKey': 'secret',
+            'SessionToken': 'token',
+            'Expiration': self.expiration
+        }}
+
+
+class PaginatorStandIn(object):
+    def __init__(self, pages):
+        self.pages = pages
+        self.kwargs = None
+
+    def paginate(self, **kwargs):
+        self.kwargs = kwargs
+        return iter(self.pages)
+
+
+class S3ClientStandIn(object):
+    def __init__(self, paginator):
+        self.paginator = paginator
+
+    def get_paginator(self, operation_name):
+        assert operation_name == 'list_objects'
+        return self.paginator
+
+
+def mock_integration_context(mocker, integration_context):
+    mocker.patch.object(demisto, 'getIntegrationContext', side_effect=lambda: integration_context)
+    mocker.patch.object(demisto, 'setIntegrationContext', side_effect=integration_context.update)
+
+
+def test_get_role_credentials_cached(mocker):
+    """
+    Given:
+        Role assumption arguments.
+    When:
+        Getting the role credentials several times, with the same and with another access key.
+    Then:
+        Ensure the role is assumed once per access key, and the access keys are not kept in the integration context.
+    """
+    sts_client = STSClientStandIn(datetime.utcnow() + timedelta(hours=1))
+    mocker.patch.object(aws_s3.boto3, 'client', return_value=sts_client)
+    integration_context = {}
+    mock_integration_context(mocker, integration_context)
+    kwargs = {'RoleArn': 'arn:aws:iam::123456789012:role/demisto', 'RoleSessionName': 'demisto'}
+
+    first = aws_s3.get_role_credentials(kwargs)
+    second = aws_s3.get_role_credentials(dict(kwargs))
+    other_key = aws_s3.get_role_credentials(kwargs, 'AKIAOTHER', 'other_secret')
+
+    assert first == second
+    assert first['AccessKeyId'] == 'ASIA1'
+    assert other_key['AccessKeyId'] == 'ASIA2'
+    assert len(sts_client.calls) == 2
+    cache_keys = list(integration_context['role_credentials'])
+    assert len(cache_keys) == 2
+    assert all(key.startswith('arn:aws:iam::123456789012:role/demisto|demisto|') for key in cache_keys)
+    assert 'AKIAOTHER' not in str(integration_context)
+
+
+def test_get_role_credentials_about_to_expire(mocker):
+    """
+    Given:
+        Role credentials in the integration context which expire within the expiry margin,
+        and expired credentials of another role.
+    When:
+        Getting the role credentials again.
+    Then:
+        Ensure the role is assumed again and the expired credentials are pruned from the integration context.
+    """
+    sts_client = STSClientStandIn(datetime.utcnow() + timedelta(seconds=60))
+    mocker.patch.object(aws_s3.boto3, 'client', return_value=sts_client)
+    integration_context = {'role_credentials': {'arn:aws:iam::123456789012:role/other|demisto|hash': {
+        'credentials': {}, 'expiration': 0
+    }}}
+    mock_integration_context(mocker, integration_context)
+    kwargs = {'RoleArn': 'arn:aws:iam::123456789012:role/demisto', 'RoleSessionName': 'demisto'}
+
+    aws_s3.get_role_credentials(kwargs)
+    credentials = aws_s3.get_role_credentials(kwargs)
+
+    assert credentials['AccessKeyId'] == 'ASIA2'
+    assert len(sts_client.calls) == 2
+    assert list(integration_context['role_credentials']) == [aws_s3.get_role_credentials_cache_key(kwargs)]
+
+
+def test_list_objects_command_pages(mocker):
+    """
+    Given:
+        A bucket whose objects are listed in two pages.
+    When:
+        Listing the bucket objects with a prefix and a limit.
+    Then:
+        Ensure the objects of all the pages are returned and the limit is passed to the paginator.
+    """
+    last_modified = datetime(2019, 10, 1, 12, 0, 0)
+    paginator = PaginatorStandIn([
+        {'Contents': [{'Key': 'a', 'Size': 0, 'LastModified': last_modified}]},
+        {'Contents': [{'Key': 'b', 'Size': 2048, 'LastModified': last_modified}]},
+        {}
+    ])
+    mocker.patch.object(aws_s3, 'aws_session', return_value=S3ClientStandIn(paginator))
+    mocker.patch.object(aws_s3, 'return_outputs')
+
+    aws_s3.list_objects_command({'bucket': 'demisto', 'prefix': 'logs/', 'limit': '2000'})
+
+    assert paginator.kwargs == {'Bucket': 'demisto', 'Prefix': 'logs/', 'PaginationConfig': {'MaxItems': 2000}}
+    objects = aws_s3.return_outputs.call_args[0][1]['AWS.S3.Buckets(val.BucketName === args.get("bucket")).Objects']
+    assert [obj['Key'] for obj in objects] == ['a', 'b']
+    assert objects[1]['Size'] == '2.0 KB'
+    assert objects[0]['LastModified'] == '2019-10-01T12:00:00'
@@ -6,19 +6,21 @@ import traceback
 import json
 import os
 import hashlib
+import time
 from datetime import timedelta
 from cStringIO import StringIO
 import logging
 import warnings
 import subprocess
 import email
+from multiprocessing.pool import ThreadPool
 from requests.exceptions import ConnectionError
 
 import exchangelib
 from exchangelib.errors import ErrorItemNotFound, ResponseMessageError, TransportError, RateLimitError, \
     ErrorInvalidIdMalformed, \
     ErrorFolderNotFound, ErrorMailboxStoreUnavailable, ErrorMailboxMoveInProgress, \
-    AutoDiscoverFailed, ErrorNameResolutionNoResults, ErrorInvalidPropertyRequest
+    AutoDiscoverFailed, ErrorNameResolutionNoResults, ErrorInvalidPropertyRequest, UnauthorizedError
 from exchangelib.items import Item, Message, Contact
 from exchangelib.services import EWSService, EWSAccountService
 from exchangelib.util import create_element, add_xml_child
@@ -84,6 +86,9 @@ LAST_RUN_IDS = "ids"
 LAST_RUN_FOLDER = "folderName"
 ERROR_COUNTER = "errorCounter"
 
+AUTODISCOVER_TIMESTAMP = "timestamp"
+AUTODISCOVER_CACHE_TTL = 24 * 60 * 60  # seconds
+
 ITEMS_RESULTS_HEADERS = ['sender', 'subject', 'hasAttachments', 'datetimeReceived', 'receivedBy', 'author',
                          'toRecipients', 'textBody', ]
 
@@ -100,6 +105,8 @@ ACCESS_TYPE = IMPERSONATION if demisto.params().get('impersonation', False) else
 FETCH_ALL_HISTORY = demisto.params().get('fetchAllHistory', False)
 IS_TEST_MODULE = False
 BaseProtocol.TIMEOUT = int(demisto.params().get('requestTimeout', 120))
+# folders are searched concurrently, one thread per pooled EWS session
+SEARCH_FOLDERS_POOL_SIZE = BaseProtocol.SESSION_POOLSIZE
 AUTO_DISCOVERY = False
 SERVER_BUILD = ""
 MARK_AS_READ = demisto.params().get('markAsRead', False)
@@ -317,6 +324,9 @@ ACCOUNT_EMAIL = ''
 PASSWORD = ''
 config = None
 credentials = None
+# per run caches, so commands touching several mailboxes discover and verify each of them once
+AUTODISCOVER_CONFIG = None
+ACCOUNTS_CACHE = {}  # type: dict
 
 PUBLIC_FOLDERS_ERROR = 'Please update your docker image to use public folders'
 if IS_PUBLIC_FOLDER and exchangelib.__version__ != "1.12.0":
@@ -368,8 +378,28 @@ def create_context_dict(account):
     }
 
 
-def prepare_context(credentials):
+def get_autodiscover_context():
+    """
+    Returns the cached autodiscover results, or an empty dict if there are none or they are older than the TTL
+    """
     context_dict = demisto.getIntegrationContext()
+    if not context_dict or time.time() - context_dict.get(AUTODISCOVER_TIMESTAMP, 0) > AUTODISCOVER_CACHE_TTL:
+        return {}
+    context_dict = dict(context_dict)
+    del context_dict[AUTODISCOVER_TIMESTAMP]
+    return context_dict
+
+
+def set_autodiscover_context(context_dict):
+    global AUTODISCOVER_CONFIG
+    AUTODISCOVER_CONFIG = None
+    if context_dict:
+        context_dict = dict(context_dict, **{AUTODISCOVER_TIMESTAMP: int(time.time())})
+    demisto.setIntegrationContext(context_dict)
+
+
+def prepare_context(credentials):
+    context_dict = get_autodiscover_context()
     global SERVER_BUILD, EWS_SERVER
     if not context_dict:
         try:
@@ -381,7 +411,7 @@ def prepare_context(credentials):
             if not USE_PROXY:
                 os.environ['NO_PROXY'] = EWS_SERVER
             SERVER_BUILD = account.protocol.version.build
-            demisto.setIntegrationContext(create_context_dict(account))
+            set_autodiscover_context(create_context_dict(account))
         except AutoDiscoverFailed:
             return_error("Auto discovery failed. Check credentials or configure manually")
         except Exception as e:
@@ -457,22 +487,31 @@ def construct_config_args(context_dict, credentials):
     return config_args
 
 
+def get_autodiscover_config(context_dict):
+    global AUTODISCOVER_CONFIG
+    if AUTODISCOVER_CONFIG is None:
+        AUTODISCOVER_CONFIG = Configuration(**construct_config_args(context_dict, credentials))
+    return AUTODISCOVER_CONFIG
+
+
 def get_account_autodiscover(account_email, access_type=ACCESS_TYPE):
     account = None
     original_exc = None  # type: ignore
-    context_dict = demisto.getIntegrationContext()
+    context_dict = get_autodiscover_context()
 
     if context_dict:
         try:
-            config_args = construct_config_args(context_dict, credentials)
             account = Account(
-                primary_smtp_address=account_email, autodiscover=False, config=Configuration(**config_args),
+                primary_smtp_address=account_email, autodiscover=False, config=get_autodiscover_config(context_dict),
                 access_type=access_type,
             )
             account.root.effective_rights.read  # pylint: disable=E1101
             return account
         except Exception, original_exc:
-            pass
+            if isinstance(original_exc, UnauthorizedError):
+                # the cached endpoint or auth type may be stale, discover again from scratch
+                set_autodiscover_context({})
+                context_dict = {}
 
     try:
         account = Account(
@@ -486,16 +525,26 @@ def get_account_autodiscover(account_email, access_type=ACCESS_TYPE):
         raise original_exc  # pylint: disable=E0702
 
     if account_email == ACCOUNT_EMAIL:
-        demisto.setIntegrationContext(create_context_dict(account))
+        set_autodiscover_context(autodiscover_result)
+    else:
+        # the autodiscovery runs for the configured account, the requested mailbox is accessed through its results
+        account = Account(
+            primary_smtp_address=account_email, autodiscover=False,
+            config=Configuration(**construct_config_args(autodiscover_result, credentials)), access_type=access_type,
+        )
     return account
 
 
 def get_account(account_email, access_type=ACCESS_TYPE):
-    if not AUTO_DISCOVERY:
-        return Account(
-            primary_smtp_address=account_email, autodiscover=False, config=config, access_type=access_type,
-        )
-    return get_account_autodiscover(account_email, access_type)
+    cache_key = (account_email.lower(), access_type)
+    if cache_key not in ACCOUNTS_CACHE:
+        if not AUTO_DISCOVERY:
+            ACCOUNTS_CACHE[cache_key] = Account(
+                primary_smtp_address=account_email, autodiscover=False, config=config, access_type=access_type,
+            )
+        else:
+            ACCOUNTS_CACHE[cache_key] = get_account_autodiscover(account_email, access_type)
+    return ACCOUNTS_CACHE[cache_key]
 
 
 # LOGGING
@@ -882,6 +931,10 @@ def get_last_run():
 
 
 def fetch_last_emails(account, folder_name='Inbox', since_datetime=None, exclude_ids=None):
+    """
+    Lazily yields the messages received in the folder since the given time, oldest first.
+    Messages whose id is in exclude_ids (those fetched on the previous run at exactly since_datetime) are skipped.
+    """
     qs = get_folder_by_path(account, folder_name, is_public=IS_PUBLIC_FOLDER)
     if since_datetime:
         qs = qs.filter(datetime_received__gte=since_datetime)
@@ -889,13 +942,11 @@ def fetch_last_emails(account, folder_name='Inbox', since_datetime=None, exclude
         if not FETCH_ALL_HISTORY:
             last_10_min = EWSDateTime.now(tz=EWSTimeZone.timezone('UTC')) - timedelta(minutes=10)
             qs = qs.filter(datetime_received__gte=last_10_min)
-    qs = qs.filter().only(*map(lambda x: x.name, Message.FIELDS))
-    result = qs.all()
-    result = [x for x in result if isinstance(x, Message)]
-    if exclude_ids and len(exclude_ids) > 0:
-        exclude_ids = set(exclude_ids)
-        result = [x for x in result if x.message_id not in exclude_ids]
-    return result
+    qs = qs.filter().only(*map(lambda x: x.name, Message.FIELDS)).order_by('datetime_received')
+    exclude_ids = set(exclude_ids or [])
+    for item in qs.iterator():
+        if isinstance(item, Message) and item.message_id not in exclude_ids:
+            yield item
 
 
 def keys_to_camel_case(value):
@@ -1157,16 +1208,22 @@ def fetch_emails_as_incidents(account_email, folder_name):
         account = get_account(account_email)
         last_emails = fetch_last_emails(account, folder_name, last_run.get(LAST_RUN_TIME), last_run.get(LAST_RUN_IDS))
 
-        ids = []
+        # only the ids received at the latest timestamp are kept, they are the only ones the next
+        # run (which queries from that timestamp inclusive) can return again
+        last_time = last_run.get(LAST_RUN_TIME)
+        ids = list(last_run.get(LAST_RUN_IDS) or [])
         incidents = []
         for item in last_emails:
             if item.message_id:
+                if item.datetime_received != last_time:
+                    last_time = item.datetime_received
+                    ids = []
                 ids.append(item.message_id)
                 incident = parse_incident_from_item(item, True)
                 incidents.append(incident)
 
         new_last_run = {
-            LAST_RUN_TIME: start_time.ewsformat(),
+            LAST_RUN_TIME: (last_time or start_time).ewsformat(),
             LAST_RUN_FOLDER: folder_name,
             LAST_RUN_IDS: ids,
             ERROR_COUNTER: 0
@@ -1439,16 +1496,24 @@ def search_items_in_mailbox(query=None, message_id=None, folder_path='', limit=1
         restricted_fields = set(argToList(selected_fields))  # type: ignore
         restricted_fields.update(['id', 'message_id'])  # type: ignore
 
-    for folder in folders:
-        if Message not in folder.supported_item_models:
-            continue
+    def search_folder(folder):
         if query:
             items_qs = folder.filter(query).only(*restricted_fields)
         else:
             items_qs = folder.filter(message_id=message_id).only(*restricted_fields)
-        items += get_limited_number_of_messages_from_qs(items_qs, limit)
-        if len(items) >= limit:
-            break
+        return get_limited_number_of_messages_from_qs(items_qs, limit)
+
+    folders = [folder for folder in folders if Message in folder.supported_item_models]
+    if folders:
+        pool = ThreadPool(min(SEARCH_FOLDERS_POOL_SIZE, len(folders)))
+        try:
+            # imap keeps the folders order, so the results are the same as a sequential search
+            for folder_items in pool.imap(search_folder, folders):
+                items += folder_items
+                if len(items) >= limit:
+                    break
+        finally:
+            pool.terminate()
 
     items = items[:limit]
     searched_items_result = map(
@@ -2034,7 +2099,9 @@ def main():
                                        "Verify that the Hostname or IP address is is correct."
 
         # Legacy error handling
-        if "Status code: 401" in debug_log:
+        if "Status code: 401" in debug_log or isinstance(e, UnauthorizedError):
+            if AUTO_DISCOVERY:
+                set_autodiscover_context({})
             error_message_simple = "Got unauthorized from the server. " \
                                    "Check credentials are correct and authentication method are supported. "
 
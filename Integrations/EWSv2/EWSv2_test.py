@@ -18,3 +18,219 @@ def test_start_logging():
     EWSv2.start_logging()
     logging.getLogger().debug("test this")
     assert "test this" in EWSv2.log_stream.getvalue()
+
+
+class QuerySetStandIn(object):
+    def __init__(self, items):
+        self.items = items
+
+    def filter(self, *args, **kwargs):
+        since = kwargs.get('datetime_received__gte')
+        if since:
+            return QuerySetStandIn([item for item in self.items if item.datetime_received >= since])
+        return self
+
+    def only(self, *args):
+        return self
+
+    def order_by(self, *args):
+        return QuerySetStandIn(sorted(self.items, key=lambda item: item.datetime_received))
+
+    def iterator(self):
+        return iter(self.items)
+
+    def __iter__(self):
+        return iter(self.items)
+
+
+def create_message(message_id, received):
+    from exchangelib import EWSDateTime, EWSTimeZone
+    message = EWSv2.Message(message_id=message_id)
+    message.datetime_received = EWSDateTime(2019, 11, 20, 10, 0, received, tzinfo=EWSTimeZone.timezone('UTC'))
+    return message
+
+
+def test_fetch_emails_as_incidents_dedup_window(mocker):
+    """
+    Given
+        - a folder with messages, two of them received at the latest timestamp
+    When
+        - fetching twice, with a new message arriving at that timestamp between the runs
+    Then
+        - only the ids at the latest timestamp are kept in the last run
+        - the second run returns only the new message
+    """
+    messages = [create_message('<1>', 1), create_message('<2>', 2), create_message('<3>', 3),
+                create_message('<4>', 3)]
+    mocker.patch.object(EWSv2, 'FETCH_ALL_HISTORY', True)
+    mocker.patch.object(EWSv2, 'get_account')
+    mocker.patch.object(EWSv2, 'get_folder_by_path', side_effect=lambda *args, **kwargs: QuerySetStandIn(messages))
+    mocker.patch.object(EWSv2, 'parse_incident_from_item', side_effect=lambda item, is_fetch: {'name': item.message_id})
+    mocker.patch.object(EWSv2.demisto, 'getLastRun', return_value={})
+    set_last_run = mocker.patch.object(EWSv2.demisto, 'setLastRun')
+
+    incidents = EWSv2.fetch_emails_as_incidents('test@demisto.com', 'Inbox')
+    assert [incident['name'] for incident in incidents] == ['<1>', '<2>', '<3>', '<4>']
+    last_run = set_last_run.call_args[0][0]
+    assert last_run[EWSv2.LAST_RUN_IDS] == ['<3>', '<4>']
+    assert last_run[EWSv2.LAST_RUN_TIME] == '2019-11-20T10:00:03Z'
+
+    messages.append(create_message('<5>', 3))
+    mocker.patch.object(EWSv2.demisto, 'getLastRun', side_effect=lambda: dict(last_run))
+    incidents = EWSv2.fetch_emails_as_incidents('test@demisto.com', 'Inbox')
+    assert [incident['name'] for incident in incidents] == ['<5>']
+    last_run = set_last_run.call_args[0][0]
+    assert last_run[EWSv2.LAST_RUN_IDS] == ['<3>', '<4>', '<5>']
+
+    # nothing new - the window is kept as is
+    incidents = EWSv2.fetch_emails_as_incidents('test@demisto.com', 'Inbox')
+    assert incidents == []
+    assert set_last_run.call_args[0][0] == last_run
+
+
+def test_search_items_in_mailbox_parallel(mocker):
+    """
+    Given
+        - a mailbox with several folders holding matching messages
+    When
+        - searching all the folders with a limit
+    Then
+        - results keep the folders order and are cut at the limit
+    """
+    class FolderStandIn(object):
+        supported_item_models = (EWSv2.Message,)
+
+        def __init__(self, items):
+            self.items = items
+
+        def filter(self, *args, **kwargs):
+            return QuerySetStandIn(self.items)
+
+    folders = [FolderStandIn([create_message('<{}-{}>'.format(i, j), j) for j in range(2)]) for i in range(6)]
+    account = mocker.Mock()
+    account.inbox.parent.walk.return_value = folders
+    mocker.patch.object(EWSv2, 'get_account', return_value=account)
+    mocker.patch.object(EWSv2, 'parse_item_as_dict', side_effect=lambda item, *args, **kwargs: item.message_id)
+
+    entry = EWSv2.search_items_in_mailbox(query='subject:test', limit=5)
+    assert entry['Contents'] == ['<0-0>', '<0-1>', '<1-0>', '<1-1>', '<2-0>']
+
+
+AUTODISCOVER_CONTEXT = {
+    'auth_type': 'NTLM',
+    'service_endpoint': 'https://mail.demisto.com/EWS/Exchange.asmx',
+    'build': '15.1.1.1',
+    'api_version': 'Exchange2016'
+}
+
+
+def test_get_account_autodiscover_cached(mocker):
+    """
+    Given
+        - fresh autodiscover results in the integration context
+    When
+        - getting the same mailbox twice and another mailbox once
+    Then
+        - autodiscovery is not run, one configuration is shared and each mailbox is verified once
+    """
+    import time
+    mocker.patch.object(EWSv2, 'AUTO_DISCOVERY', True)
+    mocker.patch.object(EWSv2, 'ACCOUNTS_CACHE', {})
+    mocker.patch.object(EWSv2, 'AUTODISCOVER_CONFIG', None)
+    context = dict(AUTODISCOVER_CONTEXT, timestamp=int(time.time()))
+    mocker.patch.object(EWSv2.demisto, 'getIntegrationContext', return_value=context)
+    configuration = mocker.patch.object(EWSv2, 'Configuration')
+    account = mocker.patch.object(EWSv2, 'Account')
+
+    assert EWSv2.get_account('a@demisto.com') is EWSv2.get_account('A@demisto.com')
+    EWSv2.get_account('b@demisto.com')
+    assert configuration.call_count == 1
+    assert account.call_count == 2
+    assert all(not kwargs['autodiscover'] for _, kwargs in account.call_args_list)
+
+
+def test_get_account_autodiscover_other_mailbox(mocker):
+    """
+    Given
+        - no autodiscover results in the integration context
+    When
+        - getting a mailbox other than the configured account
+    Then
+        - autodiscovery runs for the configured account, and the requested mailbox is returned and cached
+    """
+    mocker.patch.object(EWSv2, 'AUTO_DISCOVERY', True)
+    mocker.patch.object(EWSv2, 'ACCOUNT_EMAIL', 'a@demisto.com')
+    mocker.patch.object(EWSv2, 'ACCOUNTS_CACHE', {})
+    mocker.patch.object(EWSv2.demisto, 'getIntegrationContext', return_value={})
+    set_context = mocker.patch.object(EWSv2.demisto, 'setIntegrationContext')
+    mocker.patch.object(EWSv2, 'Configuration')
+    mocker.patch.object(EWSv2, 'create_context_dict', return_value=AUTODISCOVER_CONTEXT)
+
+    def account_stand_in(primary_smtp_address, autodiscover, **kwargs):
+        return mocker.Mock(primary_smtp_address=primary_smtp_address, autodiscover=autodiscover)
+
+    account = mocker.patch.object(EWSv2, 'Account', side_effect=account_stand_in)
+    mailbox = EWSv2.get_account('b@demisto.com')
+    assert mailbox.primary_smtp_address == 'b@demisto.com'
+    assert not mailbox.autodiscover
+    assert account.call_args_list[0][1]['primary_smtp_address'] == 'a@demisto.com'
+    assert EWSv2.get_account('b@demisto.com') is mailbox
+    assert account.call_count == 2
+    assert set_context.call_count == 0
+
+
+def test_get_account_autodiscover_expired(mocker):
+    """
+    Given
+        - autodiscover results older than the TTL in the integration context
+    When
+        - getting the account
+    Then
+        - autodiscovery runs again and the context is refreshed with a new timestamp
+    """
+    mocker.patch.object(EWSv2, 'AUTO_DISCOVERY', True)
+    mocker.patch.object(EWSv2, 'ACCOUNT_EMAIL', 'a@demisto.com')
+    mocker.patch.object(EWSv2, 'ACCOUNTS_CACHE', {})
+    context = dict(AUTODISCOVER_CONTEXT, timestamp=1)
+    mocker.patch.object(EWSv2.demisto, 'getIntegrationContext', return_value=context)
+    set_context = mocker.patch.object(EWSv2.demisto, 'setIntegrationContext')
+    mocker.patch.object(EWSv2, 'create_context_dict', return_value=AUTODISCOVER_CONTEXT)
+    account = mocker.patch.object(EWSv2, 'Account')
+
+    EWSv2.get_account('a@demisto.com')
+    assert account.call_args[1]['autodiscover']
+    new_context = set_context.call_args[0][0]
+    assert new_context['timestamp'] > 1
+    assert new_context['service_endpoint'] == AUTODISCOVER_CONTEXT['service_endpoint']
+
+
+def test_get_account_autodiscover_unauthorized(mocker):
+    """
+    Given
+        - fresh autodiscover results in the integration context which the server rejects
+    When
+        - getting the account
+    Then
+        - the cached results are dropped and autodiscovery runs again
+    """
+    import time
+    mocker.patch.object(EWSv2, 'AUTO_DISCOVERY', True)
+    mocker.patch.object(EWSv2, 'ACCOUNT_EMAIL', 'a@demisto.com')
+    mocker.patch.object(EWSv2, 'ACCOUNTS_CACHE', {})
+    mocker.patch.object(EWSv2, 'AUTODISCOVER_CONFIG', None)
+    context = dict(AUTODISCOVER_CONTEXT, timestamp=int(time.time()))
+    mocker.patch.object(EWSv2.demisto, 'getIntegrationContext', return_value=context)
+    set_context = mocker.patch.object(EWSv2.demisto, 'setIntegrationContext')
+    mocker.patch.object(EWSv2, 'Configuration')
+    mocker.patch.object(EWSv2, 'create_context_dict', return_value=AUTODISCOVER_CONTEXT)
+
+    def account_stand_in(autodiscover, **kwargs):
+        if not autodiscover:
+            raise EWSv2.UnauthorizedError('Wrong username or password')
+        return mocker.Mock()
+
+    account = mocker.patch.object(EWSv2, 'Account', side_effect=account_stand_in)
+    EWSv2.get_account('a@demisto.com')
+    assert account.call_count == 2
+    assert set_context.call_args_list[0][0][0] == {}
+    assert set_context.call_args_list[1][0][0]['timestamp'] > 0
@@ -5,6 +5,7 @@ from CommonServerUserPython import *
 '''IMPORTS'''
 from typing import List
 from elasticsearch import Elasticsearch, RequestsHttpConnection, NotFoundError
+from elasticsearch.helpers import scan
 from elasticsearch_dsl import Search
 from elasticsearch_dsl.query import QueryString
 from datetime import datetime
@@ -39,6 +40,13 @@ FETCH_TIME = demisto.params().get('fetch_time', '3 days')
 FETCH_SIZE = int(demisto.params().get('fetch_size', 50))
 INSECURE = not demisto.params().get('insecure', False)
 TIME_METHOD = demisto.params().get('time_method', 'Simple-Date')
+# when set, the fetch continues after the sort values of the last fetched hit - the time field and this unique
+# keyword field, so hits with the same time are not skipped
+FETCH_TIEBREAKER_FIELD = demisto.params().get('fetch_tiebreaker_field', '')
+
+'''VARIABLES FOR EXPORT'''
+EXPORT_BATCH_SIZE = 1000
+EXPORT_SCROLL_TIME = '5m'
 
 # if timestamp than set the format to iso.
 if 'Timestamp' in TIME_METHOD:
@@ -437,13 +445,14 @@ def incident_label_maker(source):
     return labels
 
 
-def results_to_incidents_timestamp(response, last_fetch):
+def results_to_incidents_timestamp(response, last_fetch, last_fetch_inclusive=False):
     """Converts the current results into incidents.
 
     Args:
         response(dict): the raw search results from Elasticsearch.
         last_fetch(num): the date or timestamp of the last fetch before this fetch
         - this will hold the last date of the incident brought by this fetch.
+        last_fetch_inclusive(bool): whether to create incidents from hits with the same time as last_fetch.
 
     Returns:
         (list).The incidents.
@@ -461,7 +470,7 @@ def results_to_incidents_timestamp(response, last_fetch):
                 last_fetch = hit_timestamp
 
             # avoid duplication due to weak time query
-            if hit_timestamp > current_fetch:
+            if hit_timestamp > current_fetch or (last_fetch_inclusive and hit_timestamp == current_fetch):
                 inc = {
                     'name': 'Elasticsearch: Index: ' + str(hit.get('_index')) + ", ID: " + str(hit.get('_id')),
                     'rawJSON': json.dumps(hit),
@@ -473,13 +482,14 @@ def results_to_incidents_timestamp(response, last_fetch):
     return incidents, last_fetch
 
 
-def results_to_incidents_datetime(response, last_fetch):
+def results_to_incidents_datetime(response, last_fetch, last_fetch_inclusive=False):
     """Converts the current results into incidents.
 
     Args:
         response(dict): the raw search results from Elasticsearch.
         last_fetch(datetime): the date or timestamp of the last fetch before this fetch
         - this will hold the last date of the incident brought by this fetch.
+        last_fetch_inclusive(bool): whether to create incidents from hits with the same time as last_fetch.
 
     Returns:
         (list).The incidents.
@@ -495,7 +505,7 @@ def results_to_incidents_datetime(response, last_fetch):
                 last_fetch = hit_date
 
             # avoid duplication due to weak time query
-            if hit_date > current_fetch:
+            if hit_date > current_fetch or (last_fetch_inclusive and hit_date == current_fetch):
                 inc = {
                     'name': 'Elasticsearch: Index: ' + str(hit.get('_index')) + ", ID: " + str(hit.get('_id')),
                     'rawJSON': json.dumps(hit),
@@ -510,6 +520,7 @@ def results_to_incidents_datetime(response, last_fetch):
 def fetch_incidents():
     last_run = demisto.getLastRun()
     last_fetch = last_run.get('time')
+    search_after = last_run.get('search_after') if FETCH_TIEBREAKER_FIELD else None
 
     # handle first time fetch
     if last_fetch is None:
@@ -527,27 +538,79 @@ def fetch_incidents():
     es = elasticsearch_builder()
 
     query = QueryString(query=FETCH_QUERY + " AND " + TIME_FIELD + ":*")
-    search = Search(using=es, index=FETCH_INDEX).filter({'range': {TIME_FIELD: {'gt': last_fetch}}})
-    search = search.sort({TIME_FIELD: {'order': 'asc'}})[0:FETCH_SIZE].query(query)
+    # with the sort values of the last fetched hit the search continues right after it, so hits with the same time
+    # as the last fetched hit are fetched as well
+    time_range = {'gte': last_fetch} if search_after else {'gt': last_fetch}
+    search = Search(using=es, index=FETCH_INDEX).filter({'range': {TIME_FIELD: time_range}})
+    sort = [{TIME_FIELD: {'order': 'asc'}}]
+    if FETCH_TIEBREAKER_FIELD:
+        sort.append({FETCH_TIEBREAKER_FIELD: {'order': 'asc'}})
+    search = search.sort(*sort)
+    search = search[0:FETCH_SIZE].query(query)
+    if search_after:
+        search = search.extra(search_after=search_after)
     response = search.execute().to_dict()
     _, total_results = get_total_results(response)
+    hits = response.get('hits', {}).get('hits')
 
     incidents = []  # type: List
 
-    if total_results > 0:
+    if total_results > 0 and hits:
+        next_search_after = hits[-1].get('sort') if FETCH_TIEBREAKER_FIELD else None
         if 'Timestamp' in TIME_METHOD:
-            incidents, last_fetch = results_to_incidents_timestamp(response, last_fetch)
-            demisto.setLastRun({'time': last_fetch})
+            incidents, last_fetch = results_to_incidents_timestamp(response, last_fetch, bool(search_after))
+            demisto.setLastRun({'time': last_fetch, 'search_after': next_search_after})
 
         else:
-            incidents, last_fetch = results_to_incidents_datetime(response, last_fetch)
-            demisto.setLastRun({'time': datetime.strftime(last_fetch, TIME_FORMAT)})
+            incidents, last_fetch = results_to_incidents_datetime(response, last_fetch, bool(search_after))
+            demisto.setLastRun({'time': datetime.strftime(last_fetch, TIME_FORMAT),
+                                'search_after': next_search_after})
 
         demisto.info('extract {} incidents'.format(len(incidents)))
 
     demisto.incidents(incidents)
 
 
+def export_command():
+    """Exports the results of a search in Elasticsearch to a file, using the scroll API.
+
+    Notes:
+        unlike the search command, deep results are not paged with from/size. The hits are streamed in batches and
+        written to the file one per line, so large result sets are exported with bounded memory.
+    """
+    index = demisto.args().get('index')
+    query = demisto.args().get('query')
+    fields = argToList(demisto.args().get('fields'))
+    limit = int(demisto.args().get('limit')) if demisto.args().get('limit') else None
+    batch_size = int(demisto.args().get('batch_size', EXPORT_BATCH_SIZE))
+
+    es = elasticsearch_builder()
+
+    search = Search(using=es, index=index).query(QueryString(query=query))
+    if fields:
+        search = search.source(fields)
+
+    exported = 0
+    file_path = demisto.uniqueFile()
+    with open(file_path, 'w') as export_file:
+        if limit != 0:
+            for hit in scan(es, query=search.to_dict(), index=index, size=batch_size, scroll=EXPORT_SCROLL_TIME):
+                export_file.write(json.dumps(hit) + '\n')
+                exported += 1
+                if limit and exported >= limit:
+                    break
+
+    export_context = {
+        'Server': SERVER,
+        'Index': index,
+        'Query': query,
+        'Count': exported
+    }
+    human_readable = tableToMarkdown('Export Results:', export_context, ['Query', 'Index', 'Count', 'Server'])
+    return_outputs(human_readable, {'Elasticsearch.Export': export_context}, export_context)
+    demisto.results(file_result_existing_file(file_path, '{}_export.ndjson'.format(index)))
+
+
 try:
     LOG('command is %s' % (demisto.command(),))
     if demisto.command() == 'test-module':
@@ -556,5 +619,7 @@ try:
         fetch_incidents()
     elif demisto.command() in ['search', 'es-search']:
         search_command()
+    elif demisto.command() == 'es-export':
+        export_command()
 except Exception as e:
     return_error("Failed executing {}.\nError message: {}".format(demisto.command(), str(e)), error=e)
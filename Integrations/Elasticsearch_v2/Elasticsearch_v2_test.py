@@ -1,6 +1,10 @@
+import json
+import re
 from datetime import datetime
 from unittest.mock import patch
 
+from requests_mock import ANY
+
 """MOCKED RESPONSES"""
 
 ES_V6_RESPONSE = {
@@ -403,3 +407,159 @@ def test_incident_creation_with_timestamp_e7():
     incidents, last_fetch2 = results_to_incidents_timestamp(ES_V7_RESPONSE_WITH_TIMESTAMP, lastfetch)
     assert last_fetch2 == 1572502640
     assert str(incidents) == MOCK_ES7_INCIDENTS_FROM_TIMESTAMP
+
+
+class ElasticsearchStandIn:
+    """A local stand-in for the Elasticsearch search and scroll APIs over a single index.
+
+    Supports range filters and search_after over the fetch sort (time field, then _id), and scrolls in the order
+    of the documents.
+    """
+    def __init__(self, docs, time_field='Date'):
+        self.docs = docs
+        self.time_field = time_field
+        self.scrolls = {}
+        self.searches = 0
+
+    def hit(self, doc):
+        return {'_index': 'customer', '_type': 'doc', '_id': doc['_id'], '_score': None,
+                '_source': {self.time_field: doc[self.time_field]},
+                'sort': [doc[self.time_field], doc['_id']]}
+
+    def search(self, request, context):
+        self.searches += 1
+        body = request.json()
+        hits = [self.hit(doc) for doc in self.docs]
+        for query_filter in body.get('query', {}).get('bool', {}).get('filter', []):
+            time_range = query_filter['range'][self.time_field]
+            if 'gt' in time_range:
+                hits = [hit for hit in hits if hit['sort'][0] > time_range['gt']]
+            if 'gte' in time_range:
+                hits = [hit for hit in hits if hit['sort'][0] >= time_range['gte']]
+        if 'sort' in body:
+            hits.sort(key=lambda hit: hit['sort'])
+        if 'search_after' in body:
+            hits = [hit for hit in hits if hit['sort'] > body['search_after']]
+        total = len(hits)
+        if 'scroll' in request.qs:
+            scroll_id = str(len(self.scrolls))
+            self.scrolls[scroll_id] = hits
+            return self.scroll_page(scroll_id, int(request.qs['size'][0]), total)
+        return {'took': 1, 'timed_out': False,
+                'hits': {'total': {'value': total, 'relation': 'eq'}, 'max_score': None,
+                         'hits': hits[:body.get('size', 10)]}}
+
+    def scroll_page(self, scroll_id, size, total=None):
+        hits = self.scrolls[scroll_id]
+        self.scrolls[scroll_id] = hits[size:]
+        return {'_scroll_id': scroll_id, 'took': 1, 'timed_out': False, '_shards': {'total': 1, 'successful': 1},
+                'hits': {'total': {'value': total, 'relation': 'eq'}, 'hits': hits[:size]}}
+
+    def scroll(self, request, context):
+        scroll_id = request.json()['scroll_id']
+        return self.scroll_page(scroll_id, self.size)
+
+    def register(self, requests_mock, size=2):
+        self.size = size
+        requests_mock.register_uri(ANY, re.compile('http://es.test:9200/customer/_search'), json=self.search)
+        requests_mock.post('http://es.test:9200/_search/scroll', json=self.scroll)
+        requests_mock.delete('http://es.test:9200/_search/scroll', json={})
+
+
+@patch("Elasticsearch_v2.SERVER", 'http://es.test:9200')
+@patch("Elasticsearch_v2.TIME_METHOD", 'Timestamp-Seconds')
+@patch("Elasticsearch_v2.TIME_FIELD", 'Date')
+@patch("Elasticsearch_v2.FETCH_INDEX", "customer")
+@patch("Elasticsearch_v2.FETCH_QUERY", "*")
+@patch("Elasticsearch_v2.FETCH_SIZE", 2)
+@patch("Elasticsearch_v2.FETCH_TIEBREAKER_FIELD", 'event.id')
+def test_fetch_incidents_same_time_hits(mocker, requests_mock):
+    """
+    Given:
+        - 5 hits with the same time and 1 later hit, and a fetch size of 2
+    When:
+        - Fetching incidents several times
+    Then:
+        - Every hit is fetched exactly once, the search continuing after the sort values kept in the last run
+    """
+    import demistomock as demisto
+    import Elasticsearch_v2
+    docs = [{'_id': str(i), 'Date': 1572502640} for i in range(5)] + [{'_id': '0a', 'Date': 1572502641}]
+    ElasticsearchStandIn(docs).register(requests_mock)
+    last_run = {'time': 1572502630}
+    mocker.patch.object(demisto, 'getLastRun', side_effect=lambda: last_run)
+    mocker.patch.object(demisto, 'setLastRun', side_effect=last_run.update)
+    mocker.patch.object(demisto, 'incidents')
+    mocker.patch.object(demisto, 'info')
+
+    fetched_ids = []
+    for _ in range(5):
+        Elasticsearch_v2.fetch_incidents()
+        fetched_ids.extend(json.loads(incident['rawJSON'])['_id'] for incident in demisto.incidents.call_args[0][0])
+
+    assert fetched_ids == ['0', '1', '2', '3', '4', '0a']
+    assert last_run == {'time': 1572502641, 'search_after': [1572502641, '0a']}
+
+
+@patch("Elasticsearch_v2.SERVER", 'http://es.test:9200')
+@patch("Elasticsearch_v2.TIME_METHOD", 'Timestamp-Seconds')
+@patch("Elasticsearch_v2.TIME_FIELD", 'Date')
+@patch("Elasticsearch_v2.FETCH_INDEX", "customer")
+@patch("Elasticsearch_v2.FETCH_QUERY", "*")
+@patch("Elasticsearch_v2.FETCH_SIZE", 2)
+@patch("Elasticsearch_v2.FETCH_TIEBREAKER_FIELD", '')
+def test_fetch_incidents_without_tiebreaker(mocker, requests_mock):
+    """
+    Given:
+        - No tiebreaker field configured
+    When:
+        - Fetching incidents
+    Then:
+        - The hits are sorted by the time field only, and the fetch continues after the time of the last hit
+    """
+    import demistomock as demisto
+    import Elasticsearch_v2
+    docs = [{'_id': str(i), 'Date': 1572502640 + i} for i in range(3)]
+    ElasticsearchStandIn(docs).register(requests_mock)
+    last_run = {'time': 1572502630, 'search_after': [1572502630, 'x']}
+    mocker.patch.object(demisto, 'getLastRun', side_effect=lambda: last_run)
+    mocker.patch.object(demisto, 'setLastRun', side_effect=last_run.update)
+    mocker.patch.object(demisto, 'incidents')
+    mocker.patch.object(demisto, 'info')
+
+    Elasticsearch_v2.fetch_incidents()
+
+    body = requests_mock.last_request.json()
+    assert body['sort'] == [{'Date': {'order': 'asc'}}]
+    assert 'search_after' not in body
+    assert last_run == {'time': 1572502641, 'search_after': None}
+
+
+@patch("Elasticsearch_v2.SERVER", 'http://es.test:9200')
+def test_export(mocker, requests_mock, tmpdir):
+    """
+    Given:
+        - 5 documents matching a query
+    When:
+        - Exporting the query results with a batch size of 2
+    Then:
+        - All the documents are scrolled through and written to the export file one per line
+    """
+    import demistomock as demisto
+    import Elasticsearch_v2
+    tmpdir.chdir()
+    docs = [{'_id': str(i), 'Date': 1572502640 + i} for i in range(5)]
+    ElasticsearchStandIn(docs).register(requests_mock)
+    mocker.patch.object(demisto, 'args', return_value={'index': 'customer', 'query': '*', 'batch_size': '2',
+                                                       'fields': ['Date', 'Name']})
+    mocker.patch.object(demisto, 'results')
+
+    Elasticsearch_v2.export_command()
+
+    export_entry = demisto.results.call_args_list[-1][0][0]
+    assert export_entry['File'] == 'customer_export.ndjson'
+    with open('1_' + export_entry['FileID']) as export_file:
+        assert [json.loads(line)['_id'] for line in export_file] == ['0', '1', '2', '3', '4']
+    assert demisto.results.call_args_list[0][0][0]['EntryContext']['Elasticsearch.Export']['Count'] == 5
+    assert requests_mock.request_history[0].json()['_source'] == ['Date', 'Name']
+    assert requests_mock.request_history[-1].method == 'DELETE'
@@ -8,6 +8,7 @@ from pykafka.common import OffsetType
 import logging
 from cStringIO import StringIO
 import traceback
+import time
 
 # Disable insecure warnings
 requests.packages.urllib3.disable_warnings()
@@ -18,6 +19,10 @@ requests.packages.urllib3.disable_warnings()
 log_stream = None
 log_handler = None
 
+# pykafka only keeps weak references to topics, holding them here saves a metadata request per access
+TOPICS = {}  # type: dict
+FETCH_CONSUMER_TIMEOUT_MS = 2000
+
 ''' HELPER FUNCTIONS '''
 
 
@@ -34,6 +39,22 @@ def start_logging():
         logger.setLevel(logging.DEBUG)
 
 
+def get_topic(client, topic_name):
+    """
+    :param client: Kafka client
+    :type client: :class:`pykafka.KafkaClient`
+    :param topic_name: name of the topic
+    :type topic_name: str
+    :return: the topic, or None if it does not exist
+    :rtype: :class:`pykafka.topic.Topic`
+    """
+    if topic_name not in TOPICS:
+        if topic_name not in client.topics:
+            return None
+        TOPICS[topic_name] = client.topics[topic_name]
+    return TOPICS[topic_name]
+
+
 def check_params(topic, old_offset=None, old_partition=None):
     """
     :param topic: topic to check
@@ -47,6 +68,7 @@ def check_params(topic, old_offset=None, old_partition=None):
     """
     partition = None
     offset = None
+    latest_offset = None
     # Casting
     if old_partition:
         # Casting
@@ -66,10 +88,13 @@ def check_params(topic, old_offset=None, old_partition=None):
             elif old_offset.lower() == 'earliest':
                 offset = OffsetType.EARLIEST
             elif old_offset.lower() == 'latest':
-                offset = check_latest_offset(topic, partition_number=partition) - 1
+                latest_offset = check_latest_offset(topic, partition_number=partition)
+                offset = latest_offset - 1
             else:
                 return_error('Supplied offset is not a number')
-            if check_latest_offset(topic, partition_number=partition) <= offset:
+            if latest_offset is None:
+                latest_offset = check_latest_offset(topic, partition_number=partition)
+            if latest_offset <= offset:
                 return_error('Offset is out of bounds')
         else:
             return_error('Offset is not a number, earliest or latest')
@@ -221,8 +246,8 @@ def produce_message(client):
     else:
         partitioning_key = None  # type: ignore
 
-    if topic in client.topics:
-        kafka_topic = client.topics[topic]
+    kafka_topic = get_topic(client, topic)
+    if kafka_topic:
         with kafka_topic.get_sync_producer() as producer:
             producer.produce(
                 message=str(value),
@@ -241,14 +266,20 @@ def consume_message(client):
     offset = demisto.args().get('offset')
     partition = demisto.args().get('partition')
 
-    if topic in client.topics:
-        kafka_topic = client.topics[topic]
+    kafka_topic = get_topic(client, topic)
+    if kafka_topic:
         offset, partition = check_params(kafka_topic, old_offset=offset, old_partition=partition)
-        consumer = kafka_topic.get_simple_consumer(
-            auto_offset_reset=offset,
-            reset_offset_on_start=True
-        )
-        message = consumer.consume()
+        consumer_args = {
+            'auto_offset_reset': offset,
+            'reset_offset_on_start': True
+        }
+        if partition is not None:
+            consumer_args['partitions'] = [kafka_topic.partitions[partition]]
+        consumer = kafka_topic.get_simple_consumer(**consumer_args)
+        try:
+            message = consumer.consume()
+        finally:
+            consumer.stop()
         md = tableToMarkdown(
             name='Message consumed from topic \'{}\''.format(topic),
             t={
@@ -289,8 +320,8 @@ def fetch_partitions(client):
     Fetching available partitions in given topic
     """
     topic = demisto.args().get('topic')
-    if topic in client.topics:
-        kafka_topic = client.topics[topic]
+    kafka_topic = get_topic(client, topic)
+    if kafka_topic:
         partitions = kafka_topic.partitions.keys()
 
         md = tableToMarkdown(
@@ -322,9 +353,14 @@ def fetch_partitions(client):
 def fetch_incidents(client):
     """
     Fetches incidents
+
+    Partitions are drained up to the latest offset they had when the fetch started, or until max_messages were
+    consumed. Partitions without new messages are not consumed at all. The fetched offsets are kept in the last run,
+    and committed to the consumer group when one is configured.
     """
     topic = demisto.params().get('topic', '')
     partition_to_fetch_from = argToList(demisto.params().get('partition', ''))
+    consumer_group = demisto.params().get('consumer_group') or None
     offset_to_fetch_from = demisto.params().get('offset', -2)
     try:
         offset_to_fetch_from = int(offset_to_fetch_from)
@@ -340,41 +376,60 @@ def fetch_incidents(client):
     last_fetched_partitions_offset = json.loads(demisto.getLastRun().get('last_fetched_partitions_offset', '{}'))
     incidents = []
 
-    message_counter = 0
-
-    if topic in client.topics:
-        kafka_topic = client.topics[topic]
-
-        consumer_args = {
-            'consumer_timeout_ms': 2000,  # wait max 2 seconds for new messages
-            'reset_offset_on_start': True
-        }
-
-        if partition_to_fetch_from:
-            partitions = []
-            for partition in kafka_topic.partitions.values():
-                partition_id = str(partition.id)
-                if partition_id in partition_to_fetch_from:
-                    partitions.append(partition)
-            consumer_args['partitions'] = partitions  # type: ignore
-
-        consumer = kafka_topic.get_simple_consumer(**consumer_args)
-
-        offsets = [(p, last_fetched_partitions_offset.get(str(p.id), offset_to_fetch_from)) for p in consumer._partitions]
-        consumer.reset_offsets(offsets)
-
-        for message in consumer:
-            if message and message.value:
-                incidents.append(create_incident(message=message, topic=kafka_topic.name))
-                if message.offset > last_fetched_partitions_offset.get(str(message.partition_id), offset_to_fetch_from):
-                    last_fetched_partitions_offset[str(message.partition_id)] = message.offset
-                message_counter += 1
-            if message_counter == max_messages:
-                break
-        consumer.stop()
-    else:
+    kafka_topic = get_topic(client, topic)
+    if not kafka_topic:
         return_error('No such topic \'{}\' to fetch incidents from.'.format(topic))
 
+    # offset of the last message in each partition, as of now
+    latest_offsets = {str(partition_id): response.offset[0] - 1
+                      for partition_id, response in kafka_topic.latest_available_offsets().items()}
+    partitions = []
+    for partition in kafka_topic.partitions.values():
+        partition_id = str(partition.id)
+        if partition_to_fetch_from and partition_id not in partition_to_fetch_from:
+            continue
+        if last_fetched_partitions_offset.get(partition_id, -1) >= latest_offsets.get(partition_id, -1):
+            continue
+        partitions.append(partition)
+
+    if partitions:
+        start_time = time.time()
+        consumer = kafka_topic.get_simple_consumer(
+            consumer_group=consumer_group,
+            partitions=partitions,
+            consumer_timeout_ms=FETCH_CONSUMER_TIMEOUT_MS,  # wait max 2 seconds for new messages
+            auto_offset_reset=offset_to_fetch_from if offset_to_fetch_from < 0 else OffsetType.EARLIEST,
+            reset_offset_on_start=not consumer_group,
+            auto_commit_enable=False
+        )
+        try:
+            # without a consumer group, or for partitions already in the last run, start from the last run offsets
+            offsets = [(p, last_fetched_partitions_offset.get(str(p.id), offset_to_fetch_from)) for p in partitions
+                       if not consumer_group or str(p.id) in last_fetched_partitions_offset]
+            if offsets:
+                consumer.reset_offsets(offsets)
+
+            remaining_partitions = set(str(p.id) for p in partitions)
+            for message in consumer:
+                if not message:
+                    continue
+                partition_id = str(message.partition_id)
+                last_fetched_partitions_offset[partition_id] = max(
+                    message.offset, last_fetched_partitions_offset.get(partition_id, offset_to_fetch_from))
+                if message.value:
+                    incidents.append(create_incident(message=message, topic=kafka_topic.name))
+                if message.offset >= latest_offsets.get(partition_id, -1):
+                    remaining_partitions.discard(partition_id)
+                if len(incidents) == max_messages or not remaining_partitions:
+                    break
+            if consumer_group:
+                consumer.commit_offsets()
+        finally:
+            consumer.stop()
+        duration = time.time() - start_time
+        demisto.debug('Kafka fetched {} messages from {} partitions in {:.2f} seconds'.format(
+            len(incidents), len(partitions), duration))
+
     demisto.setLastRun({'last_fetched_partitions_offset': json.dumps(last_fetched_partitions_offset)})
     demisto.incidents(incidents)
 
@@ -18,3 +18,159 @@ def test_create_certificate():
     with open(res.keyfile, 'rb') as f:
         assert f.read() == key
     os.remove(res.keyfile)
+
+
+class MessageStandIn(object):
+    def __init__(self, partition_id, offset, value):
+        self.partition_id = partition_id
+        self.offset = offset
+        self.value = value
+        self.timestamp_dt = None
+
+
+class PartitionStandIn(object):
+    def __init__(self, partition_id, messages_count):
+        self.id = partition_id
+        self.messages = [MessageStandIn(partition_id, offset, 'message {}'.format(offset))
+                         for offset in range(messages_count)]
+
+
+class ConsumerStandIn(object):
+    def __init__(self, partitions, consumer_group=None, **kwargs):
+        self.partitions = partitions
+        self.consumer_group = consumer_group
+        self.next_offsets = {partition.id: 0 for partition in partitions}
+        self.committed = None
+
+    def reset_offsets(self, partition_offsets):
+        for partition, offset in partition_offsets:
+            if offset == -2:  # earliest
+                offset = -1
+            elif offset == -1:  # latest
+                offset = len(partition.messages) - 1
+            self.next_offsets[partition.id] = offset + 1
+
+    def __iter__(self):
+        # round robin over the partitions, as the broker would interleave fetch responses
+        while True:
+            pending = [p for p in self.partitions if self.next_offsets[p.id] < len(p.messages)]
+            if not pending:
+                return
+            for partition in pending:
+                message = partition.messages[self.next_offsets[partition.id]]
+                self.next_offsets[partition.id] += 1
+                yield message
+
+    def commit_offsets(self):
+        self.committed = dict((partition_id, offset - 1) for partition_id, offset in self.next_offsets.items())
+
+    def stop(self):
+        pass
+
+
+class TopicStandIn(object):
+    def __init__(self, name, partitions_sizes):
+        from collections import namedtuple
+        self.name = name
+        self.partitions = {i: PartitionStandIn(i, size) for i, size in enumerate(partitions_sizes)}
+        self.consumers = []
+        self.offsets_response = namedtuple('OffsetPartitionResponse', 'offset err')
+
+    def latest_available_offsets(self):
+        return {i: self.offsets_response([len(p.messages)], 0) for i, p in self.partitions.items()}
+
+    def get_simple_consumer(self, **kwargs):
+        consumer = ConsumerStandIn(**kwargs)
+        self.consumers.append(consumer)
+        return consumer
+
+
+class ClientStandIn(object):
+    def __init__(self, topic):
+        self.topics = {topic.name: topic}
+
+
+def run_fetch(mocker, client, params, last_run):
+    import Kafka_V2
+    mocker.patch.object(Kafka_V2.demisto, 'params', return_value=params)
+    mocker.patch.object(Kafka_V2.demisto, 'getLastRun', return_value=last_run)
+    set_last_run = mocker.patch.object(Kafka_V2.demisto, 'setLastRun')
+    incidents = mocker.patch.object(Kafka_V2.demisto, 'incidents')
+    Kafka_V2.fetch_incidents(client)
+    return incidents.call_args[0][0], set_last_run.call_args[0][0]
+
+
+def test_fetch_incidents_drains_partitions(mocker):
+    """
+    Given
+        - a topic with 3 partitions, one of them empty
+    When
+        - fetching twice with a max of 4 messages, then fetching with nothing new
+    Then
+        - messages are fetched across partitions until the max and continue from the last run offsets
+        - the empty partition is not consumed and no consumer is created when there is nothing new
+    """
+    import json
+    import Kafka_V2
+    mocker.patch.object(Kafka_V2, 'TOPICS', {})
+    topic = TopicStandIn('test', [3, 2, 0])
+    client = ClientStandIn(topic)
+    params = {'topic': 'test', 'max_messages': '4', 'offset': '-2'}
+
+    incidents, last_run = run_fetch(mocker, client, params, {})
+    assert len(incidents) == 4
+    assert [p.id for p in topic.consumers[0].partitions] == [0, 1]
+    assert json.loads(last_run['last_fetched_partitions_offset']) == {'0': 1, '1': 1}
+
+    incidents, last_run = run_fetch(mocker, client, params, last_run)
+    assert len(incidents) == 1
+    assert [p.id for p in topic.consumers[1].partitions] == [0]
+    assert json.loads(last_run['last_fetched_partitions_offset']) == {'0': 2, '1': 1}
+
+    incidents, last_run = run_fetch(mocker, client, params, last_run)
+    assert incidents == []
+    assert len(topic.consumers) == 2
+
+
+def test_fetch_incidents_commits_consumer_group(mocker):
+    """
+    Given
+        - a consumer group configured
+    When
+        - fetching incidents
+    Then
+        - the consumer joins the group and the fetched offsets are committed to it
+    """
+    import Kafka_V2
+    mocker.patch.object(Kafka_V2, 'TOPICS', {})
+    topic = TopicStandIn('test', [2, 2])
+    params = {'topic': 'test', 'max_messages': '50', 'consumer_group': 'demisto'}
+
+    incidents, _ = run_fetch(mocker, ClientStandIn(topic), params, {})
+    assert len(incidents) == 4
+    consumer = topic.consumers[0]
+    assert consumer.consumer_group == 'demisto'
+    assert consumer.committed == {0: 1, 1: 1}
+
+
+def test_fetch_incidents_throughput(mocker):
+    """
+    Given
+        - a topic with 4 partitions of 5000 messages each
+    When
+        - fetching 10000 messages
+    Then
+        - the fetch stops at the max without waiting for the consumer timeout, and the topic is looked up once
+    """
+    import time
+    import Kafka_V2
+    mocker.patch.object(Kafka_V2, 'TOPICS', {})
+    topic = TopicStandIn('test', [5000] * 4)
+    params = {'topic': 'test', 'max_messages': '10000'}
+
+    start = time.time()
+    incidents, _ = run_fetch(mocker, ClientStandIn(topic), params, {})
+    duration = time.time() - start
+    assert len(incidents) == 10000
+    assert duration < Kafka_V2.FETCH_CONSUMER_TIMEOUT_MS / 1000.0
+    assert Kafka_V2.TOPICS == {'test': topic}
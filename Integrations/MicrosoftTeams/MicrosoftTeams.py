@@ -8,8 +8,8 @@ from flask import Flask, request, Response
 from gevent.pywsgi import WSGIServer
 import jwt
 import time
-from threading import Thread
-from typing import Match, Union, Optional, cast, Dict, Any, List
+from threading import Thread, Lock
+from typing import Match, Union, Optional, cast, Dict, Any, List, Tuple
 import re
 from jwt.algorithms import RSAAlgorithm
 from tempfile import NamedTemporaryFile
@@ -39,6 +39,19 @@ MESSAGE_TYPES: dict = {
     'status_changed': 'incidentStatusChanged'
 }
 
+OPEN_ID_CONFIG_URL: str = 'https://login.botframework.com/v1/.well-known/openidconfiguration'
+OPEN_ID_KEYS_TTL: int = 24 * 60 * 60  # seconds for which fetched signing keys are used before refreshing them
+OPEN_ID_KEYS_REFRESH_INTERVAL: int = 60  # minimal seconds between refreshes triggered by an unknown key
+# In memory cache of the Bot Framework signing keys and their public keys, by key ID
+OPEN_ID_KEYS: Dict[str, dict] = dict()
+OPEN_ID_PUBLIC_KEYS: Dict[str, Any] = dict()
+OPEN_ID_KEYS_FETCH_TIME: float = 0
+OPEN_ID_KEYS_REFRESH_TIME: float = 0
+OPEN_ID_KEYS_LOCK: Lock = Lock()
+# In memory index of the teams in the integration context, rebuilt only when they change:
+# the teams JSON, the mirrored channels by team ID and channel ID, and the number of channels pending mirroring
+TEAMS_INDEX: Tuple[str, Dict[Tuple[str, str], dict], int] = ('', dict(), 0)
+
 ''' HELPER FUNCTIONS '''
 
 
@@ -164,6 +177,26 @@ def process_incident_create_message(demisto_user: dict, message: str) -> str:
     return data
 
 
+def get_teams_index(integration_context: dict) -> Tuple[str, Dict[Tuple[str, str], dict], int]:
+    """
+    Gets the index of the teams in the integration context, parsing them only if they changed since last indexed
+    :param integration_context: Cached object to retrieve the teams from
+    :return: The teams JSON, the mirrored channels by team ID and channel ID, and the number of pending mirrors
+    """
+    global TEAMS_INDEX
+    teams_json: str = integration_context.get('teams', '[]')
+    if TEAMS_INDEX[0] != teams_json:
+        channels: Dict[Tuple[str, str], dict] = dict()
+        pending_mirrors: int = 0
+        for team in json.loads(teams_json):
+            for channel in team.get('mirrored_channels', []):
+                channels.setdefault((team.get('team_id', ''), channel.get('channel_id', '')), channel)
+                if not channel.get('mirrored') and channel.get('mirror_direction') and channel.get('mirror_type'):
+                    pending_mirrors += 1
+        TEAMS_INDEX = (teams_json, channels, pending_mirrors)
+    return TEAMS_INDEX
+
+
 def is_investigation_mirrored(investigation_id: str, mirrored_channels: list) -> int:
     """
     Checks if investigation is already mirrored
@@ -575,6 +608,71 @@ def integration_health():
     demisto.results(api_health_human_readble + mirrored_channels_human_readable)
 
 
+def fetch_open_id_keys() -> list:
+    """
+    Fetches the Bot Framework signing keys
+    :return: The signing keys, empty if failed to fetch them
+    """
+    try:
+        response: requests.Response = requests.get(OPEN_ID_CONFIG_URL, verify=USE_SSL)
+        if not response.ok:
+            demisto.info(f'Authorization header validation failed to fetch open ID config - {response.reason}')
+            return []
+        response_json: dict = response.json()
+        jwks_uri: str = response_json.get('jwks_uri', '')
+        keys_response: requests.Response = requests.get(jwks_uri, verify=USE_SSL)
+        if not keys_response.ok:
+            demisto.info(f'Authorization header validation failed to fetch keys - {keys_response.reason}')
+            return []
+        keys_response_json: dict = keys_response.json()
+        return keys_response_json.get('keys', [])
+    except ValueError:
+        demisto.info('Authorization header validation - failed to parse keys response')
+        return []
+
+
+def get_open_id_key(key_id: str) -> dict:
+    """
+    Gets a Bot Framework signing key from the in memory cache. The keys are refreshed when their TTL passes, or when
+    an unknown key is requested, with a single refresh in flight and at most one refresh attempt per refresh interval.
+    The cached keys are kept when a refresh fails. The integration context is written only when the keys change.
+    :param key_id: The requested key ID
+    :return: The signing key, empty if not found
+    """
+    global OPEN_ID_KEYS, OPEN_ID_KEYS_FETCH_TIME, OPEN_ID_KEYS_REFRESH_TIME
+    if not OPEN_ID_KEYS:
+        # Keys persisted by a previous run, used until refreshed
+        open_id_metadata: dict = json.loads(demisto.getIntegrationContext().get('open_id_metadata', '{}'))
+        OPEN_ID_KEYS = {key.get('kid'): key for key in open_id_metadata.get('keys', [])}
+
+    requested_time: float = time.time()
+    key_object: dict = OPEN_ID_KEYS.get(key_id, {})
+    if (key_object and requested_time - OPEN_ID_KEYS_FETCH_TIME < OPEN_ID_KEYS_TTL) or \
+            requested_time - OPEN_ID_KEYS_REFRESH_TIME < OPEN_ID_KEYS_REFRESH_INTERVAL:
+        return key_object
+
+    with OPEN_ID_KEYS_LOCK:
+        if OPEN_ID_KEYS_REFRESH_TIME >= requested_time:
+            # Refreshed while waiting for the lock
+            return OPEN_ID_KEYS.get(key_id, {})
+        OPEN_ID_KEYS_REFRESH_TIME = time.time()
+        keys: list = fetch_open_id_keys()
+        if keys:
+            OPEN_ID_KEYS_FETCH_TIME = OPEN_ID_KEYS_REFRESH_TIME
+            fetched_keys: Dict[str, dict] = {key.get('kid'): key for key in keys}
+            if fetched_keys != OPEN_ID_KEYS:
+                demisto.info('Authorization header validation - signing keys were rotated')
+                OPEN_ID_KEYS = fetched_keys
+                OPEN_ID_PUBLIC_KEYS.clear()
+                integration_context: dict = demisto.getIntegrationContext()
+                integration_context['open_id_metadata'] = json.dumps({'keys': keys})
+                demisto.setIntegrationContext(integration_context)
+        elif not OPEN_ID_KEYS:
+            demisto.info('Authorization header validation - failed to get keys')
+
+    return OPEN_ID_KEYS.get(key_id, {})
+
+
 def validate_auth_header(headers: dict) -> bool:
     """
     Validated authorization header provided in the bot activity object
@@ -596,54 +694,12 @@ def validate_auth_header(headers: dict) -> bool:
         demisto.info('Authorization header validation - failed to verify issuer')
         return False
 
-    integration_context: dict = demisto.getIntegrationContext()
-    open_id_metadata: dict = json.loads(integration_context.get('open_id_metadata', '{}'))
-    keys: list = open_id_metadata.get('keys', [])
-
     unverified_headers: dict = jwt.get_unverified_header(jwt_token)
     key_id: str = unverified_headers.get('kid', '')
-    key_object: dict = dict()
-
-    # Check if we got the requested key in cache
-    for key in keys:
-        if key.get('kid') == key_id:
-            key_object = key
-            break
-
-    if not key_object:
-        # Didn't find requested key in cache, getting new keys
-        try:
-            open_id_url: str = 'https://login.botframework.com/v1/.well-known/openidconfiguration'
-            response: requests.Response = requests.get(open_id_url, verify=USE_SSL)
-            if not response.ok:
-                demisto.info(f'Authorization header validation failed to fetch open ID config - {response.reason}')
-                return False
-            response_json: dict = response.json()
-            jwks_uri: str = response_json.get('jwks_uri', '')
-            keys_response: requests.Response = requests.get(jwks_uri, verify=USE_SSL)
-            if not keys_response.ok:
-                demisto.info(f'Authorization header validation failed to fetch keys - {response.reason}')
-                return False
-            keys_response_json: dict = keys_response.json()
-            keys = keys_response_json.get('keys', [])
-            open_id_metadata['keys'] = keys
-        except ValueError:
-            demisto.info('Authorization header validation - failed to parse keys response')
-            return False
-
-    if not keys:
-        # Didn't get new keys
-        demisto.info('Authorization header validation - failed to get keys')
-        return False
-
-    # Find requested key in new keys
-    for key in keys:
-        if key.get('kid') == key_id:
-            key_object = key
-            break
+    key_object: dict = get_open_id_key(key_id)
 
     if not key_object:
-        # Didn't find requested key in new keys
+        # Didn't find requested key in cache nor in new keys
         demisto.info('Authorization header validation - failed to find relevant key')
         return False
 
@@ -652,7 +708,10 @@ def validate_auth_header(headers: dict) -> bool:
         demisto.info('Authorization header validation - failed to verify endorsements')
         return False
 
-    public_key: str = RSAAlgorithm.from_jwk(json.dumps(key_object))
+    public_key = OPEN_ID_PUBLIC_KEYS.get(key_id)
+    if not public_key:
+        public_key = RSAAlgorithm.from_jwk(json.dumps(key_object))
+        OPEN_ID_PUBLIC_KEYS[key_id] = public_key
     options = {
         'verify_aud': False,
         'verify_exp': True
@@ -664,9 +723,6 @@ def validate_auth_header(headers: dict) -> bool:
         demisto.info('Authorization header validation - failed to verify audience_claim')
         return False
 
-    integration_context['open_id_metadata'] = json.dumps(open_id_metadata)
-    demisto.setIntegrationContext(integration_context)
-
     return True
 
 
@@ -1125,40 +1181,51 @@ def mirror_investigation():
     demisto.setIntegrationContext(integration_context)
 
 
+def mirror_pending_channels(integration_context: dict) -> int:
+    """
+    Mirrors all the channels which are pending mirroring, and updates the integration context once if any was mirrored
+    :param integration_context: Cached object to retrieve the teams from
+    :return: The number of mirrored channels
+    """
+    teams_json, _, pending_mirrors = get_teams_index(integration_context)
+    if not pending_mirrors:
+        return 0
+    teams: list = json.loads(teams_json)
+    mirrored: int = 0
+    try:
+        for team in teams:
+            channel: dict
+            for channel in team.get('mirrored_channels', []):
+                if channel['mirrored']:
+                    continue
+                investigation_id = channel.get('investigation_id', '')
+                demisto.info(f'Mirroring incident: {investigation_id} in Microsoft Teams')
+                if channel['mirror_direction'] and channel['mirror_type']:
+                    demisto.mirrorInvestigation(
+                        channel['investigation_id'],
+                        channel['mirror_type'],
+                        bool(strtobool(channel['auto_close']))
+                    )
+                    channel['mirrored'] = True
+                    mirrored += 1
+                    demisto.info(f'Mirrored incident: {investigation_id} to Microsoft Teams successfully')
+                else:
+                    demisto.info(f'Could not mirror {investigation_id}')
+    finally:
+        if mirrored:
+            integration_context['teams'] = json.dumps(teams)
+            demisto.setIntegrationContext(integration_context)
+    return mirrored
+
+
 def channel_mirror_loop():
     """
     Runs in a long running container - checking for newly mirrored investigations.
     """
     while True:
-        found_channel_to_mirror: bool = False
         try:
             integration_context = demisto.getIntegrationContext()
-            teams: list = json.loads(integration_context.get('teams', '[]'))
-            for team in teams:
-                mirrored_channels = team.get('mirrored_channels', [])
-                channel: dict
-                for channel in mirrored_channels:
-                    investigation_id = channel.get('investigation_id', '')
-                    if not channel['mirrored']:
-                        demisto.info(f'Mirroring incident: {investigation_id} in Microsoft Teams')
-                        channel_to_update: dict = channel
-                        if channel_to_update['mirror_direction'] and channel_to_update['mirror_type']:
-                            demisto.mirrorInvestigation(
-                                channel_to_update['investigation_id'],
-                                channel_to_update['mirror_type'],
-                                bool(strtobool(channel_to_update['auto_close']))
-                            )
-                            channel_to_update['mirrored'] = True
-                            demisto.info(f'Mirrored incident: {investigation_id} to Microsoft Teams successfully')
-                        else:
-                            demisto.info(f'Could not mirror {investigation_id}')
-                        team['mirrored_channels'] = mirrored_channels
-                        integration_context['teams'] = json.dumps(teams)
-                        demisto.setIntegrationContext(integration_context)
-                        found_channel_to_mirror = True
-                        break
-                if found_channel_to_mirror:
-                    break
+            mirror_pending_channels(integration_context)
         except Exception as e:
             demisto.error(f'An error occurred in channel mirror loop: {str(e)}')
             demisto.updateModuleHealth(f'An error occurred: {str(e)}')
@@ -1344,26 +1411,20 @@ def message_handler(integration_context: dict, request_body: dict, channel_data:
     from_property: dict = request_body.get('from', {})
     team_member_id: str = from_property.get('id', '')
 
-    if integration_context.get('teams'):
-        teams: list = json.loads(integration_context['teams'])
-        for team in teams:
-            if team.get('team_id', '') == team_id:
-                mirrored_channels: list = team.get('mirrored_channels', [])
-                for mirrored_channel in mirrored_channels:
-                    if mirrored_channel.get('channel_id') == channel_id:
-                        if mirrored_channel.get('mirror_direction', '') != 'FromDemisto' \
-                                and 'none' not in mirrored_channel.get('mirror_type', ''):
-                            investigation_id: str = mirrored_channel.get('investigation_id', '')
-                            username: str = from_property.get('name', '')
-                            user_email: str = get_team_member(integration_context, team_member_id).get('user_mail', '')
-                            demisto.addEntry(
-                                id=investigation_id,
-                                entry=message,
-                                username=username,
-                                email=user_email,
-                                footer=f'\n**{ENTRY_FOOTER}**'
-                            )
-                        return
+    mirrored_channel: dict = get_teams_index(integration_context)[1].get((team_id, channel_id), {})
+    if mirrored_channel:
+        if mirrored_channel.get('mirror_direction', '') != 'FromDemisto' \
+                and 'none' not in mirrored_channel.get('mirror_type', ''):
+            investigation_id: str = mirrored_channel.get('investigation_id', '')
+            username: str = from_property.get('name', '')
+            user_email: str = get_team_member(integration_context, team_member_id).get('user_mail', '')
+            demisto.addEntry(
+                id=investigation_id,
+                entry=message,
+                username=username,
+                email=user_email,
+                footer=f'\n**{ENTRY_FOOTER}**'
+            )
 
 
 @APP.route('/', methods=['POST'])
@@ -1380,8 +1441,9 @@ def messages() -> Response:
         service_url: str = request_body.get('serviceUrl', '')
         if service_url:
             service_url = service_url[:-1] if service_url.endswith('/') else service_url
-            integration_context['service_url'] = service_url
-            demisto.setIntegrationContext(integration_context)
+            if integration_context.get('service_url') != service_url:
+                integration_context['service_url'] = service_url
+                demisto.setIntegrationContext(integration_context)
 
         channel_data: dict = request_body.get('channelData', {})
         event_type: str = channel_data.get('eventType', '')
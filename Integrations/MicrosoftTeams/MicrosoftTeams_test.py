@@ -1272,3 +1272,198 @@ def test_integration_health(mocker):
     results = demisto.results.call_args[0]
     assert len(results) == 1
     assert results[0] == expected_results
+
+
+class TokenIssuerStandIn:
+    """
+    Issues Bot Framework like tokens, signed by a local RSA key
+    """
+    def __init__(self, key_id: str = 'local-key'):
+        from cryptography.hazmat.backends import default_backend
+        from cryptography.hazmat.primitives import serialization
+        from cryptography.hazmat.primitives.asymmetric import rsa
+        from jwt.algorithms import RSAAlgorithm
+        self.key_id = key_id
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048, backend=default_backend())
+        self.private_key = private_key.private_bytes(
+            serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+        )
+        self.jwk = dict(json.loads(RSAAlgorithm.to_jwk(private_key.public_key())), kid=key_id, endorsements=['msteams'])
+
+    def issue(self, key_id: str = '') -> str:
+        import jwt
+        import time
+        payload = {'iss': 'https://api.botframework.com', 'aud': bot_id, 'exp': int(time.time()) + 3600}
+        token = jwt.encode(payload, self.private_key, algorithm='RS256', headers={'kid': key_id or self.key_id})
+        return token.decode('utf-8')
+
+    def register(self, requests_mock):
+        requests_mock.get(
+            'https://login.botframework.com/v1/.well-known/openidconfiguration',
+            json={'jwks_uri': 'https://login.botframework.com/v1/.well-known/keys'}
+        )
+        requests_mock.get('https://login.botframework.com/v1/.well-known/keys', json={'keys': [self.jwk]})
+
+
+@pytest.fixture
+def open_id_keys_cache(mocker):
+    import MicrosoftTeams
+    mocker.patch.object(MicrosoftTeams, 'OPEN_ID_KEYS', {})
+    mocker.patch.object(MicrosoftTeams, 'OPEN_ID_PUBLIC_KEYS', {})
+    mocker.patch.object(MicrosoftTeams, 'OPEN_ID_KEYS_FETCH_TIME', 0)
+    mocker.patch.object(MicrosoftTeams, 'OPEN_ID_KEYS_REFRESH_TIME', 0)
+    mocker.patch.object(demisto, 'params', return_value={'bot_id': bot_id})
+    mocker.patch.object(demisto, 'getIntegrationContext', return_value=dict(integration_context))
+    mocker.patch.object(demisto, 'setIntegrationContext')
+
+
+def test_messages_load(mocker, requests_mock, open_id_keys_cache):
+    """
+    Given
+        - a local token issuer and a burst of bot activities signed by it
+    When
+        - posting the activities to the bot app
+    Then
+        - all of them are authorized
+        - the signing keys are fetched once, and the integration context is written only when they are first stored
+    """
+    import time
+    from MicrosoftTeams import APP
+    mocker.patch.object(demisto, 'addEntry')
+    mocker.patch.object(demisto, 'getIntegrationContext', return_value={
+        'bot_name': 'DemistoBot',
+        'service_url': service_url,
+        'teams': json.dumps([{
+            'mirrored_channels': [{
+                'channel_id': '19:2cbad0d78c624400ef83a5750539998g@thread.skype',
+                'investigation_id': '1',
+                'mirror_type': 'all',
+                'mirror_direction': 'both'
+            }],
+            'team_id': team_id,
+            'team_members': team_members
+        }])
+    })
+    issuer = TokenIssuerStandIn()
+    issuer.register(requests_mock)
+    client = APP.test_client()
+    activity = {
+        'serviceUrl': f'{service_url}/',
+        'text': 'waz up',
+        'from': {'id': team_members[0]['id'], 'name': 'Bruce Willis'},
+        'conversation': {'id': 'conversation', 'conversationType': 'channel'},
+        'channelData': {'channel': {'id': '19:2cbad0d78c624400ef83a5750539998g@thread.skype'}, 'team': {'id': team_id}}
+    }
+    headers = {'Authorization': f'Bearer {issuer.issue()}'}
+
+    start = time.time()
+    for _ in range(200):
+        assert client.post('/', json=activity, headers=headers).status_code == 200
+    duration = time.time() - start
+
+    assert demisto.addEntry.call_count == 200
+    assert requests_mock.call_count == 2
+    assert demisto.setIntegrationContext.call_count == 1
+    assert json.loads(demisto.setIntegrationContext.call_args[0][0]['open_id_metadata'])['keys'] == [issuer.jwk]
+    assert duration < 10
+
+
+def test_validate_auth_header_unknown_key(requests_mock, open_id_keys_cache):
+    """
+    Given
+        - cached signing keys
+    When
+        - validating tokens signed by a key which is not published
+    Then
+        - the keys are refreshed once within the refresh interval and the tokens are not authorized
+    """
+    import MicrosoftTeams
+    from MicrosoftTeams import validate_auth_header
+    issuer = TokenIssuerStandIn()
+    issuer.register(requests_mock)
+    assert validate_auth_header({'Authorization': f'Bearer {issuer.issue()}'})
+    assert requests_mock.call_count == 2
+
+    # The keys were just fetched, so an unknown key does not trigger a refresh
+    assert not validate_auth_header({'Authorization': f'Bearer {issuer.issue("unknown")}'})
+    assert requests_mock.call_count == 2
+
+    MicrosoftTeams.OPEN_ID_KEYS_REFRESH_TIME -= MicrosoftTeams.OPEN_ID_KEYS_REFRESH_INTERVAL
+    for _ in range(5):
+        assert not validate_auth_header({'Authorization': f'Bearer {issuer.issue("unknown")}'})
+    assert requests_mock.call_count == 4
+    assert demisto.setIntegrationContext.call_count == 1
+
+
+def test_validate_auth_header_refresh_failure(requests_mock, open_id_keys_cache):
+    """
+    Given
+        - cached signing keys whose TTL passed, and a Bot Framework endpoint which fails
+    When
+        - validating several tokens signed by a cached key
+    Then
+        - the keys are refreshed once within the refresh interval, and the cached key is used to authorize the tokens
+    """
+    import MicrosoftTeams
+    from MicrosoftTeams import validate_auth_header
+    issuer = TokenIssuerStandIn()
+    issuer.register(requests_mock)
+    assert validate_auth_header({'Authorization': f'Bearer {issuer.issue()}'})
+    assert requests_mock.call_count == 2
+
+    requests_mock.get('https://login.botframework.com/v1/.well-known/openidconfiguration', status_code=500)
+    MicrosoftTeams.OPEN_ID_KEYS_FETCH_TIME -= MicrosoftTeams.OPEN_ID_KEYS_TTL
+    MicrosoftTeams.OPEN_ID_KEYS_REFRESH_TIME -= MicrosoftTeams.OPEN_ID_KEYS_TTL
+    for _ in range(5):
+        assert validate_auth_header({'Authorization': f'Bearer {issuer.issue()}'})
+    assert requests_mock.call_count == 3
+
+    MicrosoftTeams.OPEN_ID_KEYS_REFRESH_TIME -= MicrosoftTeams.OPEN_ID_KEYS_REFRESH_INTERVAL
+    assert validate_auth_header({'Authorization': f'Bearer {issuer.issue()}'})
+    assert requests_mock.call_count == 4
+    assert demisto.setIntegrationContext.call_count == 1
+
+
+def test_mirror_pending_channels(mocker):
+    """
+    Given
+        - teams with several channels pending mirroring, one of them missing its mirror type
+    When
+        - running a mirror loop iteration, and then another one with nothing changed
+    Then
+        - all the valid pending channels are mirrored in the first iteration, with a single context update
+        - the second iteration does not parse the teams nor update the context
+    """
+    from MicrosoftTeams import mirror_pending_channels
+
+    def pending_channel(investigation_id: str, mirror_type: str = 'all') -> dict:
+        return {
+            'channel_id': f'19:{investigation_id}@thread.skype',
+            'investigation_id': investigation_id,
+            'mirror_type': mirror_type,
+            'mirror_direction': 'both',
+            'auto_close': 'true',
+            'mirrored': False,
+            'channel_name': f'incident-{investigation_id}'
+        }
+
+    context: dict = {
+        'teams': json.dumps([
+            {'team_id': 'team1', 'mirrored_channels': [pending_channel('1'), pending_channel('2', '')]},
+            {'team_id': 'team2', 'mirrored_channels': [pending_channel('3'), pending_channel('4')]}
+        ])
+    }
+    mocker.patch.object(demisto, 'mirrorInvestigation')
+    mocker.patch.object(demisto, 'setIntegrationContext')
+
+    assert mirror_pending_channels(context) == 3
+    assert [call[0][0] for call in demisto.mirrorInvestigation.call_args_list] == ['1', '3', '4']
+    assert demisto.setIntegrationContext.call_count == 1
+    teams = json.loads(context['teams'])
+    assert [channel['mirrored'] for team in teams for channel in team['mirrored_channels']] == [True, False, True, True]
+
+    loads = mocker.spy(json, 'loads')
+    assert mirror_pending_channels(context) == 0
+    assert mirror_pending_channels(context) == 0
+    assert loads.call_count == 1
+    assert demisto.setIntegrationContext.call_count == 1
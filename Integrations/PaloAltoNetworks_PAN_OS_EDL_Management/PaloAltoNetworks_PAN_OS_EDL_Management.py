@@ -8,6 +8,8 @@ import tempfile
 import subprocess
 import shutil
 import os
+import hashlib
+from typing import Tuple
 
 ''' GLOBALS '''
 
@@ -173,25 +175,56 @@ def edl_search_external_file_command():
     })
 
 
-def edl_update_external_file(file_path: str, list_name: str, verbose: bool) -> bool:
+def edl_external_file_checksum(file_path: str) -> str:
+    """
+    Returns the sha256 of the external file, or an empty string if it does not exist
+    """
+    result = ssh_execute(f'sha256sum \'{file_path}\' 2>/dev/null || true')
+    return result.split(' ', 1)[0] if result else ''
+
+
+def edl_update_external_file(file_path: str, list_name: str, verbose: bool, list_changed: bool = True):
+    """
+    Replaces the external file with the internal list. The list is uploaded next to the file and then moved over it,
+    so the web-server never serves a partially written file. When the internal list did not change, the upload is
+    skipped if the external file already holds the same content.
+    """
     dict_of_lists = demisto.getIntegrationContext()
-    list_data = dict_of_lists.get(list_name)
+    content = "\n".join(dict_of_lists.get(list_name) or [])
+
+    if not list_changed and \
+            edl_external_file_checksum(file_path) == hashlib.sha256(content.encode('utf-8')).hexdigest():
+        return None
 
-    file_name = file_path.rsplit('/', 1)[-1] + '.txt'
+    temp_file_path = f'{file_path}.tmp'
+    with tempfile.NamedTemporaryFile(mode='w', delete=False) as file:
+        file.write(content)
     try:
-        with open(file_name, 'w') as file:
-            file.write("\n".join(list_data))
-        success = scp_execute(file_name, file_path)
+        success = scp_execute(file.name, temp_file_path)
     finally:
-        shutil.rmtree(file_name, ignore_errors=True)
+        os.remove(file.name)
 
     if not success:
         return False
+    ssh_execute(f'mv -f \'{temp_file_path}\' \'{file_path}\'')
+    if verbose:
+        return content
     else:
-        if verbose:
-            return ssh_execute(f'cat \'{file_path}\'')
-        else:
-            return True
+        return True
+
+
+def update_list_items(list_data: list, list_items: list, add: bool) -> Tuple[list, list, list]:
+    """
+    Adds the items to the list or removes them from it.
+    Returns the sorted new list, and the items which were actually added and removed.
+    """
+    current = set(list_data or [])
+    items = set(list_items)
+    if add:
+        new = current | items
+    else:
+        new = current - items
+    return sorted(new), sorted(new - current), sorted(current - new)
 
 
 def edl_update():
@@ -208,31 +241,26 @@ def edl_update():
     verbose = demisto.args().get('verbose') == 'true'
 
     # update internal list
-    dict_of_lists = demisto.getIntegrationContext()
-    if not dict_of_lists:
-        dict_of_lists = {list_name: list_items}
+    dict_of_lists = demisto.getIntegrationContext() or {}
+    if not dict_of_lists.get(list_name, None) and not add:
+        return_error('Cannot remove items from an empty list')
+    list_items, added, removed = update_list_items(dict_of_lists.get(list_name), list_items, add)
+
+    if len(list_items) == 0:  # delete list from instance context
+        dict_of_lists.pop(list_name, None)
+        md = 'List is empty, deleted from instance context.'
+    else:
+        dict_of_lists.update({list_name: list_items})
         if verbose:
             md = tableToMarkdown('List items:', list_items, headers=[list_name])
         else:
             md = 'Instance context updated successfully'
-    else:
-        if not dict_of_lists.get(list_name, None) and not add:
-            return_error('Cannot remove items from an empty list')
-        if dict_of_lists.get(list_name, None):
-            if add:
-                list_items = list(set(dict_of_lists.get(list_name) + list_items))
-            else:
-                list_items = [item for item in dict_of_lists.get(list_name) if item not in list_items]
-
-        if len(list_items) == 0:  # delete list from instance context
-            dict_of_lists.pop(list_name, None)
-            md = 'List is empty, deleted from instance context.'
-        else:
-            dict_of_lists.update({list_name: list_items})
-            if verbose:
-                md = tableToMarkdown('List items:', list_items, headers=[list_name])
-            else:
-                md = 'Instance context updated successfully'
+    if added or removed:
+        md += f'\n\nAdded {len(added)} items and removed {len(removed)} items.'
+    if verbose and added:
+        md += tableToMarkdown('Added items:', added, headers=[list_name])
+    if verbose and removed:
+        md += tableToMarkdown('Removed items:', removed, headers=[list_name])
 
     demisto.setIntegrationContext(dict_of_lists)
     demisto.results({
@@ -242,18 +270,21 @@ def edl_update():
     })
 
     # scp internal list to file_path
-    result = edl_update_external_file(file_path, list_name, verbose)
-    if result:
-        if verbose:
-            md = tableToMarkdown('Updated File Data:', result, headers=['Data'])
-        else:
-            md = 'External file updated successfully'
+    result = edl_update_external_file(file_path, list_name, verbose, list_changed=bool(added or removed))
+    if result is False:
+        return
+    if result is None:
+        md = 'External file is already up to date'
+    elif verbose:
+        md = tableToMarkdown('Updated File Data:', result, headers=['Data'])
+    else:
+        md = 'External file updated successfully'
 
-        demisto.results({
-            'Type': entryTypes['note'],
-            'Contents': md,
-            'ContentsFormat': formats['markdown']
-        })
+    demisto.results({
+        'Type': entryTypes['note'],
+        'Contents': md,
+        'ContentsFormat': formats['markdown']
+    })
 
 
 def edl_update_from_external_file(list_name: str, file_path: str, type_: str):
@@ -267,9 +298,9 @@ def edl_update_from_external_file(list_name: str, file_path: str, type_: str):
         set_external.discard('')
         if type_ == 'merge':
             unified = set_internal.union(set_external)
-            list_data_new = list(unified)
+            list_data_new = sorted(unified)
         else:  # type_ == 'override'
-            list_data_new = list(set_external)
+            list_data_new = sorted(set_external)
         dict_of_lists.update({list_name: list_data_new})
         demisto.setIntegrationContext(dict_of_lists)
         return list_data_new
@@ -0,0 +1,111 @@
+import hashlib
+import os
+
+import pytest
+
+import demistomock as demisto
+
+PARAMS = {
+    'Authentication': {
+        'identifier': 'admin',
+        'credentials': {
+            'sshkey': 'ssh-key'
+        }
+    },
+    'hostname': 'edl.example.com'
+}
+
+
+@pytest.fixture()
+def edl(mocker):
+    mocker.patch.object(demisto, 'params', return_value=PARAMS)
+    import PaloAltoNetworks_PAN_OS_EDL_Management
+    return PaloAltoNetworks_PAN_OS_EDL_Management
+
+
+def test_update_list_items(edl):
+    """
+    Given:
+        An internal list.
+    When:
+        Adding items to it and removing items from it.
+    Then:
+        Ensure the sorted new list is returned along with the items which were actually added and removed.
+    """
+    assert edl.update_list_items(['b', 'a'], ['c', 'a'], True) == (['a', 'b', 'c'], ['c'], [])
+    assert edl.update_list_items(['b', 'a'], ['a', 'd'], False) == (['b'], [], ['a'])
+    assert edl.update_list_items(None, ['a'], True) == (['a'], ['a'], [])
+
+
+def test_edl_update_remove_from_missing_list(edl, mocker):
+    """
+    Given:
+        An empty instance context.
+    When:
+        Removing items from a list.
+    Then:
+        Ensure an error is returned and the external file is not updated.
+    """
+    mocker.patch.object(demisto, 'args', return_value={
+        'file_path': 'lists/edl.txt', 'list_name': 'edl', 'list_items': 'a', 'add_or_remove': 'remove'
+    })
+    mocker.patch.object(demisto, 'getIntegrationContext', return_value={})
+    mocker.patch.object(edl, 'return_error', side_effect=InterruptedError())
+    mocker.patch.object(edl, 'scp_execute')
+
+    with pytest.raises(InterruptedError):
+        edl.edl_update()
+
+    assert edl.return_error.call_args[0][0] == 'Cannot remove items from an empty list'
+    assert edl.scp_execute.call_count == 0
+
+
+def test_edl_update_external_file(edl, mocker):
+    """
+    Given:
+        An internal list which was changed.
+    When:
+        Updating the external file.
+    Then:
+        Ensure the list is uploaded next to the file, moved over it, and the local file is removed.
+    """
+    uploads = []
+
+    def scp_execute(file_name, file_path):
+        with open(file_name) as file:
+            uploads.append((file.read(), file_path))
+        return True
+
+    mocker.patch.object(demisto, 'getIntegrationContext', return_value={'edl': ['1.1.1.1', '2.2.2.2']})
+    mocker.patch.object(edl, 'scp_execute', side_effect=scp_execute)
+    mocker.patch.object(edl, 'ssh_execute', return_value='')
+    remove = mocker.spy(os, 'remove')
+
+    result = edl.edl_update_external_file('/var/www/edl.txt', 'edl', verbose=True)
+
+    assert result == '1.1.1.1\n2.2.2.2'
+    assert uploads == [('1.1.1.1\n2.2.2.2', '/var/www/edl.txt.tmp')]
+    assert edl.ssh_execute.call_args[0][0] == "mv -f '/var/www/edl.txt.tmp' '/var/www/edl.txt'"
+    assert not os.path.exists(remove.call_args[0][0])
+
+
+@pytest.mark.parametrize('external_content, uploaded', [('1.1.1.1', False), ('2.2.2.2', True)])
+def test_edl_update_external_file_checksum(edl, mocker, external_content, uploaded):
+    """
+    Given:
+        An internal list which did not change.
+    When:
+        Updating the external file, when it holds the same content and when it holds other content.
+    Then:
+        Ensure the list is uploaded only when the checksum of the external file differs.
+    """
+    checksum = hashlib.sha256(external_content.encode('utf-8')).hexdigest()
+    mocker.patch.object(demisto, 'getIntegrationContext', return_value={'edl': ['1.1.1.1']})
+    mocker.patch.object(edl, 'scp_execute', return_value=True)
+    mocker.patch.object(edl, 'ssh_execute', return_value=f'{checksum}  /var/www/edl.txt\n')
+
+    result = edl.edl_update_external_file('/var/www/edl.txt', 'edl', verbose=False, list_changed=False)
+
+    assert edl.ssh_execute.call_args_list[0][0][0] == "sha256sum '/var/www/edl.txt' 2>/dev/null || true"
+    assert edl.scp_execute.called is uploaded
+    assert result is (True if uploaded else None)
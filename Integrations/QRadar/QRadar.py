@@ -3,6 +3,7 @@ from CommonServerPython import *
 from CommonServerUserPython import *
 import os
 import json
+import time
 import requests
 import traceback
 import urllib
@@ -24,6 +25,16 @@ if TOKEN:
     AUTH_HEADERS['SEC'] = str(TOKEN)
 OFFENSES_PER_CALL = int(demisto.params().get('offensesPerCall', 50))
 OFFENSES_PER_CALL = 50 if OFFENSES_PER_CALL > 50 else OFFENSES_PER_CALL
+# Number of API requests sent, reset on each fetch
+REQUESTS_COUNT = 0
+# Maximal number of address ids to resolve in a single request
+ADDRESSES_PER_CALL = 100
+# Search polling interval bounds (in seconds)
+SEARCH_MIN_POLL_INTERVAL = 1
+SEARCH_MAX_POLL_INTERVAL = 30
+SEARCH_RESULTS_PER_CALL = 1000
+# Connections are kept alive and reused between requests
+SESSION = requests.Session()
 
 if not TOKEN and not (USERNAME and PASSWORD):
     raise Exception('Either credentials or auth token should be provided.')
@@ -199,18 +210,21 @@ def dict_values_to_comma_separated_string(dic):
     return ','.join(convert_to_str(v) for v in dic.itervalues())
 
 
-# Sends request to the server using the given method, url, headers and params
-def send_request(method, url, headers=AUTH_HEADERS, params=None):
+# Sends request to the server using the given method, url, headers and params. If full_response is set, returns the
+# response object instead of its json
+def send_request(method, url, headers=AUTH_HEADERS, params=None, full_response=False):
+    global REQUESTS_COUNT
+    REQUESTS_COUNT += 1
     try:
         log_hdr = deepcopy(headers)
         log_hdr.pop('SEC', None)
         LOG('qradar is attempting {method} request sent to {url} with headers:\n{headers}\nparams:\n{params}'
             .format(method=method, url=url, headers=json.dumps(log_hdr, indent=4), params=json.dumps(params, indent=4)))
         if TOKEN:
-            res = requests.request(method, url, headers=headers, params=params, verify=USE_SSL)
+            res = SESSION.request(method, url, headers=headers, params=params, verify=USE_SSL)
         else:
-            res = requests.request(method, url, headers=headers, params=params, verify=USE_SSL,
-                                   auth=(USERNAME, PASSWORD))
+            res = SESSION.request(method, url, headers=headers, params=params, verify=USE_SSL,
+                                  auth=(USERNAME, PASSWORD))
         res.raise_for_status()
     except HTTPError:
         err_json = res.json()
@@ -222,6 +236,8 @@ def send_request(method, url, headers=AUTH_HEADERS, params=None):
         if 'code' in err_json:
             err_msg = err_msg + 'QRadar Error Code: {0}'.format(err_json['code'])
         raise Exception(err_msg)
+    if full_response:
+        return res
     return res.json()
 
 
@@ -304,6 +320,20 @@ def get_offenses(_range, _filter='', _fields=''):
     return send_request('GET', full_url, headers, params)
 
 
+# Returns the result of an offenses request, and the total number of offenses matching the filter as reported by
+# the Content-Range header (None if the header is missing)
+def get_offenses_with_total(_range, _filter=''):
+    full_url = '{0}/api/siem/offenses'.format(SERVER)
+    params = {'filter': _filter} if _filter else {}
+    headers = dict(AUTH_HEADERS)
+    headers['Range'] = 'items={0}'.format(_range)
+    res = send_request('GET', full_url, headers, params, full_response=True)
+    # Content-Range format: items 0-49/1234
+    content_range = res.headers.get('Content-Range', '')
+    total = content_range.rpartition('/')[2]
+    return res.json(), int(total) if total.isdigit() else None
+
+
 # Returns the result of a single offense request
 def get_offense_by_id(offense_id, _filter='', _fields=''):
     full_url = '{0}/api/siem/offenses/{1}'.format(SERVER, offense_id)
@@ -341,6 +371,41 @@ def get_search_results(search_id, _range=''):
     return send_request('GET', url, headers)
 
 
+# Polls a search with a growing interval until it is completed, and returns the search object
+def wait_for_search(search_id, timeout):
+    deadline = time.time() + timeout
+    interval = SEARCH_MIN_POLL_INTERVAL
+    while True:
+        search_obj = get_search(search_id)
+        status = search_obj.get('status')
+        if status == 'COMPLETED':
+            return search_obj
+        if status in ('CANCELED', 'ERROR'):
+            raise Exception('Search {0} ended with status {1}'.format(search_id, status))
+        if time.time() + interval > deadline:
+            raise Exception('Search {0} was not completed within {1} seconds, status: {2}'
+                            .format(search_id, timeout, status))
+        time.sleep(interval)
+        interval = min(interval * 2, SEARCH_MAX_POLL_INTERVAL)
+
+
+# Yields the results of a completed search page by page using the Range header, instead of getting them all in a
+# single response. Each page is a tuple of the result key (e.g. events/flows) and the page results
+def iter_search_results(search_id, record_count, page_size=None, limit=None):
+    page_size = page_size or SEARCH_RESULTS_PER_CALL
+    total = min(record_count, limit) if limit else record_count
+    start = 0
+    while start < total:
+        end = min(start + page_size, total) - 1
+        page = get_search_results(search_id, '{0}-{1}'.format(start, end))
+        result_key = page.keys()[0]
+        results = page[result_key]
+        if not results:
+            return
+        yield result_key, results
+        start += len(results)
+
+
 # Returns the result of an assets request
 def get_assets(_range='', _filter='', _fields=''):
     url = '{0}/api/asset_model/assets'.format(SERVER)
@@ -466,6 +531,8 @@ def test_module():
 
 
 def fetch_incidents():
+    global REQUESTS_COUNT
+    REQUESTS_COUNT = 0
     query = demisto.params().get('query')
     last_run = demisto.getLastRun()
     offense_id = last_run['id'] if last_run and 'id' in last_run else 0
@@ -475,40 +542,63 @@ def fetch_incidents():
     else:
         fetch_query = 'id>{0} {1}'.format(offense_id, 'AND ({0})'.format(query) if query else '')
         # qradar returns offenses sorted desc on id and there's no way to change sorting.
-        # if we get `offensesPerCall` offenses it means we (probably) have more than that so we
-        # start looking for the end of the list by doubling the page position until we're empty.
-        # then start binary search back until you find the end of the list and finally return
-        # `offensesPerCall` from the end.
-    raw_offenses = get_offenses(_range='0-{0}'.format(OFFENSES_PER_CALL), _filter=fetch_query)
+        # if we get `offensesPerCall` offenses it means we (probably) have more than that so we take the position of
+        # the end of the list from the total count qradar returns in the Content-Range header, and return
+        # `offensesPerCall` from the end. if the header is missing we fall back to searching for the end of the list,
+        # starting from the position kept in the last run.
+    raw_offenses, total = get_offenses_with_total(_range='0-{0}'.format(OFFENSES_PER_CALL - 1), _filter=fetch_query)
+    last_offense_pos = len(raw_offenses) - 1
     if len(raw_offenses) >= OFFENSES_PER_CALL:
-        last_offense_pos = find_last_page_pos(fetch_query)
-        raw_offenses = get_offenses(_range='{0}-{1}'.format(last_offense_pos - OFFENSES_PER_CALL + 1, last_offense_pos),
-                                    _filter=fetch_query)
+        if total is not None:
+            last_offense_pos = total - 1
+        else:
+            last_offense_pos = find_last_page_pos(fetch_query, last_run.get('position') if last_run else None)
+        if last_offense_pos >= OFFENSES_PER_CALL:
+            raw_offenses = get_offenses(
+                _range='{0}-{1}'.format(last_offense_pos - OFFENSES_PER_CALL + 1, last_offense_pos),
+                _filter=fetch_query)
     raw_offenses = unicode_to_str_recur(raw_offenses)
     incidents = []
     enrich_offense_res_with_source_and_destination_address(raw_offenses)
     for offense in raw_offenses:
         offense_id = max(offense_id, offense['id'])
         incidents.append(create_incident_from_offense(offense))
-    demisto.setLastRun({'id': offense_id})
+    # the offenses left behind the ones we fetched are the end of the list in the next fetch
+    demisto.setLastRun({'id': offense_id, 'position': max(last_offense_pos - OFFENSES_PER_CALL, 0)})
+    demisto.debug('QRadar fetch-incidents fetched {0} offenses using {1} API requests'
+                  .format(len(incidents), REQUESTS_COUNT))
     return incidents
 
 
-# Finds the last page position for QRadar query that receives a range parameter
-def find_last_page_pos(fetch_query):
-    # Make sure it wasn't a fluke we have exactly OFFENSES_PER_CALL results
-    if len(get_offenses(_range='{0}-{0}'.format(OFFENSES_PER_CALL), _filter=fetch_query)) == 0:
-        return OFFENSES_PER_CALL - 1
-    # Search up until we don't have any more results
-    pos = OFFENSES_PER_CALL * 2
-    while len(get_offenses(_range='{0}-{0}'.format(pos), _filter=fetch_query)) == 1:
-        pos = pos * 2
-    # Binary search the gap from the las step
-    high = pos
-    low = pos / 2
+# Finds the last page position for QRadar query that receives a range parameter. Assumes the query has at least
+# OFFENSES_PER_CALL results. position_hint is a position that is probably close to the end of the list.
+def find_last_page_pos(fetch_query, position_hint=None):
+    def has_offense_at(position):
+        return len(get_offenses(_range='{0}-{0}'.format(position), _filter=fetch_query)) == 1
+
+    low = OFFENSES_PER_CALL - 1
+    high = None
+    hinted = position_hint and position_hint > low
+    if hinted:
+        if has_offense_at(position_hint):
+            low = position_hint
+        else:
+            high = position_hint
+    if high is None:
+        # Make sure it wasn't a fluke we have exactly `low` results
+        pos = low + 1
+        step = 1
+        # Search up until we don't have any more results. Near the hint the gap is grown from 1, otherwise the position
+        # is doubled
+        while has_offense_at(pos):
+            low = pos
+            step *= 2
+            pos = low + step if hinted else pos * 2
+        high = pos
+    # Binary search the gap from the last step
     while high > low + 1:
-        pos = (high + low) / 2
-        if len(get_offenses(_range='{0}-{0}'.format(pos), _filter=fetch_query)) == 1:
+        pos = (high + low) // 2
+        if has_offense_at(pos):
             # we still have results, raise the bar
             low = pos
         else:
@@ -619,24 +709,30 @@ def populate_src_and_dst_dicts_with_single_offense(offense, src_ids, dst_ids):
     return None
 
 
+# Helper method: Returns the addresses of the given ids from an addresses endpoint, requesting up to
+# ADDRESSES_PER_CALL ids at a time
+def get_addresses_by_ids(endpoint, ip_field, address_ids):
+    url = '{0}/api/siem/{1}'.format(SERVER, endpoint)
+    address_ids = sorted(address_ids)
+    addresses = {}
+    for i in range(0, len(address_ids), ADDRESSES_PER_CALL):
+        ids_str = ','.join(convert_to_str(address_id) for address_id in address_ids[i:i + ADDRESSES_PER_CALL])
+        params = {'filter': 'id in ({0})'.format(ids_str), 'fields': 'id,{0}'.format(ip_field)}
+        for address in send_request('GET', url, AUTH_HEADERS, params=params):
+            addresses[address['id']] = convert_to_str(address[ip_field])
+    return addresses
+
+
 # Helper method: Enriches the source addresses ids dictionary with the source addresses values corresponding to the ids
 def enrich_source_addresses_dict(src_adrs):
-    src_ids_str = dict_values_to_comma_separated_string(src_adrs)
-    source_url = '{0}/api/siem/source_addresses?filter=id in ({1})'.format(SERVER, src_ids_str)
-    src_res = send_request('GET', source_url, AUTH_HEADERS)
-    for src_adr in src_res:
-        src_adrs[src_adr['id']] = convert_to_str(src_adr['source_ip'])
+    src_adrs.update(get_addresses_by_ids('source_addresses', 'source_ip', src_adrs.keys()))
     return src_adrs
 
 
 # Helper method: Enriches the destination addresses ids dictionary with the source addresses values corresponding to
 # the ids
 def enrich_destination_addresses_dict(dst_adrs):
-    dst_ids_str = dict_values_to_comma_separated_string(dst_adrs)
-    destination_url = '{0}/api/siem/local_destination_addresses?filter=id in ({1})'.format(SERVER, dst_ids_str)
-    dst_res = send_request('GET', destination_url, AUTH_HEADERS)
-    for dst_adr in dst_res:
-        dst_adrs[dst_adr['id']] = convert_to_str(dst_adr['local_destination_ip'])
+    dst_adrs.update(get_addresses_by_ids('local_destination_addresses', 'local_destination_ip', dst_adrs.keys()))
     return dst_adrs
 
 
@@ -724,6 +820,25 @@ def get_search_results_command():
                                 human_readable=human_readable)
 
 
+def run_search_command():
+    args = demisto.args()
+    timeout = int(args.get('timeout', 600))
+    limit = int(args.get('limit')) if args.get('limit') else None
+    search_obj = search({'query_expression': args.get('query_expression')})
+    search_id = search_obj['search_id']
+    search_obj = wait_for_search(search_id, timeout)
+    result_key = None
+    results = []  # type: list
+    for result_key, page in iter_search_results(search_id, search_obj.get('record_count', 0), limit=limit):
+        results.extend(unicode_to_str_recur(page))
+    title = 'QRadar Search Results from {}'.format(convert_to_str(result_key or 'search {0}'.format(search_id)))
+    context_key = args.get('output_path') if args.get(
+        'output_path') else 'QRadar.Search(val.ID === "{0}").Result.{1}'.format(search_id, result_key)
+    human_readable = tableToMarkdown(title, results, None).replace('\t', '\n')
+    return get_entry_for_object(title, results, {result_key: results} if result_key else {}, args.get('headers'),
+                                context_key, human_readable=human_readable)
+
+
 def get_assets_command():
     raw_assets = get_assets(demisto.args().get('range'), demisto.args().get('filter'), demisto.args().get('fields'))
     assets_result, human_readable_res = create_assets_result(deepcopy(raw_assets))
@@ -1043,6 +1158,8 @@ try:
         demisto.results(get_search_command())
     elif demisto.command() in ['qradar-get-search-results', 'qr-get-search-results']:
         demisto.results(get_search_results_command())
+    elif demisto.command() == 'qradar-run-search':
+        demisto.results(run_search_command())
     elif demisto.command() in ['qradar-get-assets', 'qr-get-assets']:
         demisto.results(get_assets_command())
     elif demisto.command() == 'qradar-get-asset-by-id':
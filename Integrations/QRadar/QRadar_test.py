@@ -143,6 +143,190 @@ def test_delete_reference_set_value(mocker):
         NON_URL_SAFE_MSG_URL_ENCODED), params={'name': NON_URL_SAFE_MSG, 'value': 'value'})
 
 
+class QRadarOffensesStandIn(object):
+    """
+    A local stand-in for the QRadar offenses API. Returns the offenses matching an `id>X` filter sorted desc by id,
+    and honors the Range header like QRadar does.
+    """
+    def __init__(self, offenses_count, content_range=True):
+        self.offense_ids = list(range(offenses_count, 0, -1))
+        self.content_range = content_range
+        self.requests_count = 0
+
+    def __call__(self, request, context):
+        import re
+        self.requests_count += 1
+        min_id = int(re.match(r'id>(\d+)', request.qs['filter'][0]).group(1))
+        matching = [i for i in self.offense_ids if i > min_id]
+        start, end = [int(pos) for pos in request.headers['Range'].replace('items=', '').split('-')]
+        page = matching[start:end + 1]
+        if self.content_range:
+            context.headers['Content-Range'] = 'items {0}-{1}/{2}'.format(start, end, len(matching))
+        return [{'id': i, 'description': 'offense {0}'.format(i), 'start_time': 1563433305606} for i in page]
+
+
+@pytest.mark.parametrize('content_range', [True, False])
+def test_fetch_incidents_oldest_offenses_first(mocker, requests_mock, content_range):
+    """
+    Given:
+        - 1000 offenses in QRadar
+    When
+        - Fetching incidents for the first time, with and without the Content-Range header in the response
+    Then
+        - The oldest offenses are fetched and the last run holds the newest fetched id and the remaining position
+        - With the Content-Range header only two requests are sent
+    """
+    import QRadar as qradar
+    stand_in = QRadarOffensesStandIn(1000, content_range)
+    mocker.patch.object(qradar, 'SERVER', 'https://qradar.test')
+    mocker.patch.object(demisto, 'getLastRun', return_value={})
+    mocker.patch.object(demisto, 'setLastRun')
+    requests_mock.get('https://qradar.test/api/siem/offenses', json=stand_in)
+
+    incidents = qradar.fetch_incidents()
+
+    assert [incident['name'].split()[0] for incident in incidents] == [str(i) for i in range(50, 0, -1)]
+    assert demisto.setLastRun.call_args[0][0] == {'id': 50, 'position': 949}
+    assert qradar.REQUESTS_COUNT == stand_in.requests_count
+    if content_range:
+        assert stand_in.requests_count == 2
+
+
+def test_fetch_incidents_position_hint(mocker, requests_mock):
+    """
+    Given:
+        - The position kept in the last run and no Content-Range header in the responses
+    When
+        - Fetching incidents after new offenses were created
+    Then
+        - The end of the list is found with less requests than when searching without the kept position
+    """
+    import QRadar as qradar
+    mocker.patch.object(qradar, 'SERVER', 'https://qradar.test')
+    mocker.patch.object(demisto, 'setLastRun')
+    requests_counts = []
+    for last_run in ({'id': 50}, {'id': 50, 'position': 949}):
+        stand_in = QRadarOffensesStandIn(1010, content_range=False)
+        mocker.patch.object(demisto, 'getLastRun', return_value=last_run)
+        requests_mock.get('https://qradar.test/api/siem/offenses', json=stand_in)
+
+        incidents = qradar.fetch_incidents()
+
+        assert [incident['name'].split()[0] for incident in incidents] == [str(i) for i in range(100, 50, -1)]
+        assert demisto.setLastRun.call_args[0][0] == {'id': 100, 'position': 909}
+        requests_counts.append(stand_in.requests_count)
+    assert requests_counts[1] < requests_counts[0]
+
+
+def test_fetch_incidents_single_page(mocker, requests_mock):
+    """
+    Given:
+        - Less offenses than offensesPerCall newer than the last run
+    When
+        - Fetching incidents
+    Then
+        - A single request is sent
+    """
+    import QRadar as qradar
+    stand_in = QRadarOffensesStandIn(60)
+    mocker.patch.object(qradar, 'SERVER', 'https://qradar.test')
+    mocker.patch.object(demisto, 'getLastRun', return_value={'id': 50})
+    mocker.patch.object(demisto, 'setLastRun')
+    requests_mock.get('https://qradar.test/api/siem/offenses', json=stand_in)
+
+    incidents = qradar.fetch_incidents()
+
+    assert len(incidents) == 10
+    assert demisto.setLastRun.call_args[0][0] == {'id': 60, 'position': 0}
+    assert stand_in.requests_count == 1
+
+
+def test_enrich_offense_res_with_source_and_destination_address_batches(mocker, requests_mock):
+    """
+    Given:
+        - Fetched offenses which share source and destination addresses
+    When
+        - I enrich the offenses with source and destination addresses
+    Then
+        - Each address id is requested once, in batches of ADDRESSES_PER_CALL ids
+    """
+    import QRadar as qradar
+    mocker.patch.object(qradar, 'SERVER', 'https://qradar.test')
+    mocker.patch.object(qradar, 'ADDRESSES_PER_CALL', 2)
+
+    def addresses_stand_in(ip_field):
+        def callback(request, context):
+            ids = request.qs['filter'][0].replace('id in (', '').replace(')', '').split(',')
+            return [{'id': int(i), ip_field: '10.0.0.{0}'.format(i)} for i in ids]
+        return callback
+
+    src_mock = requests_mock.get('https://qradar.test/api/siem/source_addresses',
+                                 json=addresses_stand_in('source_ip'))
+    dst_mock = requests_mock.get('https://qradar.test/api/siem/local_destination_addresses',
+                                 json=addresses_stand_in('local_destination_ip'))
+    offenses = [{'source_address_ids': [1, 2], 'local_destination_address_ids': [5]},
+                {'source_address_ids': [2, 3], 'local_destination_address_ids': [5]}]
+
+    qradar.enrich_offense_res_with_source_and_destination_address(offenses)
+
+    assert offenses == [{'source_address_ids': ['10.0.0.1', '10.0.0.2'], 'local_destination_address_ids': ['10.0.0.5']},
+                        {'source_address_ids': ['10.0.0.2', '10.0.0.3'], 'local_destination_address_ids': ['10.0.0.5']}]
+    assert src_mock.call_count == 2
+    assert dst_mock.call_count == 1
+
+
+def test_run_search(mocker, requests_mock):
+    """
+    Given:
+        - A search which completes after a few polls, with 5 results
+    When
+        - Running the search and getting its results
+    Then
+        - The search is polled with a growing interval and the results are requested page by page
+    """
+    import QRadar as qradar
+    mocker.patch.object(qradar, 'SERVER', 'https://qradar.test')
+    mocker.patch.object(qradar, 'SEARCH_RESULTS_PER_CALL', 2)
+    mocker.patch.object(qradar.time, 'sleep')
+    mocker.patch.object(demisto, 'args', return_value={'query_expression': 'select * from events'})
+    statuses = ['WAIT', 'EXECUTE', 'SORTING', 'COMPLETED']
+    events = [{'qid': i} for i in range(5)]
+
+    def results_stand_in(request, context):
+        start, end = [int(pos) for pos in request.headers['Range'].replace('items=', '').split('-')]
+        return {'events': events[start:end + 1]}
+
+    requests_mock.post('https://qradar.test/api/ariel/searches', json={'search_id': 's1', 'status': 'WAIT'})
+    requests_mock.get('https://qradar.test/api/ariel/searches/s1', [
+        {'json': {'search_id': 's1', 'status': status, 'record_count': 5}} for status in statuses])
+    results_mock = requests_mock.get('https://qradar.test/api/ariel/searches/s1/results', json=results_stand_in)
+
+    entry = qradar.run_search_command()
+
+    assert entry['EntryContext'] == {'QRadar.Search(val.ID === "s1").Result.events': events}
+    assert [call[0][0] for call in qradar.time.sleep.call_args_list] == [1, 2, 4]
+    assert [r.headers['Range'] for r in results_mock.request_history] == ['items=0-1', 'items=2-3', 'items=4-4']
+
+
+def test_wait_for_search_timeout(mocker, requests_mock):
+    """
+    Given:
+        - A search which does not complete
+    When
+        - Waiting for the search with a timeout
+    Then
+        - An error is raised once the timeout passes
+    """
+    import QRadar as qradar
+    mocker.patch.object(qradar, 'SERVER', 'https://qradar.test')
+    mocker.patch.object(qradar.time, 'sleep')
+    requests_mock.get('https://qradar.test/api/ariel/searches/s1', json={'search_id': 's1', 'status': 'EXECUTE'})
+
+    with pytest.raises(Exception, match='was not completed within 3 seconds'):
+        qradar.wait_for_search('s1', 3)
+    assert [call[0][0] for call in qradar.time.sleep.call_args_list] == [1, 2]
+
+
 """ CONSTANTS """
 REQUEST_HEADERS = {'Content-Type': 'application/json', 'SEC': 'token'}
 NON_URL_SAFE_MSG = 'non-safe/;/?:@=&"<>#%{}|\\^~[] `'
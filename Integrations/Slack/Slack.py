@@ -3,10 +3,11 @@ from CommonServerPython import *
 from CommonServerUserPython import *
 import slack
 from slack.errors import SlackApiError
+import aiohttp
 
 from distutils.util import strtobool
+import copy
 import asyncio
-import concurrent
 import requests
 from typing import Tuple
 
@@ -38,7 +39,20 @@ PLAYGROUND_INVESTIGATION_TYPE = 9
 WARNING_ENTRY_TYPE = 11
 ENDPOINT_URL = 'https://oproxy.demisto.ninja/slack-poll'
 POLL_INTERVAL_MINUTES = 1
+# The maximal number of concurrent requests when polling for answers
+POLL_CONCURRENCY = 10
+# The user directory is synced by the long running loop in this interval
+USERS_SYNC_INTERVAL_MINUTES = 60
+# A user which is not found is not looked up again in the workspace for this long
+MISSING_USER_TTL_MINUTES = 60
 DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+# The field identifying the items of each integration context collection, used to merge concurrent updates
+CONTEXT_ID_FIELDS = {
+    'users': 'id',
+    'conversations': 'id',
+    'mirrors': 'investigation_id',
+    'questions': 'entitlement'
+}
 
 ''' GLOBALS '''
 
@@ -46,6 +60,8 @@ DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
 BOT_TOKEN: str
 ACCESS_TOKEN: str
 PROXY: str
+# Integration context collection key -> (stored JSON, items, field -> value -> items)
+CONTEXT_INDEXES: dict = {}
 DEDICATED_CHANNEL: str
 CLIENT: slack.WebClient
 CHANNEL_CLIENT: slack.WebClient
@@ -100,41 +116,105 @@ def get_user_by_name(user_to_search: str) -> dict:
     :param user_to_search: The user name or email
     :return: A slack user object
     """
+    user_to_search = user_to_search.lower()
+    user = find_user(user_to_search)
+    if user:
+        return user
+
+    # The user directory is synced at most once in an interval (by the long running loop if it is enabled),
+    # in between unknown users are only looked up by email
+    users_sync_time = demisto.getIntegrationContext().get('users_sync_time', 0)
+    if time.time() - users_sync_time >= USERS_SYNC_INTERVAL_MINUTES * 60:
+        sync_users()
+        return find_user(user_to_search)
+    if '@' not in user_to_search:
+        return {}
+
+    # Misses are cached, so an unknown email is not looked up on every search
+    now = int(time.time())
+    missing_users = json.loads(demisto.getIntegrationContext().get('missing_users') or '{}')
+    if now - missing_users.get(user_to_search, 0) < MISSING_USER_TTL_MINUTES * 60:
+        return {}
+    try:
+        user = CLIENT.users_lookupByEmail(email=user_to_search).get('user', {})
+    except SlackApiError as e:
+        if e.response.get('error') != 'users_not_found':
+            raise
+        user = {}
+    if user:
+        add_user_to_integration_context(user)
+    else:
+        integration_context = demisto.getIntegrationContext()
+        missing_users = json.loads(integration_context.get('missing_users') or '{}')
+        missing_users[user_to_search] = now
+        integration_context['missing_users'] = json.dumps(missing_users)
+        demisto.setIntegrationContext(integration_context)
 
-    user: dict = {}
-    users: list = []
-    integration_context = demisto.getIntegrationContext()
+    return user
 
-    user_to_search = user_to_search.lower()
-    if integration_context.get('users'):
-        users = json.loads(integration_context['users'])
-        users_filter = list(filter(lambda u: u.get('name', '').lower() == user_to_search
-                                             or u.get('profile', {}).get('email', '').lower() == user_to_search
-                                             or u.get('real_name', '').lower() == user_to_search, users))
-        if users_filter:
-            user = users_filter[0]
-    if not user:
-        response = CLIENT.users_list(limit=200)
-        while True:
-            workspace_users = response['members'] if response and response.get('members', []) else []
-            cursor = response.get('response_metadata', {}).get('next_cursor')
-            users_filter = list(filter(lambda u: u.get('name', '').lower() == user_to_search
-                                                 or u.get('profile', {}).get('email', '').lower() == user_to_search
-                                                 or u.get('real_name', '').lower() == user_to_search, workspace_users))
-            if users_filter:
-                break
-            if not cursor:
-                break
-            response = CLIENT.users_list(limit=200, cursor=cursor)
 
+def find_user(user_to_search: str) -> dict:
+    """
+    Finds a slack user in the synced user directory
+    :param user_to_search: The user name, email or real name
+    :return: A slack user object
+    """
+    integration_context = demisto.getIntegrationContext()
+    for field in ('name', 'profile.email', 'real_name'):
+        users_filter = get_from_integration_context('users', field, user_to_search, integration_context)
         if users_filter:
-            user = users_filter[0]
-            users.append(user)
-            set_to_latest_integration_context('users', users)
-        else:
-            return {}
+            return users_filter[0]
 
-    return user
+    return {}
+
+
+def get_user_summary(user: dict) -> dict:
+    """
+    Gets the fields of a slack user which are kept in the user directory
+    :param user: The slack user object
+    :return: The user ID, name, real name and email
+    """
+    return {
+        'id': user.get('id'),
+        'name': user.get('name'),
+        'real_name': user.get('real_name'),
+        'profile': {
+            'email': user.get('profile', {}).get('email')
+        }
+    }
+
+
+def add_user_to_integration_context(user: dict):
+    """
+    Adds a slack user to the synced user directory
+    :param user: The slack user object
+    """
+    users, version = load_integration_context_collection('users')
+    users.append(get_user_summary(user))
+    set_to_latest_integration_context('users', users, version)
+
+
+def sync_users():
+    """
+    Syncs the workspace user directory to the integration context
+    """
+    users: list = []
+    response = CLIENT.users_list(limit=200)
+    while True:
+        members = response['members'] if response and response.get('members', []) else []
+        users.extend(get_user_summary(member) for member in members)
+        cursor = response.get('response_metadata', {}).get('next_cursor') if response else None
+        if not cursor:
+            break
+        response = CLIENT.users_list(limit=200, cursor=cursor)
+
+    _, version = load_integration_context_collection('users')
+    set_to_latest_integration_context('users', users, version)
+    integration_context = demisto.getIntegrationContext()
+    integration_context['users_sync_time'] = int(time.time())
+    integration_context['missing_users'] = json.dumps({})
+    demisto.setIntegrationContext(integration_context)
+    demisto.debug('Slack - synced {} users'.format(len(users)))
 
 
 def search_slack_users(users) -> list:
@@ -165,27 +245,122 @@ def find_mirror_by_investigation() -> dict:
     mirror: dict = {}
     investigation = demisto.investigation()
     if investigation:
-        integration_context = demisto.getIntegrationContext()
-        if integration_context.get('mirrors'):
-            mirrors = json.loads(integration_context['mirrors'])
-            investigation_filter = list(filter(lambda m: investigation.get('id') == m['investigation_id'],
-                                               mirrors))
-            if investigation_filter:
-                mirror = investigation_filter[0]
+        investigation_filter = get_from_integration_context('mirrors', 'investigation_id', investigation.get('id'))
+        if investigation_filter:
+            mirror = investigation_filter[0]
 
     return mirror
 
 
-def set_to_latest_integration_context(key: str, value, wait: bool = False):
-    if wait:
-        time.sleep(5)
+def get_item_field(item: dict, field: str):
+    """
+    Gets a field of an integration context item
+    :param item: The item
+    :param field: The field name, nested fields are separated by dots
+    :return: The field value, lower cased if it is a string
+    """
+    value = item
+    for part in field.split('.'):
+        value = value.get(part) if isinstance(value, dict) else None
+    return value.lower() if isinstance(value, str) else value
+
+
+def get_from_integration_context(key: str, field: str, value, integration_context: dict = None) -> list:
+    """
+    Gets the items of an integration context collection with a given field value. The collection is parsed and
+    indexed once per stored version, so repeated lookups do not go over the whole collection.
+    :param key: The collection key in the integration context, e.g. users
+    :param field: The field to look up, nested fields are separated by dots
+    :param value: The value to look up, strings are compared case insensitively
+    :param integration_context: The integration context, if already retrieved
+    :return: Copies of the matching items, in the collection order
+    """
+    if value is None or value == '':
+        return []
+    if integration_context is None:
+        integration_context = demisto.getIntegrationContext()
+    stored = integration_context.get(key) or ''
+    cached = CONTEXT_INDEXES.get(key)
+    if not cached or cached[0] != stored:
+        cached = (stored, json.loads(stored) if stored else [], {})
+        CONTEXT_INDEXES[key] = cached
+    items, indexes = cached[1], cached[2]
+    index = indexes.get(field)
+    if index is None:
+        index = {}
+        for item in items:
+            index.setdefault(get_item_field(item, field), []).append(item)
+        indexes[field] = index
+
+    # The indexed items are shared between lookups, so copies are returned
+    return copy.deepcopy(index.get(value.lower() if isinstance(value, str) else value, []))
+
+
+def load_integration_context_collection(key: str, integration_context: dict = None) -> Tuple[list, str]:
+    """
+    Loads an integration context collection in order to update it. The loaded version is returned along with the
+    items and is passed back when writing the collection, so updates made to it in the meantime are merged.
+    :param key: The collection key in the integration context, e.g. users
+    :param integration_context: The integration context, if already retrieved
+    :return: The collection items and their version
+    """
+    if integration_context is None:
+        integration_context = demisto.getIntegrationContext()
+    stored = integration_context.get(key) or ''
+
+    return json.loads(stored) if stored else [], stored
+
+
+def merge_integration_context_collection(base: list, value: list, latest: list, id_field: str) -> list:
+    """
+    Applies the changes made to a collection on top of a newer version of it
+    :param base: The collection the changes were made to
+    :param value: The changed collection
+    :param latest: The newer version of the collection
+    :param id_field: The field identifying the collection items
+    :return: The merged collection
+    """
+    base_items = {item.get(id_field): item for item in base}
+    value_ids = set()
+    changed_items = {}
+    for item in value:
+        item_id = item.get(id_field)
+        value_ids.add(item_id)
+        if base_items.get(item_id) != item:
+            changed_items[item_id] = item
+    removed_ids = set(base_items) - value_ids
 
+    merged = [changed_items.pop(item.get(id_field), item) for item in latest if item.get(id_field) not in removed_ids]
+    merged.extend(changed_items.values())
+
+    return merged
+
+
+def set_to_latest_integration_context(key: str, value, version: str = None) -> str:
+    """
+    Writes a collection to the integration context. If the collection was loaded for the update and was changed
+    since (by the long running loop or another command), the update is merged into the stored collection.
+    :param key: The collection key in the integration context, e.g. users
+    :param value: The collection items
+    :param version: The version the collection was loaded at, if it was loaded for the update
+    :return: The version of the written items, to pass on a subsequent update of the same items
+    """
     integration_context = demisto.getIntegrationContext()
 
-    integration_context[key] = json.dumps(value)
+    written = json.dumps(value)
+    latest = integration_context.get(key) or ''
+    if version is not None and version != latest and key in CONTEXT_ID_FIELDS:
+        demisto.debug('Slack - the {} in the integration context were updated, merging'.format(key))
+        value = merge_integration_context_collection(json.loads(version) if version else [], value,
+                                                     json.loads(latest) if latest else [], CONTEXT_ID_FIELDS[key])
+        integration_context[key] = json.dumps(value)
+    else:
+        integration_context[key] = written
 
     demisto.setIntegrationContext(integration_context)
 
+    return written
+
 
 ''' MIRRORING '''
 
@@ -207,20 +382,17 @@ async def get_slack_name(slack_id: str, client) -> str:
     if prefix in ['C', 'D', 'G']:
         slack_id = slack_id.split('|')[0]
         conversation: dict = {}
-        if integration_context.get('conversations'):
-            conversations = list(filter(lambda c: c['id'] == slack_id,
-                                        json.loads(integration_context['conversations'])))
-            if conversations:
-                conversation = conversations[0]
+        conversations = get_from_integration_context('conversations', 'id', slack_id, integration_context)
+        if conversations:
+            conversation = conversations[0]
         if not conversation:
             conversation = (await client.conversations_info(channel=slack_id)).get('channel', {})
         slack_name = conversation.get('name', '')
     elif prefix == 'U':
         user: dict = {}
-        if integration_context.get('users'):
-            users = list(filter(lambda u: u['id'] == slack_id, json.loads(integration_context['users'])))
-            if users:
-                user = users[0]
+        users = get_from_integration_context('users', 'id', slack_id, integration_context)
+        if users:
+            user = users[0]
         if not user:
             user = (await client.users_info(user=slack_id)).get('user', {})
 
@@ -298,14 +470,8 @@ def mirror_investigation():
 
     integration_context = demisto.getIntegrationContext()
 
-    if not integration_context or not integration_context.get('mirrors', []):
-        mirrors: list = []
-    else:
-        mirrors = json.loads(integration_context['mirrors'])
-    if not integration_context or not integration_context.get('conversations', []):
-        conversations: list = []
-    else:
-        conversations = json.loads(integration_context['conversations'])
+    mirrors, mirrors_version = load_integration_context_collection('mirrors', integration_context)
+    conversations, conversations_version = load_integration_context_collection('conversations', integration_context)
 
     investigation_id = investigation.get('id')
     users = investigation.get('users')
@@ -401,8 +567,8 @@ def mirror_investigation():
 
     mirrors.append(mirror)
 
-    set_to_latest_integration_context('mirrors', mirrors)
-    set_to_latest_integration_context('conversations', conversations)
+    set_to_latest_integration_context('mirrors', mirrors, mirrors_version)
+    set_to_latest_integration_context('conversations', conversations, conversations_version)
 
     if kick_admin:
         CHANNEL_CLIENT.conversations_leave(channel=conversation_id)
@@ -423,48 +589,88 @@ def mirror_investigation():
     demisto.results('Investigation mirrored successfully, channel: {}'.format(conversation_name))
 
 
-def long_running_loop():
+async def long_running_loop():
     """
     Runs in a long running container - checking for newly mirrored investigations and answered questions.
     """
-    while True:
-        error = ''
-        try:
-            check_for_mirrors()
-            check_for_answers(datetime.utcnow())
-        except requests.exceptions.ConnectionError as e:
-            error = 'Could not connect to the Slack endpoint: {}'.format(str(e))
-        except Exception as e:
-            error = 'An error occurred: {}'.format(str(e))
-            demisto.error(error)
-        finally:
-            if error:
-                demisto.updateModuleHealth(error)
-            time.sleep(5)
+    loop = asyncio.get_running_loop()
+    async with aiohttp.ClientSession() as session:
+        while True:
+            error = ''
+            try:
+                users_sync_time = demisto.getIntegrationContext().get('users_sync_time', 0)
+                if time.time() - users_sync_time >= USERS_SYNC_INTERVAL_MINUTES * 60:
+                    await loop.run_in_executor(None, sync_users)
+                await loop.run_in_executor(None, check_for_mirrors)
+                await check_for_answers(datetime.utcnow(), session)
+            except aiohttp.ClientConnectionError as e:
+                error = 'Could not connect to the Slack endpoint: {}'.format(str(e))
+            except Exception as e:
+                error = 'An error occurred: {}'.format(str(e))
+                demisto.error(error)
+            finally:
+                if error:
+                    demisto.updateModuleHealth(error)
+                await asyncio.sleep(5)
+
+
+async def poll_for_answer(session: aiohttp.ClientSession, semaphore: asyncio.Semaphore, entitlement: str) -> dict:
+    """
+    Polls for an answer to a question
+    :param session: The HTTP client session
+    :param semaphore: Bounds the number of concurrent requests
+    :param entitlement: The entitlement of the question
+    :return: The answer payload, empty if there is no answer yet
+    """
+    demisto.info('Slack - polling for an answer for entitlement {}'.format(entitlement))
+    headers = {'Accept': 'application/json', 'Content-Type': 'application/json'}
+    body = {
+        'token': BOT_TOKEN,
+        'entitlement': entitlement
+    }
+    async with semaphore:
+        async with session.post(ENDPOINT_URL, data=json.dumps(body), headers=headers, proxy=PROXY or None,
+                                ssl=None if VERIFY_CERT else False) as res:
+            status = res.status
+            content = await res.text()
+    if status != 200:
+        demisto.error('Slack - failed to poll for answers: {}, status code: {}'.format(content, status))
+        return {}
+    answer: dict = {}
+    try:
+        answer = json.loads(content)
+    except Exception:
+        demisto.info('Slack - Could not parse response for entitlement {}: {}'.format(entitlement, content))
+        pass
+    if not answer:
+        return {}
+    payload_json: str = answer.get('payload', '')
+    if not payload_json:
+        return {}
+
+    return json.loads(payload_json)
 
 
-def check_for_answers(now: datetime):
+async def check_for_answers(now: datetime, session: aiohttp.ClientSession):
     """
-    Checks for answered questions
+    Checks for answered questions. Questions are polled concurrently, once per entitlement.
     :param now: The current date.
+    :param session: The HTTP client session to poll with.
     """
-
-    integration_context = demisto.getIntegrationContext()
-    questions = integration_context.get('questions', [])
-    users = integration_context.get('users', [])
-    if questions:
-        questions = json.loads(questions)
-    if users:
-        users = json.loads(users)
+    loop = asyncio.get_running_loop()
+    start_time = time.time()
+    questions, version = load_integration_context_collection('questions')
     now_string = datetime.strftime(now, DATE_FORMAT)
 
+    entitlement_questions: dict = {}
     for question in questions:
         if question.get('last_poll_time'):
             if question.get('expiry'):
                 # Check if the question expired - if it did, answer it with the default response and remove it
                 expiry = datetime.strptime(question['expiry'], DATE_FORMAT)
                 if expiry < now:
-                    answer_question(question.get('default_response'), question, questions)
+                    version = await loop.run_in_executor(None, answer_question, question.get('default_response'),
+                                                         question, questions, '', version)
                     continue
             # Check if it has been enough time(determined by the POLL_INTERVAL_MINUTES parameter)
             # since the last polling time. if not, continue to the next question until it has.
@@ -473,59 +679,57 @@ def check_for_answers(now: datetime):
             minutes = delta.total_seconds() / 60
             if minutes < POLL_INTERVAL_MINUTES:
                 continue
-        demisto.info('Slack - polling for an answer for entitlement {}'.format(question.get('entitlement')))
         question['last_poll_time'] = now_string
-        headers = {'Accept': 'application/json', 'Content-Type': 'application/json'}
-        body = {
-            'token': BOT_TOKEN,
-            'entitlement': question.get('entitlement')
-        }
-        res = requests.post(ENDPOINT_URL, data=json.dumps(body), headers=headers, verify=VERIFY_CERT)
-        if res.status_code != 200:
-            demisto.error('Slack - failed to poll for answers: {}, status code: {}'
-                          .format(res.content, res.status_code))
-            continue
-        answer: dict = {}
-        try:
-            answer = res.json()
-        except Exception:
-            demisto.info('Slack - Could not parse response for entitlement {}: {}'
-                         .format(question.get('entitlement'), res.content))
-            pass
-        if not answer:
-            continue
-        payload_json: str = answer.get('payload', '')
-        if not payload_json:
-            continue
-        payload = json.loads(payload_json)
+        entitlement_questions.setdefault(question.get('entitlement'), []).append(question)
+
+    semaphore = asyncio.Semaphore(POLL_CONCURRENCY)
+    entitlements = list(entitlement_questions.keys())
+    payloads = await asyncio.gather(*[poll_for_answer(session, semaphore, entitlement)
+                                      for entitlement in entitlements])
 
+    for entitlement, payload in zip(entitlements, payloads):
         actions = payload.get('actions', [])
         if actions:
-            demisto.info('Slack - received answer from user for entitlement {}.'.format(question.get('entitlement')))
+            demisto.info('Slack - received answer from user for entitlement {}.'.format(entitlement))
             user_id = payload.get('user', {}).get('id')
-            user_filter = list(filter(lambda u: u['id'] == user_id, users))
+            user_filter = get_from_integration_context('users', 'id', user_id)
             if user_filter:
                 user = user_filter[0]
             else:
-                user = CLIENT.users_info(user=user_id).get('user', {})
-                users.append(user)
-                set_to_latest_integration_context('users', users)
+                user = await loop.run_in_executor(None, add_user_by_id, user_id)
 
-            answer_question(actions[0].get('text', {}).get('text'), question, questions,
-                            user.get('profile', {}).get('email'))
+            for question in entitlement_questions[entitlement]:
+                version = await loop.run_in_executor(None, answer_question, actions[0].get('text', {}).get('text'),
+                                                     question, questions, user.get('profile', {}).get('email'),
+                                                     version)
 
+    demisto.debug('Slack - polled for {} entitlements of {} questions in {:.2f} seconds'.format(
+        len(entitlements), len(questions), time.time() - start_time))
     questions = list(filter(lambda q: q.get('remove', False) is False, questions))
-    set_to_latest_integration_context('questions', questions)
+    set_to_latest_integration_context('questions', questions, version)
 
 
-def answer_question(text: str, question: dict, questions: list, email: str = ''):
+def answer_question(text: str, question: dict, questions: list, email: str = '', version: str = None) -> str:
     content, guid, incident_id, task_id = extract_entitlement(question.get('entitlement', ''), text)
     try:
         demisto.handleEntitlementForUser(incident_id, guid, email, content, task_id)
     except Exception as e:
         demisto.error('Failed handling entitlement {}: {}'.format(question.get('entitlement'), str(e)))
     question['remove'] = True
-    set_to_latest_integration_context('questions', questions)
+
+    return set_to_latest_integration_context('questions', questions, version)
+
+
+def add_user_by_id(user_id: str) -> dict:
+    """
+    Gets a slack user by ID from the workspace and adds it to the synced user directory
+    :param user_id: The user ID
+    :return: A slack user object
+    """
+    user = CLIENT.users_info(user=user_id).get('user', {})
+    add_user_to_integration_context(user)
+
+    return user
 
 
 def check_for_mirrors():
@@ -534,7 +738,7 @@ def check_for_mirrors():
     """
     integration_context = demisto.getIntegrationContext()
     if integration_context.get('mirrors'):
-        mirrors = json.loads(integration_context['mirrors'])
+        mirrors, version = load_integration_context_collection('mirrors', integration_context)
         for mirror in mirrors:
             if not mirror['mirrored']:
                 demisto.info('Mirroring: {}'.format(mirror['investigation_id']))
@@ -552,7 +756,7 @@ def check_for_mirrors():
                 else:
                     demisto.info('Could not mirror {}'.format(mirror['investigation_id']))
 
-                set_to_latest_integration_context('mirrors', mirrors)
+                version = set_to_latest_integration_context('mirrors', mirrors, version)
 
 
 def extract_entitlement(entitlement: str, text: str) -> Tuple[str, str, str, str]:
@@ -620,9 +824,7 @@ async def start_listening():
     """
     Starts a Slack RTM client and checks for mirrored incidents.
     """
-    executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
-    loop = asyncio.get_running_loop()
-    loop.run_in_executor(executor, long_running_loop)
+    asyncio.ensure_future(long_running_loop())
     await slack_loop()
 
 
@@ -794,8 +996,7 @@ async def listen(**payload):
                 return
 
             channel_id = data.get('channel')
-            mirrors = json.loads(integration_context['mirrors'])
-            mirror_filter = list(filter(lambda m: m['channel_id'] == channel_id, mirrors))
+            mirror_filter = get_from_integration_context('mirrors', 'channel_id', channel_id, integration_context)
             if not mirror_filter:
                 return
 
@@ -805,6 +1006,7 @@ async def listen(**payload):
 
                 if not mirror['mirrored']:
                     # In case the investigation is not mirrored yet
+                    mirrors, version = load_integration_context_collection('mirrors', integration_context)
                     mirror = mirrors.pop(mirrors.index(mirror))
                     if mirror['mirror_to'] and mirror['mirror_direction'] and mirror['mirror_type']:
                         investigation_id = mirror['investigation_id']
@@ -818,7 +1020,7 @@ async def listen(**payload):
                                                     auto_close)
                         mirror['mirrored'] = True
                         mirrors.append(mirror)
-                        set_to_latest_integration_context('mirrors', mirrors)
+                        set_to_latest_integration_context('mirrors', mirrors, version)
 
                 investigation_id = mirror['investigation_id']
                 await handle_text(client, investigation_id, text, user)
@@ -830,16 +1032,12 @@ async def listen(**payload):
 
 async def get_user_by_id_async(client, integration_context, user_id):
     user: dict = {}
-    users: list = []
-    if integration_context.get('users'):
-        users = json.loads(integration_context['users'])
-        user_filter = list(filter(lambda u: u['id'] == user_id, users))
-        if user_filter:
-            user = user_filter[0]
+    user_filter = get_from_integration_context('users', 'id', user_id, integration_context)
+    if user_filter:
+        user = user_filter[0]
     if not user:
         user = (await client.users_info(user=user_id)).get('user', {})
-        users.append(user)
-        set_to_latest_integration_context('users', users)
+        await asyncio.get_running_loop().run_in_executor(None, add_user_to_integration_context, user)
 
     return user
 
@@ -879,11 +1077,8 @@ async def check_and_handle_entitlement(text: str, user: dict, thread_id: str) ->
 
         return 'Thank you for your response.'
     else:
-        integration_context = demisto.getIntegrationContext()
-        questions = integration_context.get('questions', [])
-        if questions and thread_id:
-            questions = json.loads(questions)
-            question_filter = list(filter(lambda q: q.get('thread') == thread_id, questions))
+        if thread_id:
+            question_filter = get_from_integration_context('questions', 'thread', thread_id)
             if question_filter:
                 demisto.info('Slack - handling entitlement in thread.')
                 entitlement = question_filter[0].get('entitlement')
@@ -891,8 +1086,9 @@ async def check_and_handle_entitlement(text: str, user: dict, thread_id: str) ->
                 content, guid, incident_id, task_id = extract_entitlement(entitlement, text)
                 demisto.handleEntitlementForUser(incident_id, guid, user.get('profile', {}).get('email'), content,
                                                  task_id)
+                questions, version = load_integration_context_collection('questions')
                 questions.remove(question_filter[0])
-                set_to_latest_integration_context('questions', questions)
+                set_to_latest_integration_context('questions', questions, version)
 
                 return reply
 
@@ -1027,10 +1223,7 @@ def save_entitlement(entitlement, thread, reply, expiry, default_response):
     :param expiry: The question expiration date.
     :param default_response: The response to send if the question times out.
     """
-    integration_context = demisto.getIntegrationContext()
-    questions = integration_context.get('questions', [])
-    if questions:
-        questions = json.loads(integration_context['questions'])
+    questions, version = load_integration_context_collection('questions')
     questions.append({
         'thread': thread,
         'entitlement': entitlement,
@@ -1039,7 +1232,7 @@ def save_entitlement(entitlement, thread, reply, expiry, default_response):
         'default_response': default_response
     })
 
-    set_to_latest_integration_context('questions', questions)
+    set_to_latest_integration_context('questions', questions, version)
 
 
 def slack_send_file():
@@ -1221,13 +1414,6 @@ def slack_send_request(to: str, channel: str, group: str, entry: str = '', ignor
     """
 
     integration_context = demisto.getIntegrationContext()
-    conversations: list = []
-    mirrors: list = []
-    if integration_context:
-        if 'conversations' in integration_context:
-            conversations = json.loads(integration_context['conversations'])
-        if 'mirrors' in integration_context:
-            mirrors = json.loads(integration_context['mirrors'])
 
     destinations = []
 
@@ -1243,13 +1429,16 @@ def slack_send_request(to: str, channel: str, group: str, entry: str = '', ignor
     if channel or group:
         if not destinations:
             destination_name = channel or group
-            conversation_filter = list(filter(lambda c: c.get('name') == destination_name, conversations))
+            conversation_filter = get_from_integration_context('conversations', 'name', destination_name,
+                                                               integration_context)
             if conversation_filter:
                 conversation = conversation_filter[0]
                 conversation_id = conversation.get('id')
             else:
-                mirrored_channel_filter = list(filter(lambda m: 'incident-{}'
-                                                      .format(m['investigation_id']) == destination_name, mirrors))
+                mirrored_channel_filter = []
+                if destination_name.startswith('incident-'):
+                    mirrored_channel_filter = get_from_integration_context(
+                        'mirrors', 'investigation_id', destination_name[len('incident-'):], integration_context)
                 if mirrored_channel_filter:
                     channel_mirror = mirrored_channel_filter[0]
                     conversation_id = channel_mirror['channel_id']
@@ -1257,8 +1446,9 @@ def slack_send_request(to: str, channel: str, group: str, entry: str = '', ignor
                     conversation = get_conversation_by_name(destination_name)
                     if not conversation:
                         return_error('Could not find the Slack conversation {}'.format(destination_name))
+                    conversations, version = load_integration_context_collection('conversations')
                     conversations.append(conversation)
-                    set_to_latest_integration_context('conversations', conversations)
+                    set_to_latest_integration_context('conversations', conversations, version)
                     conversation_id = conversation.get('id')
 
             if conversation_id:
@@ -1292,12 +1482,11 @@ def set_channel_topic():
         if mirror:
             channel_id = mirror.get('channel_id', '')
             # We need to update the topic in the mirror
-            integration_context = demisto.getIntegrationContext()
-            mirrors = json.loads(integration_context['mirrors'])
+            mirrors, version = load_integration_context_collection('mirrors')
             mirror = mirrors.pop(mirrors.index(mirror))
             mirror['channel_topic'] = topic
             mirrors.append(mirror)
-            set_to_latest_integration_context('mirrors', mirrors)
+            set_to_latest_integration_context('mirrors', mirrors, version)
     else:
         channel = get_conversation_by_name(channel)
         channel_id = channel.get('id')
@@ -1325,12 +1514,11 @@ def rename_channel():
         if mirror:
             channel_id = mirror.get('channel_id', '')
             # We need to update the name in the mirror
-            integration_context = demisto.getIntegrationContext()
-            mirrors = json.loads(integration_context['mirrors'])
+            mirrors, version = load_integration_context_collection('mirrors')
             mirror = mirrors.pop(mirrors.index(mirror))
             mirror['channel_name'] = new_name
             mirrors.append(mirror)
-            set_to_latest_integration_context('mirrors', mirrors)
+            set_to_latest_integration_context('mirrors', mirrors, version)
     else:
         channel = get_conversation_by_name(channel)
         channel_id = channel.get('id')
@@ -1355,8 +1543,7 @@ def close_channel():
         if mirror:
             channel_id = mirror.get('channel_id', '')
             # We need to update the topic in the mirror
-            integration_context = demisto.getIntegrationContext()
-            mirrors = json.loads(integration_context['mirrors'])
+            mirrors, version = load_integration_context_collection('mirrors')
             mirror = mirrors.pop(mirrors.index(mirror))
             channel_id = mirror['channel_id']
             # Check for other mirrors on the archived channel
@@ -1364,7 +1551,7 @@ def close_channel():
             for mirror in channel_mirrors:
                 mirrors.remove(mirror)
 
-            set_to_latest_integration_context('mirrors', mirrors)
+            set_to_latest_integration_context('mirrors', mirrors, version)
     else:
         channel = get_conversation_by_name(channel)
         channel_id = channel.get('id')
@@ -1458,6 +1645,8 @@ def get_user():
     slack_user = get_user_by_name(user)
     if not slack_user:
         return_error('User not found')
+    # Only a summary of the user is kept in the user directory
+    slack_user = CLIENT.users_info(user=slack_user.get('id')).get('user', {})
 
     profile = slack_user.get('profile', {})
     result_user = {
@@ -480,11 +480,11 @@ def test_get_user_by_name(mocker):
     assert user['id'] == 'U012B3CUI'
     assert slack.WebClient.users_list.call_count == 2
 
-    # User doesn't exist
+    # User doesn't exist, the directory was just synced
     username = 'alexios'
     user = get_user_by_name(username)
     assert user == {}
-    assert slack.WebClient.users_list.call_count == 3
+    assert slack.WebClient.users_list.call_count == 2
 
 
 def test_get_user_by_name_paging(mocker):
@@ -1572,7 +1572,38 @@ async def test_handle_text(mocker):
     assert entry_args['footer'] == '\n**From Slack**'
 
 
-def test_check_for_answers(mocker, requests_mock):
+class ResponseStandIn:
+    def __init__(self, status, text):
+        self.status = status
+        self._text = text
+
+    async def text(self):
+        return self._text
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+
+class SessionStandIn:
+    """
+    Stands in for an aiohttp client session, answering requests with the given (status, json) responses in order.
+    The last response is repeated.
+    """
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def post(self, url, **kwargs):
+        self.requests.append(json.loads(kwargs['data']))
+        status, body = self.responses.pop(0) if len(self.responses) > 1 else self.responses[0]
+        return ResponseStandIn(status, json.dumps(body))
+
+
+@pytest.mark.asyncio
+async def test_check_for_answers(mocker):
     import Slack
 
     # Set
@@ -1581,10 +1612,7 @@ def test_check_for_answers(mocker, requests_mock):
     mocker.patch.object(demisto, 'getIntegrationContext', side_effect=get_integration_context)
     mocker.patch.object(demisto, 'setIntegrationContext', side_effect=set_integration_context)
 
-    requests_mock.post(
-        'https://oproxy.demisto.ninja/slack-poll',
-        json={'payload': PAYLOAD_JSON}
-    )
+    session = SessionStandIn([(200, {'payload': PAYLOAD_JSON})])
 
     integration_context = get_integration_context()
     integration_context['questions'] = json.dumps([{
@@ -1599,7 +1627,7 @@ def test_check_for_answers(mocker, requests_mock):
     set_integration_context(integration_context)
 
     # Arrange
-    Slack.check_for_answers(datetime.datetime(2019, 9, 26, 18, 38, 25))
+    await Slack.check_for_answers(datetime.datetime(2019, 9, 26, 18, 38, 25), session)
 
     result_args = demisto.handleEntitlementForUser.call_args_list[0][0]
 
@@ -1616,7 +1644,8 @@ def test_check_for_answers(mocker, requests_mock):
     assert demisto.getIntegrationContext()['questions'] == json.dumps([])
 
 
-def test_check_for_answers_continue(mocker, requests_mock):
+@pytest.mark.asyncio
+async def test_check_for_answers_continue(mocker):
     import Slack
 
     # Set
@@ -1625,13 +1654,7 @@ def test_check_for_answers_continue(mocker, requests_mock):
     mocker.patch.object(demisto, 'getIntegrationContext', side_effect=get_integration_context)
     mocker.patch.object(demisto, 'setIntegrationContext', side_effect=set_integration_context)
 
-    requests_mock.post(
-        'https://oproxy.demisto.ninja/slack-poll',
-        [{'json': {}, 'status_code': 200},
-         {'json': 'error', 'status_code': 401},
-         {'json': {'payload': PAYLOAD_JSON}, 'status_code': 200}]
-
-    )
+    session = SessionStandIn([(200, {}), (401, 'error'), (200, {'payload': PAYLOAD_JSON})])
 
     integration_context = get_integration_context()
     integration_context['questions'] = json.dumps([{
@@ -1643,7 +1666,7 @@ def test_check_for_answers_continue(mocker, requests_mock):
         'last_poll_time': '2019-09-26 18:34:25'
     }, {
         'thread': 'notcool2',
-        'entitlement': '4404dae8-2d45-46bd-85fa-64779c12abe8@30|44',
+        'entitlement': '8ab1e8a0-05b4-4a5a-9a3c-44a4bd3dc3ec@30|44',
         'reply': 'Thanks bro',
         'expiry': '3000-09-26 18:38:25',
         'default_response': 'NoResponse',
@@ -1660,7 +1683,7 @@ def test_check_for_answers_continue(mocker, requests_mock):
     set_integration_context(integration_context)
 
     # Arrange
-    Slack.check_for_answers(datetime.datetime(2019, 9, 26, 18, 38, 25))
+    await Slack.check_for_answers(datetime.datetime(2019, 9, 26, 18, 38, 25), session)
 
     result_args = demisto.handleEntitlementForUser.call_args_list[0][0]
 
@@ -1684,7 +1707,7 @@ def test_check_for_answers_continue(mocker, requests_mock):
         'last_poll_time': '2019-09-26 18:38:25'
     }, {
         'thread': 'notcool2',
-        'entitlement': '4404dae8-2d45-46bd-85fa-64779c12abe8@30|44',
+        'entitlement': '8ab1e8a0-05b4-4a5a-9a3c-44a4bd3dc3ec@30|44',
         'reply': 'Thanks bro',
         'expiry': '3000-09-26 18:38:25',
         'default_response': 'NoResponse',
@@ -1692,7 +1715,8 @@ def test_check_for_answers_continue(mocker, requests_mock):
     }])
 
 
-def test_check_for_answers_no_answer(mocker, requests_mock):
+@pytest.mark.asyncio
+async def test_check_for_answers_no_answer(mocker):
     import Slack
 
     # Set
@@ -1700,10 +1724,7 @@ def test_check_for_answers_no_answer(mocker, requests_mock):
     mocker.patch.object(demisto, 'getIntegrationContext', side_effect=get_integration_context)
     mocker.patch.object(demisto, 'setIntegrationContext', side_effect=set_integration_context)
 
-    requests_mock.post(
-        'https://oproxy.demisto.ninja/slack-poll',
-        json={}
-    )
+    session = SessionStandIn([(200, {})])
 
     integration_context = get_integration_context()
     integration_context['questions'] = json.dumps([{
@@ -1725,7 +1746,7 @@ def test_check_for_answers_no_answer(mocker, requests_mock):
     set_integration_context(integration_context)
 
     # Arrange
-    Slack.check_for_answers(datetime.datetime(2019, 9, 26, 18, 38, 25))
+    await Slack.check_for_answers(datetime.datetime(2019, 9, 26, 18, 38, 25), session)
 
     # Assert
 
@@ -1749,7 +1770,8 @@ def test_check_for_answers_no_answer(mocker, requests_mock):
     }])
 
 
-def test_check_for_answers_no_answer_expires(mocker, requests_mock):
+@pytest.mark.asyncio
+async def test_check_for_answers_no_answer_expires(mocker):
     import Slack
 
     # Set
@@ -1757,10 +1779,7 @@ def test_check_for_answers_no_answer_expires(mocker, requests_mock):
     mocker.patch.object(demisto, 'getIntegrationContext', side_effect=get_integration_context)
     mocker.patch.object(demisto, 'setIntegrationContext', side_effect=set_integration_context)
 
-    requests_mock.post(
-        'https://oproxy.demisto.ninja/slack-poll',
-        json={}
-    )
+    session = SessionStandIn([(200, {})])
 
     integration_context = get_integration_context()
     integration_context['questions'] = json.dumps([{
@@ -1782,7 +1801,7 @@ def test_check_for_answers_no_answer_expires(mocker, requests_mock):
     set_integration_context(integration_context)
 
     # Arrange
-    Slack.check_for_answers(datetime.datetime(2019, 9, 26, 18, 38, 25))
+    await Slack.check_for_answers(datetime.datetime(2019, 9, 26, 18, 38, 25), session)
 
     result_args = demisto.handleEntitlementForUser.call_args_list[0][0]
 
@@ -1806,7 +1825,8 @@ def test_check_for_answers_no_answer_expires(mocker, requests_mock):
     }])
 
 
-def test_check_for_answers_error(mocker, requests_mock):
+@pytest.mark.asyncio
+async def test_check_for_answers_error(mocker):
     import Slack
 
     # Set
@@ -1815,11 +1835,7 @@ def test_check_for_answers_error(mocker, requests_mock):
     mocker.patch.object(demisto, 'setIntegrationContext', side_effect=set_integration_context)
     mocker.patch.object(demisto, 'error')
 
-    requests_mock.post(
-        'https://oproxy.demisto.ninja/slack-poll',
-        json='error',
-        status_code=401
-    )
+    session = SessionStandIn([(401, 'error')])
 
     integration_context = get_integration_context()
     integration_context['questions'] = json.dumps([{
@@ -1837,7 +1853,7 @@ def test_check_for_answers_error(mocker, requests_mock):
     set_integration_context(integration_context)
 
     # Arrange
-    Slack.check_for_answers(datetime.datetime(2019, 9, 26, 18, 38, 25))
+    await Slack.check_for_answers(datetime.datetime(2019, 9, 26, 18, 38, 25), session)
 
     # Assert
 
@@ -1860,7 +1876,8 @@ def test_check_for_answers_error(mocker, requests_mock):
     }])
 
 
-def test_check_for_answers_handle_entitlement_error(mocker, requests_mock):
+@pytest.mark.asyncio
+async def test_check_for_answers_handle_entitlement_error(mocker):
     import Slack
 
     # Set
@@ -1869,11 +1886,7 @@ def test_check_for_answers_handle_entitlement_error(mocker, requests_mock):
     mocker.patch.object(demisto, 'setIntegrationContext', side_effect=set_integration_context)
     mocker.patch.object(demisto, 'error')
 
-    requests_mock.post(
-        'https://oproxy.demisto.ninja/slack-poll',
-        json={'payload': PAYLOAD_JSON},
-        status_code=200
-    )
+    session = SessionStandIn([(200, {'payload': PAYLOAD_JSON})])
 
     integration_context = get_integration_context()
     integration_context['questions'] = json.dumps([{
@@ -1886,7 +1899,7 @@ def test_check_for_answers_handle_entitlement_error(mocker, requests_mock):
     set_integration_context(integration_context)
 
     # Arrange
-    Slack.check_for_answers(datetime.datetime(2019, 9, 26, 18, 38, 25))
+    await Slack.check_for_answers(datetime.datetime(2019, 9, 26, 18, 38, 25), session)
 
     # Assert
 
@@ -3184,12 +3197,15 @@ def test_get_user(mocker):
     mocker.patch.object(demisto, 'getIntegrationContext', side_effect=get_integration_context)
     mocker.patch.object(demisto, 'setIntegrationContext', side_effect=set_integration_context)
     mocker.patch.object(demisto, 'results')
+    mocker.patch.object(slack.WebClient, 'users_info', return_value={'user': json.loads(USERS)[0]})
 
     # Arrange
 
     get_user()
     user_results = demisto.results.call_args[0]
 
+    assert slack.WebClient.users_info.call_args[1] == {'user': 'U012A3CDE'}
+
     assert user_results[0]['EntryContext'] == {'Slack.User(val.ID === obj.ID)': {
         'ID': 'U012A3CDE',
         'Username': 'spengler',
@@ -3197,3 +3213,225 @@ def test_get_user(mocker):
         'DisplayName': 'spengler',
         'Email': 'spengler@ghostbusters.example.com',
     }}
+
+
+def test_get_from_integration_context_indexed(mocker):
+    import Slack
+
+    # Set
+    mocker.patch.object(demisto, 'getIntegrationContext', side_effect=get_integration_context)
+    mocker.patch.object(Slack, 'CONTEXT_INDEXES', {})
+    loads = mocker.spy(json, 'loads')
+
+    # Arrange
+    by_email = Slack.get_from_integration_context('users', 'profile.email', 'glenda@south.oz.coven')
+    by_id = Slack.get_from_integration_context('users', 'id', 'U012A3CDE')
+    missing = Slack.get_from_integration_context('users', 'id', 'XXXXXXX')
+
+    # Assert
+    assert by_email[0]['name'] == 'glinda'
+    assert by_id[0]['name'] == 'spengler'
+    assert missing == []
+    assert loads.call_count == 1
+
+
+def test_get_from_integration_context_copies(mocker):
+    """
+    Given:
+        An indexed integration context collection.
+    When:
+        Changing an item returned from a lookup.
+    Then:
+        Ensure the indexed item is not changed.
+    """
+    import Slack
+
+    # Set
+    mocker.patch.object(demisto, 'getIntegrationContext', side_effect=get_integration_context)
+    mocker.patch.object(Slack, 'CONTEXT_INDEXES', {})
+
+    # Arrange
+    user = Slack.get_from_integration_context('users', 'id', 'U012A3CDE')[0]
+    user['name'] = 'venkman'
+    user['profile']['email'] = 'venkman@ghostbusters.example.com'
+
+    # Assert
+    assert Slack.get_from_integration_context('users', 'id', 'U012A3CDE')[0]['name'] == 'spengler'
+    assert Slack.get_from_integration_context('users', 'profile.email', 'venkman@ghostbusters.example.com') == []
+
+
+def test_set_to_latest_integration_context_merge(mocker):
+    import Slack
+
+    # Set
+    mocker.patch.object(demisto, 'getIntegrationContext', side_effect=get_integration_context)
+    mocker.patch.object(demisto, 'setIntegrationContext', side_effect=set_integration_context)
+    set_integration_context({
+        'questions': json.dumps([{'thread': '1', 'entitlement': 'a'}, {'thread': '2', 'entitlement': 'b'}])
+    })
+
+    # Arrange
+    questions, version = Slack.load_integration_context_collection('questions')
+    # Another update happens in the meantime
+    concurrent_questions = json.loads(demisto.getIntegrationContext()['questions'])
+    concurrent_questions[1]['remove'] = True
+    concurrent_questions.append({'thread': '3', 'entitlement': 'c'})
+    demisto.getIntegrationContext()['questions'] = json.dumps(concurrent_questions)
+
+    questions.pop(0)
+    questions.append({'thread': '4', 'entitlement': 'd'})
+    Slack.set_to_latest_integration_context('questions', questions, version)
+
+    # Assert
+    assert json.loads(demisto.getIntegrationContext()['questions']) == [
+        {'thread': '2', 'entitlement': 'b', 'remove': True},
+        {'thread': '3', 'entitlement': 'c'},
+        {'thread': '4', 'entitlement': 'd'}
+    ]
+
+
+@pytest.mark.asyncio
+async def test_check_for_answers_same_entitlement(mocker):
+    import Slack
+
+    # Set
+    mocker.patch.object(demisto, 'handleEntitlementForUser')
+    mocker.patch.object(demisto, 'getIntegrationContext', side_effect=get_integration_context)
+    mocker.patch.object(demisto, 'setIntegrationContext', side_effect=set_integration_context)
+    mocker.patch.object(demisto, 'debug')
+    session = SessionStandIn([(200, {'payload': PAYLOAD_JSON})])
+
+    integration_context = get_integration_context()
+    integration_context['questions'] = json.dumps([{
+        'thread': 'cool',
+        'entitlement': 'e95cb5a1-e394-4bc5-8ce0-508973aaf298@22|43',
+        'expiry': '3000-09-26 18:38:25',
+        'default_response': 'NoResponse'
+    }, {
+        'thread': 'cool2',
+        'entitlement': 'e95cb5a1-e394-4bc5-8ce0-508973aaf298@22|43',
+        'expiry': '3000-09-26 18:38:25',
+        'default_response': 'NoResponse'
+    }])
+
+    set_integration_context(integration_context)
+
+    # Arrange
+    await Slack.check_for_answers(datetime.datetime(2019, 9, 26, 18, 38, 25), session)
+
+    # Assert
+    assert len(session.requests) == 1
+    assert session.requests[0]['entitlement'] == 'e95cb5a1-e394-4bc5-8ce0-508973aaf298@22|43'
+    assert demisto.handleEntitlementForUser.call_count == 2
+    assert demisto.getIntegrationContext()['questions'] == json.dumps([])
+    assert 'polled for 1 entitlements of 2 questions' in demisto.debug.call_args[0][0]
+
+
+@pytest.mark.asyncio
+async def test_check_for_answers_concurrent_question(mocker):
+    """
+    Given:
+        A question which is polled for an answer.
+    When:
+        A new question is added to the integration context while the answers are polled.
+    Then:
+        Ensure the answered question is removed and the new question is kept.
+    """
+    import Slack
+
+    # Set
+    async def poll_for_answer(session, semaphore, entitlement):
+        await asyncio.sleep(0)
+        questions = json.loads(demisto.getIntegrationContext()['questions'])
+        questions.append({'thread': 'new', 'entitlement': 'new@22|44'})
+        demisto.getIntegrationContext()['questions'] = json.dumps(questions)
+        return json.loads(PAYLOAD_JSON)
+
+    mocker.patch.object(demisto, 'handleEntitlementForUser')
+    mocker.patch.object(demisto, 'getIntegrationContext', side_effect=get_integration_context)
+    mocker.patch.object(demisto, 'setIntegrationContext', side_effect=set_integration_context)
+    mocker.patch.object(Slack, 'poll_for_answer', side_effect=poll_for_answer)
+
+    integration_context = get_integration_context()
+    integration_context['questions'] = json.dumps([{
+        'thread': 'cool',
+        'entitlement': 'e95cb5a1-e394-4bc5-8ce0-508973aaf298@22|43',
+        'expiry': '3000-09-26 18:38:25',
+        'default_response': 'NoResponse'
+    }])
+    set_integration_context(integration_context)
+
+    # Arrange
+    await Slack.check_for_answers(datetime.datetime(2019, 9, 26, 18, 38, 25), None)
+
+    # Assert
+    assert demisto.handleEntitlementForUser.call_count == 1
+    assert json.loads(demisto.getIntegrationContext()['questions']) == [{'thread': 'new', 'entitlement': 'new@22|44'}]
+
+
+def test_get_user_by_name_missing_user_cached(mocker):
+    """
+    Given:
+        A synced user directory.
+    When:
+        Searching for users which are not in the directory.
+    Then:
+        Ensure the directory is not synced again, an email is looked up once and a missing email is cached.
+    """
+    from Slack import get_user_by_name
+    from slack.errors import SlackApiError
+
+    # Set
+    def users_lookup_by_email(email):
+        if email == 'perikles@acropoli.com':
+            return {'user': {'id': 'U012B3CUI', 'name': 'perikles', 'profile': {'email': email, 'phone': '1234'}}}
+        raise SlackApiError('The request to the Slack API failed.', {'ok': False, 'error': 'users_not_found'})
+
+    mocker.patch.object(demisto, 'getIntegrationContext', side_effect=get_integration_context)
+    mocker.patch.object(demisto, 'setIntegrationContext', side_effect=set_integration_context)
+    mocker.patch.object(slack.WebClient, 'users_list', return_value={'members': json.loads(USERS)})
+    mocker.patch.object(slack.WebClient, 'users_lookupByEmail', side_effect=users_lookup_by_email)
+    get_integration_context()['users_sync_time'] = int(datetime.datetime.now().timestamp())
+
+    # Arrange
+    by_name = get_user_by_name('alexios')
+    first = get_user_by_name('alexios@acropoli.com')
+    second = get_user_by_name('Alexios@acropoli.com')
+    by_email = get_user_by_name('perikles@acropoli.com')
+    again = get_user_by_name('Perikles@acropoli.com')
+
+    # Assert
+    assert by_name == first == second == {}
+    assert by_email['id'] == again['id'] == 'U012B3CUI'
+    assert slack.WebClient.users_list.call_count == 0
+    assert slack.WebClient.users_lookupByEmail.call_count == 2
+    assert 'alexios@acropoli.com' in json.loads(demisto.getIntegrationContext()['missing_users'])
+    assert json.loads(demisto.getIntegrationContext()['users'])[-1] == {
+        'id': 'U012B3CUI', 'name': 'perikles', 'real_name': None, 'profile': {'email': 'perikles@acropoli.com'}
+    }
+
+
+def test_sync_users(mocker):
+    from Slack import sync_users
+
+    # Set
+    def users_list(**kwargs):
+        if 'cursor' not in kwargs:
+            return {'members': json.loads(USERS)[:1], 'response_metadata': {'next_cursor': 'next'}}
+        return {'members': json.loads(USERS)[1:], 'response_metadata': {'next_cursor': ''}}
+
+    mocker.patch.object(demisto, 'getIntegrationContext', side_effect=get_integration_context)
+    mocker.patch.object(demisto, 'setIntegrationContext', side_effect=set_integration_context)
+    mocker.patch.object(slack.WebClient, 'users_list', side_effect=users_list)
+    set_integration_context({'users': json.dumps([{'id': 'U0REMOVED', 'name': 'removed'}]),
+                             'missing_users': json.dumps({'alexios': 1})})
+
+    # Arrange
+    sync_users()
+
+    # Assert
+    integration_context = demisto.getIntegrationContext()
+    assert [user['id'] for user in json.loads(integration_context['users'])] == ['U012A3CDE', 'U07QCRPA4']
+    assert set(json.loads(integration_context['users'])[0].keys()) == {'id', 'name', 'real_name', 'profile'}
+    assert integration_context['users_sync_time'] > 0
+    assert json.loads(integration_context['missing_users']) == {}
@@ -2,7 +2,9 @@ import demistomock as demisto
 from CommonServerPython import *
 import splunklib.client as client
 import splunklib.results as results
+from splunklib.binding import HTTPError
 import json
+import time
 from datetime import timedelta, datetime
 import urllib2
 import ssl
@@ -205,75 +207,53 @@ def request(url, message, **kwargs):
     }
 
 
-service = None
-proxy = demisto.params()['proxy']
-if proxy:
-    try:
-        service = client.connect(
-            handler=handler(proxy),
-            host=demisto.params()['host'],
-            port=demisto.params()['port'],
-            app=demisto.params().get('app'),
-            username=demisto.params()['authentication']['identifier'],
-            password=demisto.params()['authentication']['password'],
-            verify=VERIFY_CERTIFICATE)
-    except urllib2.URLError as e:
-        if e.reason.errno == 1 and sys.version_info < (2, 6, 3):  # type: ignore
-            pass
-        else:
-            raise
-else:
-    service = client.connect(
-        host=demisto.params()['host'],
-        port=demisto.params()['port'],
-        app=demisto.params().get('app'),
-        username=demisto.params()['authentication']['identifier'],
-        password=demisto.params()['authentication']['password'],
-        verify=VERIFY_CERTIFICATE)
-
-if service is None:
-    demisto.error("Could not connect to SplunkPy")
-    sys.exit(0)
-
-# The command demisto.command() holds the command sent from the user.
-if demisto.command() == 'test-module':
-    # for app in service.apps:
-    #    print app.name
-    if len(service.jobs) >= 0:
-        demisto.results('ok')
-    sys.exit(0)
-if demisto.command() == 'splunk-search':
+def build_search_kwargs(args):
     t = datetime.utcnow() - timedelta(days=7)
     time_str = t.strftime(SPLUNK_TIME_FORMAT)
-    kwargs_oneshot = {"earliest_time": time_str}  # type: Dict[str,Any]
-    if demisto.get(demisto.args(), 'earliest_time'):
-        kwargs_oneshot['earliest_time'] = demisto.args()['earliest_time']
-    if demisto.get(demisto.args(), 'latest_time'):
-        kwargs_oneshot['latest_time'] = demisto.args()['latest_time']
-    if demisto.get(demisto.args(), 'event_limit'):
-        kwargs_oneshot['count'] = int(demisto.args()['event_limit'])
-    searchquery_oneshot = demisto.args()['query']
-    searchquery_oneshot = searchquery_oneshot.encode('utf-8')
-    if not searchquery_oneshot.startswith('search') and not searchquery_oneshot.startswith('Search')\
-            and not searchquery_oneshot.startswith('|'):
-        searchquery_oneshot = 'search ' + searchquery_oneshot
-    oneshotsearch_results = service.jobs.oneshot(searchquery_oneshot, **kwargs_oneshot)
-
-    reader = results.ResultsReader(oneshotsearch_results)
+    kwargs_export = {"earliest_time": time_str}  # type: Dict[str,Any]
+    if demisto.get(args, 'earliest_time'):
+        kwargs_export['earliest_time'] = args['earliest_time']
+    if demisto.get(args, 'latest_time'):
+        kwargs_export['latest_time'] = args['latest_time']
+    return kwargs_export
+
+
+def splunk_search_command(service):
+    searchquery_export = demisto.args()['query']
+    searchquery_export = searchquery_export.encode('utf-8')
+    if not searchquery_export.startswith('search') and not searchquery_export.startswith('Search')\
+            and not searchquery_export.startswith('|'):
+        searchquery_export = 'search ' + searchquery_export
+    # the default is 100 events, and 0 returns all of them
+    event_limit = int(demisto.args().get('event_limit') or 100)
+
+    # the export endpoint runs the search and streams the results as they are ready, instead of keeping them in a job
+    export_stream = service.jobs.export(searchquery_export, **build_search_kwargs(demisto.args()))
     res = []
     dbot_scores = []  # type: List[Dict[str,Any]]
-    for item in reader:
-        if isinstance(item, results.Message):
-            if "Error in" in item.message:
-                raise ValueError(item.message)
-            res.append(convert_to_str(item.message))
-
-        elif isinstance(item, dict):
-            if demisto.get(item, 'host'):
-                dbot_scores.append({'Indicator': item['host'], 'Type': 'hostname',
-                                    'Vendor': 'Splunk', 'Score': 0, 'isTypedIndicator': True})
-            # Normal events are returned as dicts
-            res.append(item)
+    events_count = 0
+    try:
+        reader = results.ResultsReader(export_stream)
+        for item in reader:
+            if isinstance(item, results.Message):
+                if "Error in" in item.message:
+                    raise ValueError(item.message)
+                res.append(convert_to_str(item.message))
+
+            elif isinstance(item, dict):
+                if reader.is_preview:
+                    # preview results of a transforming search are followed by its final results
+                    continue
+                if event_limit and events_count >= event_limit:
+                    break
+                if demisto.get(item, 'host'):
+                    dbot_scores.append({'Indicator': item['host'], 'Type': 'hostname',
+                                        'Vendor': 'Splunk', 'Score': 0, 'isTypedIndicator': True})
+                # Normal events are returned as dicts
+                res.append(item)
+                events_count += 1
+    finally:
+        export_stream.close()
     ec = {}
     ec['Splunk.Result'] = res
     if len(dbot_scores) > 0:
@@ -295,143 +275,225 @@ if demisto.command() == 'splunk-search':
         "HumanReadable": human_readable
     })
 
-    sys.exit(0)
-if demisto.command() == 'splunk-job-create':
-    searchquery_normal = demisto.args()['query']
-    if not searchquery_normal.startswith('search'):
-        searchquery_normal = 'search ' + searchquery_normal
-    kwargs_normalsearch = {"exec_mode": "normal"}
-    job = service.jobs.create(searchquery_normal, **kwargs_normalsearch)
 
-    ec = {}
-    ec['Splunk.Job'] = job.sid
-    demisto.results({"Type": 1, "ContentsFormat": formats['text'],
-                     "Contents": "Splunk Job created with SID: " + job.sid, "EntryContext": ec})
-    sys.exit(0)
-if demisto.command() == 'splunk-results':
-    jobs = service.jobs
-    found = False
-    res = []
-    for job in jobs:
-        if job.sid == demisto.args()['sid']:
-            rr = results.ResultsReader(job.results())
-            for result in rr:
-                if isinstance(result, results.Message):
-                    demisto.results({"Type": 1, "ContentsFormat": "json", "Contents": json.dumps(result.message)})
-                elif isinstance(result, dict):
-                    # Normal events are returned as dicts
-                    res.append(result)
-            found = True
-    if not found:
-        demisto.results("Found no job for sid: " + demisto.args()['sid'])
-    if found:
-        demisto.results({"Type": 1, "ContentsFormat": "json", "Contents": json.dumps(res)})
-    sys.exit(0)
-if demisto.command() == 'fetch-incidents':
-    lastRun = demisto.getLastRun() and demisto.getLastRun()['time']
-    search_offset = demisto.getLastRun().get('offset', 0)
+def get_fetch_job(service, last_run, searchquery, search_kwargs):
+    """
+    Returns the search job of the fetch window. The job of a window which was not fully fetched is kept in the last
+    run, so its next pages are read from the job results instead of running the search again.
+    A new job is created for a new window, or if the job kept in the last run has expired.
+
+    Returns the job, and whether it was created.
+    """
+    if last_run.get('sid'):
+        try:
+            return service.job(last_run['sid']), False
+        except HTTPError as e:
+            if e.status != 404:
+                raise
+            demisto.debug('SplunkPy fetch-incidents: search job {} has expired, running the search again'
+                          .format(last_run['sid']))
+    return service.jobs.create(searchquery, exec_mode='blocking', **search_kwargs), True
+
+
+def fetch_incidents(service):
+    fetch_start_time = time.time()
+    searches_count = 0
+    last_run = demisto.getLastRun() or {}
+    lastRun = last_run.get('time', '')
+    search_offset = last_run.get('offset', 0)
 
     incidents = []
-    t = datetime.utcnow()
-    if demisto.get(demisto.params(), 'timezone'):
-        timezone = demisto.params()['timezone']
-        t = t + timedelta(minutes=int(timezone))
-
-    now = t.strftime(SPLUNK_TIME_FORMAT)
-    if demisto.get(demisto.params(), 'useSplunkTime'):
-        now = get_current_splunk_time(service)
-        t = datetime.strptime(now, SPLUNK_TIME_FORMAT)
-    if len(lastRun) == 0:
-        t = t - timedelta(minutes=10)
-        lastRun = t.strftime(SPLUNK_TIME_FORMAT)
+    if last_run.get('latest_time'):
+        # continue fetching the window which was not fully fetched in the last run
+        now = last_run['latest_time']
+    else:
+        t = datetime.utcnow()
+        if demisto.get(demisto.params(), 'timezone'):
+            timezone = demisto.params()['timezone']
+            t = t + timedelta(minutes=int(timezone))
+
+        now = t.strftime(SPLUNK_TIME_FORMAT)
+        if demisto.get(demisto.params(), 'useSplunkTime'):
+            now = get_current_splunk_time(service)
+            searches_count += 1
+            t = datetime.strptime(now, SPLUNK_TIME_FORMAT)
+        if len(lastRun) == 0:
+            t = t - timedelta(minutes=10)
+            lastRun = t.strftime(SPLUNK_TIME_FORMAT)
 
     earliest_fetch_time_fieldname = demisto.params().get("earliest_fetch_time_fieldname", "index_earliest")
     latest_fetch_time_fieldname = demisto.params().get("latest_fetch_time_fieldname", "index_latest")
 
-    kwargs_oneshot = {earliest_fetch_time_fieldname: lastRun,
-                      latest_fetch_time_fieldname: now, "count": FETCH_LIMIT, 'offset': search_offset}
+    search_kwargs = {earliest_fetch_time_fieldname: lastRun, latest_fetch_time_fieldname: now}
 
-    searchquery_oneshot = demisto.params()['fetchQuery']
+    searchquery = demisto.params()['fetchQuery']
 
     if demisto.get(demisto.params(), 'extractFields'):
         extractFields = demisto.params()['extractFields']
         extra_raw_arr = extractFields.split(',')
         for field in extra_raw_arr:
             field_trimmed = field.strip()
-            searchquery_oneshot = searchquery_oneshot + ' | eval ' + field_trimmed + '=' + field_trimmed
+            searchquery = searchquery + ' | eval ' + field_trimmed + '=' + field_trimmed
 
-    oneshotsearch_results = service.jobs.oneshot(searchquery_oneshot, **kwargs_oneshot)
-    reader = results.ResultsReader(oneshotsearch_results)
+    job, created = get_fetch_job(service, last_run, searchquery, search_kwargs)
+    if created:
+        searches_count += 1
+    reader = results.ResultsReader(job.results(count=FETCH_LIMIT, offset=search_offset))
     for item in reader:
-        inc = notable_to_incident(item)
-        incidents.append(inc)
+        if isinstance(item, dict):
+            inc = notable_to_incident(item)
+            incidents.append(inc)
 
     demisto.incidents(incidents)
     if len(incidents) < FETCH_LIMIT:
         demisto.setLastRun({'time': now, 'offset': 0})
     else:
-        demisto.setLastRun({'time': lastRun, 'offset': search_offset + FETCH_LIMIT})
-    sys.exit(0)
-
-if demisto.command() == 'splunk-get-indexes':
-    indexes = service.indexes
-    indexesNames = []
-    for index in indexes:
-        index_json = {'name': index.name, 'count': index["totalEventCount"]}
-        indexesNames.append(index_json)
-    demisto.results({"Type": 1, "ContentsFormat": "json", "Contents": json.dumps(indexesNames),
-                     'HumanReadable': tableToMarkdown("Splunk Indexes names", indexesNames, '')})
-    sys.exit(0)
-
-if demisto.command() == 'splunk-submit-event':
-    try:
-        index = service.indexes[demisto.args()['index']]
-    except KeyError:
-        demisto.results({'ContentsFormat': formats['text'], 'Type': entryTypes['error'],
-                         'Contents': "Found no Splunk index: " + demisto.args()['index']})
-        sys.exit(0)
+        demisto.setLastRun({'time': lastRun, 'latest_time': now, 'offset': search_offset + FETCH_LIMIT,
+                            'sid': job.sid})
+    demisto.debug('SplunkPy fetch-incidents: fetched {} incidents, ran {} searches in {:.2f} seconds'
+                  .format(len(incidents), searches_count, time.time() - fetch_start_time))
+
+
+def main():
+    service = None
+    proxy = demisto.params()['proxy']
+    if proxy:
+        try:
+            service = client.connect(
+                handler=handler(proxy),
+                host=demisto.params()['host'],
+                port=demisto.params()['port'],
+                app=demisto.params().get('app'),
+                username=demisto.params()['authentication']['identifier'],
+                password=demisto.params()['authentication']['password'],
+                verify=VERIFY_CERTIFICATE)
+        except urllib2.URLError as e:
+            if e.reason.errno == 1 and sys.version_info < (2, 6, 3):  # type: ignore
+                pass
+            else:
+                raise
     else:
-        data = demisto.args()['data']
-        data_formatted = data.encode('utf8')
-        r = index.submit(data_formatted, sourcetype=demisto.args()['sourcetype'], host=demisto.args()['host'])
-        demisto.results('Event was created in Splunk index: ' + r.name)
-    sys.exit(0)
-
-if demisto.command() == 'splunk-notable-event-edit':
-    if not proxy:
-        os.environ["HTTPS_PROXY"] = ""
-        os.environ["HTTP_PROXY"] = ""
-        os.environ["https_proxy"] = ""
-        os.environ["http_proxy"] = ""
-    baseurl = 'https://' + demisto.params()['host'] + ':' + demisto.params()['port'] + '/'
-    username = demisto.params()['authentication']['identifier']
-    password = demisto.params()['authentication']['password']
-    auth_req = requests.post(baseurl + 'services/auth/login',
-                             data={'username': username, 'password': password, 'output_mode': 'json'}, verify=VERIFY_CERTIFICATE)
-
-    sessionKey = auth_req.json()['sessionKey']
-    eventIDs = None
-    if demisto.get(demisto.args(), 'eventIDs'):
-        eventIDsStr = demisto.args()['eventIDs']
-        eventIDs = eventIDsStr.split(",")
-    status = None
-    if demisto.get(demisto.args(), 'status'):
-        status = int(demisto.args()['status'])
-    response_info = updateNotableEvents(sessionKey=sessionKey, baseurl=baseurl,
-                                        comment=demisto.get(demisto.args(), 'comment'), status=status,
-                                        urgency=demisto.get(demisto.args(), 'urgency'),
-                                        owner=demisto.get(demisto.args(), 'owner'), eventIDs=eventIDs)
-    if 'success' not in response_info or not response_info['success']:
-        demisto.results({'ContentsFormat': formats['text'], 'Type': entryTypes['error'],
-                         'Contents': "Could not update notable "
-                                     "events: " + demisto.args()['eventIDs'] + ' : ' + str(response_info)})
+        service = client.connect(
+            host=demisto.params()['host'],
+            port=demisto.params()['port'],
+            app=demisto.params().get('app'),
+            username=demisto.params()['authentication']['identifier'],
+            password=demisto.params()['authentication']['password'],
+            verify=VERIFY_CERTIFICATE)
+
+    if service is None:
+        demisto.error("Could not connect to SplunkPy")
         sys.exit(0)
-    demisto.results('Splunk ES Notable events: ' + response_info['message'])
-    sys.exit(0)
-if demisto.command() == 'splunk-parse-raw':
-    raw = demisto.args()['raw']
-    rawDict = rawToDict(raw)
-    ec = {}
-    ec['Splunk.Raw.Parsed'] = rawDict
-    demisto.results({"Type": 1, "ContentsFormat": "json", "Contents": json.dumps(rawDict), "EntryContext": ec})
-    sys.exit(0)
+
+    # The command demisto.command() holds the command sent from the user.
+    if demisto.command() == 'test-module':
+        # for app in service.apps:
+        #    print app.name
+        if len(service.jobs) >= 0:
+            demisto.results('ok')
+        sys.exit(0)
+    if demisto.command() == 'splunk-search':
+        splunk_search_command(service)
+        sys.exit(0)
+    if demisto.command() == 'splunk-job-create':
+        searchquery_normal = demisto.args()['query']
+        if not searchquery_normal.startswith('search'):
+            searchquery_normal = 'search ' + searchquery_normal
+        kwargs_normalsearch = {"exec_mode": "normal"}
+        job = service.jobs.create(searchquery_normal, **kwargs_normalsearch)
+
+        ec = {}
+        ec['Splunk.Job'] = job.sid
+        demisto.results({"Type": 1, "ContentsFormat": formats['text'],
+                         "Contents": "Splunk Job created with SID: " + job.sid, "EntryContext": ec})
+        sys.exit(0)
+    if demisto.command() == 'splunk-results':
+        jobs = service.jobs
+        found = False
+        res = []
+        for job in jobs:
+            if job.sid == demisto.args()['sid']:
+                rr = results.ResultsReader(job.results())
+                for result in rr:
+                    if isinstance(result, results.Message):
+                        demisto.results({"Type": 1, "ContentsFormat": "json", "Contents": json.dumps(result.message)})
+                    elif isinstance(result, dict):
+                        # Normal events are returned as dicts
+                        res.append(result)
+                found = True
+        if not found:
+            demisto.results("Found no job for sid: " + demisto.args()['sid'])
+        if found:
+            demisto.results({"Type": 1, "ContentsFormat": "json", "Contents": json.dumps(res)})
+        sys.exit(0)
+    if demisto.command() == 'fetch-incidents':
+        fetch_incidents(service)
+        sys.exit(0)
+
+    if demisto.command() == 'splunk-get-indexes':
+        indexes = service.indexes
+        indexesNames = []
+        for index in indexes:
+            index_json = {'name': index.name, 'count': index["totalEventCount"]}
+            indexesNames.append(index_json)
+        demisto.results({"Type": 1, "ContentsFormat": "json", "Contents": json.dumps(indexesNames),
+                         'HumanReadable': tableToMarkdown("Splunk Indexes names", indexesNames, '')})
+        sys.exit(0)
+
+    if demisto.command() == 'splunk-submit-event':
+        try:
+            index = service.indexes[demisto.args()['index']]
+        except KeyError:
+            demisto.results({'ContentsFormat': formats['text'], 'Type': entryTypes['error'],
+                             'Contents': "Found no Splunk index: " + demisto.args()['index']})
+            sys.exit(0)
+        else:
+            data = demisto.args()['data']
+            data_formatted = data.encode('utf8')
+            r = index.submit(data_formatted, sourcetype=demisto.args()['sourcetype'], host=demisto.args()['host'])
+            demisto.results('Event was created in Splunk index: ' + r.name)
+        sys.exit(0)
+
+    if demisto.command() == 'splunk-notable-event-edit':
+        if not proxy:
+            os.environ["HTTPS_PROXY"] = ""
+            os.environ["HTTP_PROXY"] = ""
+            os.environ["https_proxy"] = ""
+            os.environ["http_proxy"] = ""
+        baseurl = 'https://' + demisto.params()['host'] + ':' + demisto.params()['port'] + '/'
+        username = demisto.params()['authentication']['identifier']
+        password = demisto.params()['authentication']['password']
+        auth_req = requests.post(baseurl + 'services/auth/login',
+                                 data={'username': username, 'password': password, 'output_mode': 'json'},
+                                 verify=VERIFY_CERTIFICATE)
+
+        sessionKey = auth_req.json()['sessionKey']
+        eventIDs = None
+        if demisto.get(demisto.args(), 'eventIDs'):
+            eventIDsStr = demisto.args()['eventIDs']
+            eventIDs = eventIDsStr.split(",")
+        status = None
+        if demisto.get(demisto.args(), 'status'):
+            status = int(demisto.args()['status'])
+        response_info = updateNotableEvents(sessionKey=sessionKey, baseurl=baseurl,
+                                            comment=demisto.get(demisto.args(), 'comment'), status=status,
+                                            urgency=demisto.get(demisto.args(), 'urgency'),
+                                            owner=demisto.get(demisto.args(), 'owner'), eventIDs=eventIDs)
+        if 'success' not in response_info or not response_info['success']:
+            demisto.results({'ContentsFormat': formats['text'], 'Type': entryTypes['error'],
+                             'Contents': "Could not update notable "
+                                         "events: " + demisto.args()['eventIDs'] + ' : ' + str(response_info)})
+            sys.exit(0)
+        demisto.results('Splunk ES Notable events: ' + response_info['message'])
+        sys.exit(0)
+    if demisto.command() == 'splunk-parse-raw':
+        raw = demisto.args()['raw']
+        rawDict = rawToDict(raw)
+        ec = {}
+        ec['Splunk.Raw.Parsed'] = rawDict
+        demisto.results({"Type": 1, "ContentsFormat": "json", "Contents": json.dumps(rawDict), "EntryContext": ec})
+        sys.exit(0)
+
+
+if __name__ in ('__builtin__', 'builtins'):
+    main()
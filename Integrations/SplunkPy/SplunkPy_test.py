@@ -0,0 +1,213 @@
+from StringIO import StringIO
+from xml.sax.saxutils import escape
+
+import pytest
+import demistomock as demisto
+from splunklib.binding import HTTPError
+from splunklib.data import record
+
+
+def results_stream(events, preview=False, messages=()):
+    """Returns a stream of events in the XML results format of the Splunk REST API"""
+    xml = "<?xml version='1.0' encoding='UTF-8'?>\n<results preview='{}'>\n".format(1 if preview else 0)
+    if messages:
+        xml += "<messages>{}</messages>\n".format(
+            ''.join("<msg type='INFO'>{}</msg>".format(escape(message)) for message in messages))
+    for offset, event in enumerate(events):
+        xml += "<result offset='{}'>".format(offset)
+        for key, value in event.items():
+            xml += "<field k='{}'><value><text>{}</text></value></field>".format(key, escape(value))
+        xml += "</result>\n"
+    return StringIO(xml + "</results>\n")
+
+
+class SplunkJobStandIn(object):
+    def __init__(self, sid, events, search_kwargs):
+        self.sid = sid
+        self.events = events
+        self.search_kwargs = search_kwargs
+
+    def results(self, count=0, offset=0):
+        return results_stream(self.events[offset:offset + count] if count else self.events[offset:])
+
+
+class SplunkServiceStandIn(object):
+    """A local stand-in for a splunklib service, keeping its search jobs in memory"""
+    def __init__(self, events, messages=()):
+        self.events = events
+        self.messages = messages
+        self.created_jobs = {}
+        self.exports = []
+        self.export_streams = []
+
+    @property
+    def jobs(self):
+        return self
+
+    def create(self, query, **kwargs):
+        sid = 'sid{}'.format(len(self.created_jobs))
+        self.created_jobs[sid] = SplunkJobStandIn(sid, self.events, kwargs)
+        return self.created_jobs[sid]
+
+    def job(self, sid):
+        if sid not in self.created_jobs:
+            raise HTTPError(record({'status': 404, 'reason': 'Not Found', 'headers': [], 'body': StringIO('')}))
+        return self.created_jobs[sid]
+
+    def export(self, query, **kwargs):
+        self.exports.append(query)
+        preview = results_stream(self.events[:1], preview=True).read().replace("<?xml version='1.0' encoding='UTF-8'?>", '')
+        final = results_stream(self.events, messages=self.messages).read().replace(
+            "<?xml version='1.0' encoding='UTF-8'?>", '')
+        self.export_streams.append(StringIO("<?xml version='1.0' encoding='UTF-8'?>\n" + preview + final))
+        return self.export_streams[-1]
+
+
+EVENTS = [{'_time': '2019-11-12T10:0{}:00'.format(i), 'rule_title': 'title', 'rule_name': 'rule{}'.format(i),
+           'urgency': 'high', 'host': 'host{}'.format(i)} for i in range(5)]
+MANY_EVENTS = [{'rule_name': 'rule{}'.format(i), 'host': 'host{}'.format(i)} for i in range(150)]
+
+
+@pytest.fixture(autouse=True)
+def fetch_params(mocker):
+    mocker.patch.object(demisto, 'params', return_value={'fetchQuery': 'search `notable`'})
+
+
+def test_fetch_incidents_pages_from_job(mocker):
+    """
+    Given:
+        - 5 notable events in the fetch window and a fetch limit of 2
+    When:
+        - Fetching incidents several times
+    Then:
+        - The search runs once, and the next pages are read from the results of the job kept in the last run
+    """
+    import SplunkPy as splunk
+    mocker.patch.object(splunk, 'FETCH_LIMIT', 2)
+    service = SplunkServiceStandIn(EVENTS)
+    last_run = {}
+    mocker.patch.object(demisto, 'getLastRun', side_effect=lambda: last_run)
+    mocker.patch.object(demisto, 'setLastRun', side_effect=lambda obj: (last_run.clear(), last_run.update(obj)))
+    mocker.patch.object(demisto, 'incidents')
+
+    fetched = []
+    for _ in range(3):
+        splunk.fetch_incidents(service)
+        fetched.extend(incident['name'] for incident in demisto.incidents.call_args[0][0])
+
+    assert fetched == ['title : rule{}'.format(i) for i in range(5)]
+    assert len(service.created_jobs) == 1
+    window = service.created_jobs['sid0'].search_kwargs
+    assert last_run == {'time': window['index_latest'], 'offset': 0}
+
+
+def test_fetch_incidents_expired_job(mocker):
+    """
+    Given:
+        - A last run with the job of a window which was not fully fetched, and the job has expired
+    When:
+        - Fetching incidents
+    Then:
+        - The search runs again for the same window, and the next page is read from the new job
+    """
+    import SplunkPy as splunk
+    mocker.patch.object(splunk, 'FETCH_LIMIT', 2)
+    service = SplunkServiceStandIn(EVENTS)
+    mocker.patch.object(demisto, 'getLastRun', return_value={
+        'time': '2019-11-12T10:00:00', 'latest_time': '2019-11-12T10:10:00', 'offset': 2, 'sid': 'expired'})
+    mocker.patch.object(demisto, 'setLastRun')
+    mocker.patch.object(demisto, 'incidents')
+
+    splunk.fetch_incidents(service)
+
+    assert [incident['name'] for incident in demisto.incidents.call_args[0][0]] == ['title : rule2', 'title : rule3']
+    assert service.created_jobs['sid0'].search_kwargs == {'index_earliest': '2019-11-12T10:00:00',
+                                                          'index_latest': '2019-11-12T10:10:00',
+                                                          'exec_mode': 'blocking'}
+    assert demisto.setLastRun.call_args[0][0] == {'time': '2019-11-12T10:00:00', 'latest_time': '2019-11-12T10:10:00',
+                                                  'offset': 4, 'sid': 'sid0'}
+
+
+def test_splunk_search_export(mocker):
+    """
+    Given:
+        - A search whose export stream starts with preview results
+    When:
+        - Running splunk-search with an event limit
+    Then:
+        - The search runs once through the export endpoint, and only final results up to the limit are returned
+    """
+    import SplunkPy as splunk
+    service = SplunkServiceStandIn(EVENTS)
+    mocker.patch.object(demisto, 'args', return_value={'query': 'index=notable', 'event_limit': '3'})
+    mocker.patch.object(demisto, 'results')
+
+    splunk.splunk_search_command(service)
+
+    entry = demisto.results.call_args[0][0]
+    assert [event['rule_name'] for event in entry['Contents']] == ['rule0', 'rule1', 'rule2']
+    assert len(entry['EntryContext']['DBotScore']) == 3
+    assert service.exports == ['search index=notable']
+    assert not service.created_jobs
+    assert service.export_streams[0].closed
+
+
+@pytest.mark.parametrize('args, expected_count', [({}, 100), ({'event_limit': '0'}, 150), ({'event_limit': '120'}, 120)])
+def test_splunk_search_event_limit(mocker, args, expected_count):
+    """
+    Given:
+        - A search with 150 events
+    When:
+        - Running splunk-search without an event limit, with a limit of 0, and with a limit of 120
+    Then:
+        - 100 events are returned by default, all of them for 0, and the given number of events otherwise
+    """
+    import SplunkPy as splunk
+    service = SplunkServiceStandIn(MANY_EVENTS)
+    args['query'] = 'index=main'
+    mocker.patch.object(demisto, 'args', return_value=args)
+    mocker.patch.object(demisto, 'results')
+
+    splunk.splunk_search_command(service)
+
+    assert len(demisto.results.call_args[0][0]['Contents']) == expected_count
+
+
+def test_splunk_search_event_limit_with_messages(mocker):
+    """
+    Given:
+        - A search whose results include messages along with the events
+    When:
+        - Running splunk-search with an event limit
+    Then:
+        - The messages are returned, and they are not counted toward the limit
+    """
+    import SplunkPy as splunk
+    service = SplunkServiceStandIn(EVENTS, messages=['first message', 'second message'])
+    mocker.patch.object(demisto, 'args', return_value={'query': 'index=notable', 'event_limit': '3'})
+    mocker.patch.object(demisto, 'results')
+
+    splunk.splunk_search_command(service)
+
+    contents = demisto.results.call_args[0][0]['Contents']
+    assert [item for item in contents if not isinstance(item, dict)] == ['first message', 'second message']
+    assert [item['rule_name'] for item in contents if isinstance(item, dict)] == ['rule0', 'rule1', 'rule2']
+
+
+def test_splunk_search_error_message(mocker):
+    """
+    Given:
+        - A search whose results include an error message
+    When:
+        - Running splunk-search
+    Then:
+        - An error is raised and the export stream is closed
+    """
+    import SplunkPy as splunk
+    service = SplunkServiceStandIn(EVENTS, messages=['Error in search: unknown command'])
+    mocker.patch.object(demisto, 'args', return_value={'query': 'index=notable'})
+
+    with pytest.raises(ValueError):
+        splunk.splunk_search_command(service)
+
+    assert service.export_streams[0].closed
@@ -4,10 +4,18 @@ from CommonServerUserPython import *
 import re
 import socket
 import sys
+import time
+import threading
 from codecs import encode, decode
+from multiprocessing.pool import ThreadPool
 import socks
 
 ENTRY_TYPE = entryTypes['error'] if demisto.params().get('with_error', False) else entryTypes['warning']
+WHOIS_PORT = 43
+# lookups of a batch run concurrently, but no more than this many at a time against the same whois server
+SERVER_CONCURRENCY = 2
+RESULTS_CACHE_TTL = 60 * 60  # seconds
+RESULTS_CACHE_SIZE = 1000  # the maximal number of domains kept in the results cache
 
 # flake8: noqa
 
@@ -7119,11 +7127,15 @@ dble_ext_str = "chirurgiens-dentistes.fr,in-addr.arpa,uk.net,za.org,mod.uk,org.z
                "jp.net,gb.com,veterinaire.fr,edu.cn,qc.com,pharmacien.fr,ac.za,sa.com,medecin.fr,uy.com,se.net,co.pl," \
                "cn.com,hu.com,no.com,ac.uk,jpn.com,priv.at,za.net,nls.uk,nhs.uk,za.bz,experts-comptables.fr," \
                "chambagri.fr,gb.net,in.ua,notaires.fr,se.com,british-library.uk "
-dble_ext = dble_ext_str.split(",")
+dble_ext = set(ext.strip() for ext in dble_ext_str.split(","))
 
 
 def get_whois_raw(domain, server="", previous=None, rfc3490=True, never_cut=False, with_server_list=False,
-                  server_list=None):
+                  server_list=None, referral_servers=None):
+    """
+    referral_servers maps a TLD to the whois server its root server refers every domain of it to. Root queries of a
+    TLD in it go straight to that server, and it is filled with the TLD-wide referrals of root servers.
+    """
     previous = previous or []
     server_list = server_list or []
     # Sometimes IANA simply won't give us the right root WHOIS server
@@ -7143,6 +7155,7 @@ def get_whois_raw(domain, server="", previous=None, rfc3490=True, never_cut=Fals
         else:
             domain = encode(domain, "idna").decode("ascii")
 
+    ext = None
     if len(previous) == 0 and server == "":
         # Root query
         is_exception = False
@@ -7152,7 +7165,12 @@ def get_whois_raw(domain, server="", previous=None, rfc3490=True, never_cut=Fals
                 target_server = exc_serv
                 break
         if not is_exception:
-            target_server = get_root_server(domain)
+            ext = get_domain_extension(domain)
+            if referral_servers and ext in referral_servers:
+                target_server = referral_servers[ext]
+                ext = None
+            else:
+                target_server = get_root_server(domain)
     else:
         target_server = server
     if target_server == "whois.jprs.jp":
@@ -7188,7 +7206,11 @@ def get_whois_raw(domain, server="", previous=None, rfc3490=True, never_cut=Fals
                          re.IGNORECASE)
         if match is not None:
             referal_server = match.group(2)
-            if referal_server != server and "://" not in referal_server:  # We want to ignore anything non-WHOIS (eg. HTTP) for now.
+            # We want to ignore anything non-WHOIS (eg. HTTP) for now.
+            if referal_server != target_server and "://" not in referal_server:
+                if ext and referral_servers is not None and match.group(1).lower() == "refer":
+                    # The root server refers the whole TLD, unlike registrar referrals which differ per domain
+                    referral_servers[ext] = referal_server
                 # Referal to another WHOIS server...
                 return get_whois_raw(domain, referal_server, new_list, server_list=server_list,
                                      with_server_list=with_server_list)
@@ -7198,80 +7220,54 @@ def get_whois_raw(domain, server="", previous=None, rfc3490=True, never_cut=Fals
         return new_list
 
 
-def get_root_server(domain):
-    ext = domain.split(".")[-1]
-    for dble in dble_ext:
-        if domain.endswith(dble):
-            ext = dble
+def get_domain_extension(domain):
+    labels = domain.split(".")
+    if ".".join(labels[-2:]) in dble_ext:
+        return ".".join(labels[-2:])
+    return labels[-1]
 
-    if ext in tlds.keys():
-        entry = tlds[ext]
-        try:
-            host = entry["host"]
-        except KeyError:
-            context = ({
-                outputPaths['domain']: {
-                    'Name': domain,
-                    'Whois': {
-                        'QueryStatus': 'Failed'
-                    }
-                },
-            })
-            demisto.results({
-                'ContentsFormat': 'text',
-                'Type': ENTRY_TYPE,
-                'Contents': 'The domain - {} - is not supported by the Whois service'.format(domain),
-                'EntryContext': context
-            })
-            sys.exit(-1)
-
-        return host
 
-    else:
+def get_root_server(domain):
+    entry = tlds.get(get_domain_extension(domain))
+    if entry is None:
         raise WhoisException("No root WHOIS server found for domain.")
+    if "host" not in entry:
+        raise WhoisQueryFailed(domain, 'The domain - {} - is not supported by the Whois service'.format(domain))
+    return entry["host"]
 
 
-def whois_request(domain, server, port=43):
-    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    try:
-        sock.connect((server, port))
-    except Exception as msg:
-        context = ({
-            outputPaths['domain']: {
-                'Name': domain,
-                'Whois': {
-                    'QueryStatus': 'Failed'
-                }
-            },
-        })
-
-        demisto.results(
-            {
-                'ContentsFormat': 'text',
-                'Type': ENTRY_TYPE,
-                'Contents': "Whois returned - Couldn't connect with the socket-server: {}".format(msg),
-                'EntryContext': context
-            }
-        )
-        sys.exit(-1)
+def get_server_semaphore(server):
+    with server_semaphores_lock:
+        if server not in server_semaphores:
+            server_semaphores[server] = threading.BoundedSemaphore(SERVER_CONCURRENCY)
+        return server_semaphores[server]
 
-    else:
-        sock.send(("%s\r\n" % domain).encode("utf-8"))
-        buff = b""
-        while True:
-            data = sock.recv(1024)
-            if len(data) == 0:
-                break
-            buff += data
-        sock.close()
+
+def whois_request(domain, server, port=None):
+    with get_server_semaphore(server):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         try:
-            d = buff.decode("utf-8")
-        except UnicodeDecodeError:
-            d = buff.decode("latin-1")
+            sock.connect((server, port or WHOIS_PORT))
+        except Exception as msg:
+            sock.close()
+            raise WhoisQueryFailed(domain, "Whois returned - Couldn't connect with the socket-server: {}".format(msg))
 
-        return d
-    finally:        
-        sock.close()
+        try:
+            sock.send(("%s\r\n" % domain).encode("utf-8"))
+            chunks = []
+            while True:
+                data = sock.recv(4096)
+                if len(data) == 0:
+                    break
+                chunks.append(data)
+        finally:
+            sock.close()
+
+    buff = b"".join(chunks)
+    try:
+        return buff.decode("utf-8")
+    except UnicodeDecodeError:
+        return buff.decode("latin-1")
 
 
 airports = {} # type: dict
@@ -7285,10 +7281,38 @@ class WhoisException(Exception):
     pass
 
 
+class WhoisQueryFailed(Exception):
+    def __init__(self, domain, message):
+        super(WhoisQueryFailed, self).__init__(message)
+        self.domain = domain
+        self.message = message
+
+
+grammar_rules = []  # type: list
+server_semaphores = {}  # type: dict
+server_semaphores_lock = threading.Lock()
+
+
 def precompile_regexes(source, flags=0):
     return [re.compile(regex, flags) for regex in source]
 
 
+def get_grammar_rules():
+    """
+    Returns (rule key, combined pattern, compiled regexes) for every rule of grammar['_data'], compiled on first use.
+    The combined pattern matches wherever one of the rule regexes does, so a segment or a line it does not match
+    skips the rule regexes altogether.
+    """
+    if not grammar_rules:
+        rules = []
+        for rule_key, rule_regexes in grammar['_data'].items():  # type: ignore
+            combined = '|'.join('(?:{})'.format(regex.replace('(?P<val>', '(?:')) for regex in rule_regexes)
+            rules.append((rule_key, re.compile(combined, re.MULTILINE | re.IGNORECASE),
+                          precompile_regexes(rule_regexes, re.IGNORECASE)))
+        grammar_rules[:] = rules
+    return grammar_rules
+
+
 def preprocess_regex(regex):
     # Fix for #2; prevents a ridiculous amount of varying size permutations.
     regex = re.sub(r"\\s\*\(\?P<([^>]+)>\.\+\)", r"\s*(?P<\1>\S.*)", regex)
@@ -7611,16 +7635,6 @@ organization_regexes = (
     r"\ss\.?a\.?r\.?l\.?($|\s)",
 )
 
-grammar["_data"]["id"] = precompile_regexes(grammar["_data"]["id"], re.IGNORECASE)    # type: ignore
-grammar["_data"]["status"] = precompile_regexes(grammar["_data"]["status"], re.IGNORECASE)  # type: ignore
-grammar["_data"]["creation_date"] = precompile_regexes(grammar["_data"]["creation_date"], re.IGNORECASE)  # type: ignore
-grammar["_data"]["expiration_date"] = precompile_regexes(grammar["_data"]["expiration_date"], re.IGNORECASE)  # type: ignore
-grammar["_data"]["updated_date"] = precompile_regexes(grammar["_data"]["updated_date"], re.IGNORECASE)  # type: ignore
-grammar["_data"]["registrar"] = precompile_regexes(grammar["_data"]["registrar"], re.IGNORECASE)  # type: ignore
-grammar["_data"]["whois_server"] = precompile_regexes(grammar["_data"]["whois_server"], re.IGNORECASE)  # type: ignore
-grammar["_data"]["nameservers"] = precompile_regexes(grammar["_data"]["nameservers"], re.IGNORECASE)  # type: ignore
-grammar["_data"]["emails"] = precompile_regexes(grammar["_data"]["emails"], re.IGNORECASE)  # type: ignore
-
 grammar["_dateformats"] = precompile_regexes(grammar["_dateformats"], re.IGNORECASE)
 
 registrant_regexes = precompile_regexes(registrant_regexes)
@@ -7652,19 +7666,24 @@ def parse_raw_whois(raw_data, normalized=None, never_query_handles=True, handle_
     raw_data = [segment.replace("\r", "") for segment in raw_data]  # Carriage returns are the devil
 
     for segment in raw_data:
-        for rule_key, rule_regexes in grammar['_data'].items():  # type: ignore
-            if (rule_key in data) == False:
-                for line in segment.splitlines():
-                    for regex in rule_regexes:
-                        result = re.search(regex, line)
-
-                        if result is not None:
-                            val = result.group("val").strip()
-                            if val != "":
-                                try:
-                                    data[rule_key].append(val)
-                                except KeyError as e:
-                                    data[rule_key] = [val]
+        lines = None
+        for rule_key, combined_regex, rule_regexes in get_grammar_rules():
+            if rule_key in data or combined_regex.search(segment) is None:
+                continue
+            lines = lines or segment.splitlines()
+            for line in lines:
+                if combined_regex.search(line) is None:
+                    continue
+                for regex in rule_regexes:
+                    result = regex.search(line)
+
+                    if result is not None:
+                        val = result.group("val").strip()
+                        if val != "":
+                            try:
+                                data[rule_key].append(val)
+                            except KeyError as e:
+                                data[rule_key] = [val]
 
         # Whois.com is a bit special... Fabulous.com also seems to use this format. As do some others.
         match = re.search("^\s?Name\s?[Ss]ervers:?\s*\n((?:\s*.+\n)+?\s?)\n", segment, re.MULTILINE)
@@ -8231,12 +8250,61 @@ def parse_nic_contact(data):
     return handle_contacts
 
 
-def get_whois(domain, normalized=None):
+def get_whois(domain, normalized=None, cache=None):
     if normalized is None:
         normalized = []
-    raw_data, server_list = get_whois_raw(domain, with_server_list=True)
+    cached = cache['results'].get(domain) if cache is not None else None
+    if cached and time.time() - cached['timestamp'] < RESULTS_CACHE_TTL:
+        raw_data, handle_server = cached['raw'], cached['server']
+    else:
+        raw_data, server_list = get_whois_raw(domain, with_server_list=True,
+                                              referral_servers=cache['referral_servers'] if cache is not None else None)
+        handle_server = server_list[-1]
+        if cache is not None:
+            cache['results'][domain] = {'timestamp': int(time.time()), 'raw': raw_data, 'server': handle_server}
+            cache['updated'] = True
     return parse_raw_whois(raw_data, normalized=normalized, never_query_handles=False,
-                           handle_server=server_list[-1])
+                           handle_server=handle_server)
+
+
+def get_live_results(results):
+    """Returns the newest RESULTS_CACHE_SIZE cached results which did not expire yet"""
+    now = time.time()
+    live = [(domain, cached) for domain, cached in results.items() if now - cached['timestamp'] < RESULTS_CACHE_TTL]
+    live.sort(key=lambda item: item[1]['timestamp'], reverse=True)
+    return dict(live[:RESULTS_CACHE_SIZE])
+
+
+def load_results_cache():
+    """
+    Returns the raw whois responses kept in the integration context which did not expire yet, and the TLD referral
+    servers kept with them
+    """
+    context = demisto.getIntegrationContext() or {}
+    return {
+        'results': get_live_results(context.get('results') or {}),
+        'referral_servers': dict(context.get('referral_servers') or {}),
+        'updated': False
+    }
+
+
+def save_results_cache(cache):
+    """
+    Merges the results into the ones kept in the integration context, which another run may have updated in the
+    meantime, and writes back the newest ones which did not expire yet. Nothing is written when no domain was queried.
+    """
+    if not cache['updated']:
+        return
+    context = demisto.getIntegrationContext() or {}
+    results = dict(context.get('results') or {})
+    for domain, cached in cache['results'].items():
+        if domain not in results or results[domain]['timestamp'] < cached['timestamp']:
+            results[domain] = cached
+    context['results'] = get_live_results(results)
+    referral_servers = dict(context.get('referral_servers') or {})
+    referral_servers.update(cache['referral_servers'])
+    context['referral_servers'] = referral_servers
+    demisto.setIntegrationContext(context)
 
 # Drops the mic disable-secrets-detection-end
 
@@ -8244,12 +8312,53 @@ def get_whois(domain, normalized=None):
 '''COMMANDS'''
 
 
-def whois_command():
+def failed_query_entry(domain, message):
+    return {
+        'ContentsFormat': 'text',
+        'Type': ENTRY_TYPE,
+        'Contents': message,
+        'EntryContext': {
+            outputPaths['domain']: {
+                'Name': domain,
+                'Whois': {
+                    'QueryStatus': 'Failed'
+                }
+            },
+        }
+    }
 
+
+def whois_command():
     domain = demisto.args().get('query')
+    cache = load_results_cache()
+    whois_result = get_whois(domain, cache=cache)
+    save_results_cache(cache)
+    demisto.results(create_whois_entry(domain, whois_result))
 
-    whois_result = get_whois(domain)
 
+def whois_batch_command():
+    domains = argToList(demisto.args().get('query'))
+    max_workers = int(demisto.args().get('max_workers', 10))
+    cache = load_results_cache()
+
+    def lookup(domain):
+        try:
+            return create_whois_entry(domain, get_whois(domain, cache=cache))
+        except WhoisQueryFailed as e:
+            return failed_query_entry(e.domain, e.message)
+        except Exception as e:
+            return failed_query_entry(domain, 'Whois lookup of {} failed: {}'.format(domain, e))
+
+    pool = ThreadPool(max(1, min(max_workers, len(domains))))
+    try:
+        entries = pool.map(lookup, domains)
+    finally:
+        pool.terminate()
+    save_results_cache(cache)
+    demisto.results(entries)
+
+
+def create_whois_entry(domain, whois_result):
     md = {'Name': domain}
     ec = {'Name': domain}
     standard_ec = {}  # type:dict
@@ -8285,7 +8394,7 @@ def whois_command():
                 '%d-%m-%Y')
             md['Expiration Date'] = whois_result.get('expiration_date')[0].strftime('%d-%m-%Y')
     except ValueError as e:
-        return_error('Date could not be parsed. Please check the date again.\n{}'.format(e))
+        raise ValueError('Date could not be parsed. Please check the date again.\n{}'.format(e))
     if 'registrar' in whois_result:
         ec.update({'Registrar': {'Name': whois_result.get('registrar')}})
         standard_ec['WHOIS']['Registrar'] = whois_result.get('registrar')
@@ -8324,13 +8433,13 @@ def whois_command():
         outputPaths['domain']: standard_ec
     })
 
-    demisto.results({
+    return {
         'Type': entryTypes['note'],
         'ContentsFormat': formats['markdown'],
         'Contents': str(whois_result),
         'HumanReadable': tableToMarkdown('Whois results for {}'.format(domain), md),
         'EntryContext': context
-    })
+    }
 
 
 def test_command():
@@ -8380,6 +8489,11 @@ def main():
             test_command()
         elif demisto.command() == 'whois':
             whois_command()
+        elif demisto.command() == 'whois-batch':
+            whois_batch_command()
+    except WhoisQueryFailed as e:
+        demisto.results(failed_query_entry(e.domain, e.message))
+        sys.exit(-1)
     except Exception as e:
         LOG(e)
         return_error(str(e))
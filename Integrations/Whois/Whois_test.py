@@ -53,3 +53,269 @@ def test_socks_proxy(mocker, request):
     assert_results_ok()
     tmp.seek(0)
     assert 'connected to' in tmp.read()  # make sure we went through microsocks
+
+
+class WhoisServerStandIn(object):
+    """
+    Local TCP whois server. The root server (127.0.0.1) refers every domain to the registrar server (127.0.0.2),
+    which answers with a minimal record. Tracks the queries and the peak number of concurrent connections per server.
+    The referral field is a registrar referral by default, and can be set to 'refer' for a TLD-wide referral.
+    """
+    def __init__(self, delay=0.05, referral_field='Registrar WHOIS Server'):
+        import SocketServer
+        import threading
+        stand_in = self
+        self.delay = delay
+        self.referral_field = referral_field
+        self.queries = []
+        self.active = {}
+        self.peak = {}
+        self.lock = threading.Lock()
+
+        class Handler(SocketServer.StreamRequestHandler):
+            def handle(self):
+                server_ip = self.connection.getsockname()[0]
+                with stand_in.lock:
+                    stand_in.active[server_ip] = stand_in.active.get(server_ip, 0) + 1
+                    stand_in.peak[server_ip] = max(stand_in.peak.get(server_ip, 0), stand_in.active[server_ip])
+                try:
+                    query = self.rfile.readline().strip()
+                    stand_in.queries.append((server_ip, query))
+                    time.sleep(stand_in.delay)
+                    self.wfile.write(stand_in.respond(server_ip, query).encode('utf-8'))
+                finally:
+                    with stand_in.lock:
+                        stand_in.active[server_ip] -= 1
+
+        SocketServer.ThreadingTCPServer.allow_reuse_address = True
+        self.server = SocketServer.ThreadingTCPServer(('0.0.0.0', 0), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def respond(self, server_ip, query):
+        if server_ip == '127.0.0.1':
+            return 'Domain Name: {}\n{}: 127.0.0.2\n'.format(query.upper(), self.referral_field)
+        return 'Domain Name: {}\nRegistry Domain ID: {}-ID\nName Server: ns1.{}\n'.format(query.upper(), query, query)
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def whois_server(mocker, request):
+    stand_in = WhoisServerStandIn()
+    request.addfinalizer(stand_in.close)
+    mocker.patch.object(Whois, 'WHOIS_PORT', stand_in.port)
+    mocker.patch.object(Whois, 'get_root_server', return_value='127.0.0.1')
+    mocker.patch.object(demisto, 'getIntegrationContext', return_value={})
+    mocker.patch.object(demisto, 'setIntegrationContext')
+    return stand_in
+
+
+def test_whois_batch_command(mocker, whois_server):
+    """
+    Given
+        - a root whois server referring to a registrar server, both served by a local stand-in
+    When
+        - running whois-batch on several domains
+    Then
+        - every domain is resolved through the referral
+        - no more than SERVER_CONCURRENCY connections are open against a server at once
+    """
+    domains = ['domain{}.com'.format(i) for i in range(8)]
+    mocker.patch.object(demisto, 'args', return_value={'query': ','.join(domains), 'max_workers': '8'})
+    mocker.patch.object(demisto, 'results')
+    Whois.whois_batch_command()
+
+    entries = demisto.results.call_args[0][0]
+    assert [entry['EntryContext'][Whois.outputPaths['domain']]['Name'] for entry in entries] == domains
+    assert all(entry['Type'] == Whois.entryTypes['note'] for entry in entries)
+    assert entries[0]['EntryContext'][Whois.outputPaths['domain']]['Whois']['ID'] == ['domain0.com-ID']
+    assert len(whois_server.queries) == 16
+    assert whois_server.peak['127.0.0.1'] <= Whois.SERVER_CONCURRENCY
+    assert whois_server.peak['127.0.0.2'] <= Whois.SERVER_CONCURRENCY
+
+
+def test_whois_batch_command_cached(mocker, whois_server):
+    """
+    Given
+        - whois results cached in the integration context by a previous run
+    When
+        - running whois-batch on a cached domain and a new one
+    Then
+        - only the new domain is queried, and both are cached afterwards
+        - the registrar referral is not kept as the referral server of the TLD
+        - the integration context is not written when all the domains are cached
+    """
+    mocker.patch.object(demisto, 'args', return_value={'query': 'cached.com'})
+    mocker.patch.object(demisto, 'results')
+    Whois.whois_batch_command()
+    context = demisto.setIntegrationContext.call_args[0][0]
+    assert list(context['results'].keys()) == ['cached.com']
+
+    whois_server.queries = []
+    demisto.getIntegrationContext.return_value = context
+    mocker.patch.object(demisto, 'args', return_value={'query': 'cached.com,new.com'})
+    Whois.whois_batch_command()
+    assert [query for _, query in whois_server.queries] == ['new.com', 'new.com']
+    context = demisto.setIntegrationContext.call_args[0][0]
+    assert sorted(context['results'].keys()) == ['cached.com', 'new.com']
+    assert context['referral_servers'] == {}
+
+    whois_server.queries = []
+    demisto.getIntegrationContext.return_value = context
+    demisto.setIntegrationContext.reset_mock()
+    Whois.whois_batch_command()
+    assert whois_server.queries == []
+    assert demisto.setIntegrationContext.call_count == 0
+
+    # expired results are queried again
+    context['results']['cached.com']['timestamp'] -= Whois.RESULTS_CACHE_TTL
+    whois_server.queries = []
+    mocker.patch.object(demisto, 'args', return_value={'query': 'cached.com'})
+    Whois.whois_batch_command()
+    assert [query for _, query in whois_server.queries] == ['cached.com', 'cached.com']
+
+
+def test_save_results_cache(mocker):
+    """
+    Given
+        - results cached in the integration context, one of them expired, and another run's result saved meanwhile
+    When
+        - saving the results of a run
+    Then
+        - the results of both runs are kept, the expired one is evicted and only the newest results are kept
+    """
+    now = int(time.time())
+    context = {'results': {
+        'expired.com': {'timestamp': now - Whois.RESULTS_CACHE_TTL, 'raw': [], 'server': 'whois.example.com'},
+        'other.com': {'timestamp': now - 10, 'raw': [], 'server': 'whois.example.com'}
+    }}
+    mocker.patch.object(demisto, 'getIntegrationContext', return_value=context)
+    mocker.patch.object(demisto, 'setIntegrationContext')
+    mocker.patch.object(Whois, 'RESULTS_CACHE_SIZE', 2)
+    cache = {
+        'results': {
+            'old.com': {'timestamp': now - 20, 'raw': [], 'server': 'whois.example.com'},
+            'new.com': {'timestamp': now, 'raw': [], 'server': 'whois.example.com'}
+        },
+        'referral_servers': {},
+        'updated': True
+    }
+
+    Whois.save_results_cache(cache)
+
+    results = demisto.setIntegrationContext.call_args[0][0]['results']
+    assert sorted(results.keys()) == ['new.com', 'other.com']
+
+
+def test_whois_batch_command_referral_server(mocker, whois_server):
+    """
+    Given
+        - a root whois server which refers the whole TLD to another server
+    When
+        - running whois-batch on a domain, and then on another domain of the same TLD
+    Then
+        - the referral server of the TLD is kept in the integration context
+        - the second domain is queried against the referral server only
+    """
+    whois_server.referral_field = 'refer'
+    mocker.patch.object(demisto, 'args', return_value={'query': 'first.com'})
+    mocker.patch.object(demisto, 'results')
+    Whois.whois_batch_command()
+    context = demisto.setIntegrationContext.call_args[0][0]
+    assert context['referral_servers'] == {'com': '127.0.0.2'}
+
+    whois_server.queries = []
+    demisto.getIntegrationContext.return_value = context
+    mocker.patch.object(demisto, 'args', return_value={'query': 'second.com'})
+    Whois.whois_batch_command()
+    assert whois_server.queries == [('127.0.0.2', 'second.com')]
+    entry = demisto.results.call_args[0][0][0]
+    assert entry['EntryContext'][Whois.outputPaths['domain']]['Whois']['ID'] == ['second.com-ID']
+
+
+def test_whois_batch_command_connection_failure(mocker):
+    """
+    Given
+        - a whois server which refuses connections
+    When
+        - running whois-batch
+    Then
+        - a failed entry is returned for the domain instead of exiting
+    """
+    mocker.patch.object(Whois, 'WHOIS_PORT', 1)
+    mocker.patch.object(Whois, 'get_root_server', return_value='127.0.0.1')
+    mocker.patch.object(demisto, 'getIntegrationContext', return_value={})
+    mocker.patch.object(demisto, 'setIntegrationContext')
+    mocker.patch.object(demisto, 'args', return_value={'query': 'domain.com'})
+    mocker.patch.object(demisto, 'results')
+    Whois.whois_batch_command()
+
+    entry = demisto.results.call_args[0][0][0]
+    assert "Couldn't connect with the socket-server" in entry['Contents']
+    assert entry['EntryContext'][Whois.outputPaths['domain']]['Whois']['QueryStatus'] == 'Failed'
+
+
+def test_get_root_server():
+    assert Whois.get_root_server('demisto.com') == 'whois.verisign-grs.com'
+    assert Whois.get_root_server('demisto.co.za') == Whois.tlds['co.za']['host']
+
+
+def load_raw_responses():
+    import glob
+    import io
+    return {path.split('/')[-1]: io.open(path, encoding='utf-8').read()
+            for path in sorted(glob.glob('./test_data/raw_responses/*.txt'))}
+
+
+def test_parse_raw_whois():
+    """
+    Given
+        - saved raw responses of a referral chain and of registries with their own formats
+    When
+        - parsing them
+    Then
+        - the grammar rules and the registry specific sections are extracted
+    """
+    raw_responses = load_raw_responses()
+    result = Whois.parse_raw_whois([raw_responses['registrar_com.txt'], raw_responses['verisign_com.txt']])
+    assert result['id'] == ['1785414_DOMAIN_COM-VRSN']
+    assert result['registrar'] == ['GoDaddy.com, LLC']
+    assert result['creation_date'][0].year == 2001
+    assert result['expiration_date'][0].year == 2025
+    assert 'ns-235.awsdns-29.com' in [ns.lower() for ns in result['nameservers']]
+    assert result['contacts']['registrant']['city'] == 'Scottsdale'
+
+    result = Whois.parse_raw_whois([raw_responses['nominet_uk.txt']])
+    assert result['registrar'] == ['Example Registrar Ltd [Tag = EXAMPLE]']
+    assert result['nameservers'] == ['ns1.example.net', 'ns2.example.net']
+    assert result['status'] == ['Registered until expiry date.']
+
+    result = Whois.parse_raw_whois([raw_responses['nic_it.txt']])
+    assert result['registrar'] == ['Example Provider S.p.A.']
+
+
+def test_parse_raw_whois_benchmark():
+    """
+    Given
+        - a corpus of saved raw responses
+    When
+        - parsing every response many times
+    Then
+        - the grammar is compiled once and the parsing stays fast
+    """
+    raw_responses = list(load_raw_responses().values())
+    Whois.parse_raw_whois(raw_responses[:1])
+    compiled_rules = Whois.grammar_rules[0][1]
+    start = time.time()
+    for _ in range(100):
+        for raw in raw_responses:
+            Whois.parse_raw_whois([raw])
+    duration = time.time() - start
+    assert Whois.grammar_rules[0][1] is compiled_rules
+    assert duration < 10
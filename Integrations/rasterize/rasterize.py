@@ -3,16 +3,21 @@ from CommonServerPython import *
 from CommonServerUserPython import *
 
 from selenium import webdriver
-from selenium.common.exceptions import NoSuchElementException, InvalidArgumentException
+from selenium.common.exceptions import NoSuchElementException, InvalidArgumentException, WebDriverException
 from PyPDF2 import PdfFileReader
 from pdf2image import convert_from_path
 import numpy as np
 from PIL import Image
 import tempfile
+import shutil
 from io import BytesIO
 import sys
 import base64
 import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from urllib.parse import urlparse
 
 PROXY = demisto.getParam('proxy')
 
@@ -29,6 +34,13 @@ URL_ERROR_MSG = "Can't access the URL. It might be malicious, or unreachable for
 EMPTY_RESPONSE_ERROR_MSG = "There is nothing to render. This can occur when there is a refused connection." \
                            " Please check your URL."
 DEFAULT_W, DEFAULT_H = '600', '800'
+# a page is considered loaded once no new resources were requested for NETWORK_IDLE_TIME seconds
+NETWORK_IDLE_TIME = 0.5
+DEFAULT_PAGE_READY_TIMEOUT = 10
+# drivers are restarted after this many captures, a long lived chrome keeps growing in memory
+DRIVER_MAX_USES = 20
+# init_driver swaps sys.stdout, so drivers of a pool are started one at a time
+DRIVER_INIT_LOCK = threading.Lock()
 
 
 def check_response(driver):
@@ -43,7 +55,7 @@ def init_driver(offline_mode=False):
     """
     demisto.debug(f'Creating chrome driver. Mode: {"OFFLINE" if offline_mode else "ONLINE"}')
     try:
-        with tempfile.TemporaryFile() as log:
+        with DRIVER_INIT_LOCK, tempfile.TemporaryFile() as log:
             sys.stdout = log  # type: ignore
             chrome_options = webdriver.ChromeOptions()
             chrome_options.add_argument('--no-sandbox')
@@ -68,7 +80,109 @@ def init_driver(offline_mode=False):
     return driver
 
 
-def rasterize(path: str, width: int, height: int, r_type: str = 'png', wait_time: int = 0, offline_mode: bool = False):
+class DriverPool:
+    """
+    Keeps up to `size` Chrome drivers per mode (online/offline) alive between captures.
+    A driver is health checked before it is handed out, and quit after DRIVER_MAX_USES captures.
+    """
+
+    def __init__(self, size: int = 1, max_uses: int = DRIVER_MAX_USES):
+        self.size = size
+        self.max_uses = max_uses
+        self._idle = {True: [], False: []}  # type: dict
+        self._uses = {}  # type: dict
+        self._semaphores = {True: threading.BoundedSemaphore(size), False: threading.BoundedSemaphore(size)}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def is_healthy(driver) -> bool:
+        try:
+            return driver.execute_script('return 1') == 1
+        except WebDriverException:
+            return False
+
+    def acquire(self, offline_mode: bool = False):
+        self._semaphores[offline_mode].acquire()
+        try:
+            while True:
+                with self._lock:
+                    driver = self._idle[offline_mode].pop() if self._idle[offline_mode] else None
+                if driver is None:
+                    driver = init_driver(offline_mode)
+                    self._uses[driver] = 0
+                    return driver
+                if self.is_healthy(driver):
+                    return driver
+                demisto.debug('Discarding an unresponsive chrome driver')
+                self._quit(driver)
+        except BaseException:
+            self._semaphores[offline_mode].release()
+            raise
+
+    def release(self, driver, offline_mode: bool = False):
+        self._uses[driver] += 1
+        if self._uses[driver] >= self.max_uses:
+            self._quit(driver)
+        else:
+            with self._lock:
+                self._idle[offline_mode].append(driver)
+        self._semaphores[offline_mode].release()
+
+    @contextmanager
+    def driver(self, offline_mode: bool = False):
+        driver = self.acquire(offline_mode)
+        try:
+            yield driver
+        finally:
+            self.release(driver, offline_mode)
+
+    def _quit(self, driver):
+        self._uses.pop(driver, None)
+        try:
+            driver.quit()
+        except WebDriverException as ex:
+            demisto.debug(f'Failed to quit chrome driver: {ex}')
+
+    def warm_up(self, offline_mode: bool = False):
+        """
+        Starts all the drivers of the pool up front
+        """
+        drivers = [self.acquire(offline_mode) for _ in range(self.size)]
+        for driver in drivers:
+            self._idle[offline_mode].append(driver)
+            self._semaphores[offline_mode].release()
+
+    def close(self):
+        with self._lock:
+            drivers = self._idle[True] + self._idle[False]
+            self._idle = {True: [], False: []}
+        for driver in drivers:
+            self._quit(driver)
+
+
+def wait_for_page_ready(driver, timeout: float):
+    """
+    Waits until the document is loaded and no new resources were requested for NETWORK_IDLE_TIME seconds,
+    or until the timeout passes
+    """
+    deadline = time.time() + timeout
+    resources_count = -1
+    idle_since = time.time()
+    while time.time() < deadline:
+        state, count = driver.execute_script(
+            "return [document.readyState, performance.getEntriesByType('resource').length]")
+        if count != resources_count:
+            resources_count = count
+            idle_since = time.time()
+        elif state == 'complete' and time.time() - idle_since >= NETWORK_IDLE_TIME:
+            return True
+        time.sleep(0.1)
+    demisto.debug(f'Page was not ready after {timeout} seconds, capturing it as is')
+    return False
+
+
+def rasterize(path: str, width: int, height: int, r_type: str = 'png', wait_time: int = 0, offline_mode: bool = False,
+              driver_pool: DriverPool = None):
     """
     Capturing a snapshot of a path (url/file), using Chrome Driver
     :param offline_mode: when set to True, will block any outgoing communication
@@ -76,28 +190,28 @@ def rasterize(path: str, width: int, height: int, r_type: str = 'png', wait_time
     :param width: desired snapshot width in pixels
     :param height: desired snapshot height in pixels
     :param r_type: result type: .png/.pdf
-    :param wait_time: time in seconds to wait before taking a screenshot
+    :param wait_time: max time in seconds to wait for the page to finish loading before taking a screenshot
+    :param driver_pool: pool to take the driver from, a single use driver is created when not given
     """
-    driver = init_driver(offline_mode)
-
+    pool = driver_pool or DriverPool()
     try:
-        demisto.debug(f'Navigating to path. Mode: {"OFFLINE" if offline_mode else "ONLINE"}')
+        with pool.driver(offline_mode) as driver:
+            demisto.debug(f'Navigating to path. Mode: {"OFFLINE" if offline_mode else "ONLINE"}')
 
-        driver.get(path)
-        driver.implicitly_wait(5)
-        if wait_time > 0 or DEFAULT_WAIT_TIME > 0:
-            time.sleep(wait_time or DEFAULT_WAIT_TIME)
+            driver.get(path)
+            driver.implicitly_wait(5)
+            wait_for_page_ready(driver, wait_time or DEFAULT_WAIT_TIME or DEFAULT_PAGE_READY_TIMEOUT)
 
-        check_response(driver)
+            check_response(driver)
 
-        demisto.debug('Navigating to path - COMPLETED')
+            demisto.debug('Navigating to path - COMPLETED')
 
-        if r_type.lower() == 'pdf':
-            output = get_pdf(driver, width, height)
-        else:
-            output = get_image(driver, width, height)
+            if r_type.lower() == 'pdf':
+                output = get_pdf(driver, width, height)
+            else:
+                output = get_image(driver, width, height)
 
-        return output
+            return output
 
     except (InvalidArgumentException, NoSuchElementException) as ex:
         if 'invalid argument' in str(ex):
@@ -105,6 +219,9 @@ def rasterize(path: str, width: int, height: int, r_type: str = 'png', wait_time
             return_error(err_msg) if WITH_ERRORS else return_warning(err_msg, exit=True)
         else:
             return_error(str(ex)) if WITH_ERRORS else return_warning(str(ex), exit=True)
+    finally:
+        if not driver_pool:
+            pool.close()
 
 
 def get_image(driver, width: int, height: int):
@@ -118,7 +235,6 @@ def get_image(driver, width: int, height: int):
     driver.set_window_size(width, height)
 
     image = driver.get_screenshot_as_png()
-    driver.quit()
 
     demisto.debug('Capturing screenshot - COMPLETED')
 
@@ -254,6 +370,65 @@ def rasterize_email_command():
     demisto.results(res)
 
 
+def get_batch_file_name(index, url, extension):
+    """
+    Builds a unique file name for a URL rendered by rasterize-batch, from its index and host
+    """
+    host = re.sub(r'[^\w.-]', '_', urlparse(url).netloc) or 'url'
+    return f'url_{index}_{host}.{extension}'
+
+
+def rasterize_batch_command():
+    urls = argToList(demisto.args().get('url'))
+    html_bodies = demisto.args().get('htmlBodies') or []
+    if isinstance(html_bodies, str):
+        html_bodies = json.loads(html_bodies) if html_bodies.startswith('[') else [html_bodies]
+    w = demisto.args().get('width', DEFAULT_W).rstrip('px')
+    h = demisto.args().get('height', DEFAULT_H).rstrip('px')
+    r_type = demisto.args().get('type', 'png')
+    wait_time = int(demisto.args().get('wait_time', 0))
+    offline = demisto.args().get('offline', 'false') == 'true'
+    max_browsers = int(demisto.args().get('max_browsers', 3))
+    extension = 'pdf' if r_type.lower() == 'pdf' else 'png'
+
+    targets = []
+    for i, url in enumerate(urls):
+        url = url if url.startswith('http') else f'http://{url}'
+        targets.append((url, get_batch_file_name(i, url, extension), False))
+    html_dir = tempfile.mkdtemp()
+    for i, html_body in enumerate(html_bodies):
+        html_path = os.path.join(html_dir, f'htmlBody_{i}.html')
+        with open(html_path, 'w') as f:
+            f.write(f'<html style="background:white";>{html_body}</html>')
+        targets.append((f'file://{html_path}', f'email_{i}.{extension}', offline))
+
+    pool = DriverPool(size=max(1, min(max_browsers, len(targets))))
+
+    def render(target):
+        path, filename, offline_mode = target
+        try:
+            return fileResult(filename=filename, data=rasterize(path=path, r_type=r_type, width=w, height=h,
+                                                                wait_time=wait_time, offline_mode=offline_mode,
+                                                                driver_pool=pool))
+        except SystemExit:
+            # the failure was already reported by rasterize, keep on with the other targets
+            return None
+
+    try:
+        if urls:
+            pool.warm_up()
+        with ThreadPoolExecutor(max_workers=pool.size) as executor:
+            results = [res for res in executor.map(render, targets) if res]
+    finally:
+        pool.close()
+        shutil.rmtree(html_dir, ignore_errors=True)
+
+    if r_type == 'png':
+        for res in results:
+            res['Type'] = entryTypes['image']
+    demisto.results(results)
+
+
 def rasterize_pdf_command():
     entry_id = demisto.args().get('EntryID')
     password = demisto.args().get('pdfPassword')
@@ -304,6 +479,9 @@ def main():
         elif demisto.command() == 'rasterize':
             rasterize_command()
 
+        elif demisto.command() == 'rasterize-batch':
+            rasterize_batch_command()
+
         else:
             return_error('Unrecognized command')
 
@@ -28,3 +28,143 @@ def test_rasterize_email_pdf_offline():
         path = os.path.realpath(f.name)
         f.flush()
         rasterize(path=f'file://{path}', width=250, height=250, r_type='pdf', offline_mode=True)
+
+
+class ChromeStandIn:
+    """
+    In-memory stand-in of a selenium Chrome driver
+    """
+    created = 0
+
+    def __init__(self, *args, **kwargs):
+        ChromeStandIn.created += 1
+        self.healthy = True
+        self.quit_called = False
+        self.page_source = '<html><body>page</body></html>'
+        self.resources = [0]
+
+    def execute_script(self, script):
+        if not self.healthy:
+            from selenium.common.exceptions import WebDriverException
+            raise WebDriverException('chrome not reachable')
+        if script == 'return 1':
+            return 1
+        # readyState and the resources count, the page keeps loading resources for a few polls
+        return ['complete', self.resources.pop(0) if len(self.resources) > 1 else self.resources[0]]
+
+    def get(self, path):
+        self.resources = [1, 2, 3, 3]
+
+    def implicitly_wait(self, seconds):
+        pass
+
+    def set_window_size(self, width, height):
+        pass
+
+    def get_screenshot_as_png(self):
+        return b'png'
+
+    def set_network_conditions(self, **kwargs):
+        pass
+
+    def quit(self):
+        self.quit_called = True
+
+
+def test_driver_pool_reuse_and_recycle(mocker):
+    """
+    Given
+        - a driver pool recycling drivers after 3 uses
+    When
+        - rasterizing several pages over the pool, one driver becoming unresponsive on the way
+    Then
+        - drivers are reused, recycled after 3 uses, and unresponsive drivers are replaced
+    """
+    mocker.patch.object(webdriver, 'Chrome', side_effect=ChromeStandIn)
+    mocker.patch('rasterize.NETWORK_IDLE_TIME', 0)
+    pool = DriverPool(size=1, max_uses=3)
+    ChromeStandIn.created = 0
+
+    for _ in range(3):
+        assert rasterize(path='http://demisto.com', width=250, height=250, driver_pool=pool) == b'png'
+    assert ChromeStandIn.created == 1
+    assert pool._idle[False] == []
+
+    assert rasterize(path='http://demisto.com', width=250, height=250, driver_pool=pool) == b'png'
+    assert ChromeStandIn.created == 2
+    driver = pool._idle[False][0]
+    driver.healthy = False
+    assert rasterize(path='http://demisto.com', width=250, height=250, driver_pool=pool) == b'png'
+    assert ChromeStandIn.created == 3
+    assert driver.quit_called
+
+    pool.close()
+    assert pool._idle[False] == []
+
+
+def test_wait_for_page_ready(mocker):
+    """
+    Given
+        - a page which keeps requesting resources
+    When
+        - waiting for it to be ready
+    Then
+        - the wait ends once the resources count is stable, or at the timeout
+    """
+    mocker.patch('rasterize.NETWORK_IDLE_TIME', 0.2)
+    driver = ChromeStandIn()
+    driver.get('http://demisto.com')
+    assert wait_for_page_ready(driver, timeout=5)
+    assert driver.resources == [3]
+
+    driver.execute_script = lambda script: ['loading', 1]
+    assert not wait_for_page_ready(driver, timeout=0.3)
+
+
+def test_rasterize_batch_command(mocker):
+    """
+    Given
+        - several URLs and email bodies
+    When
+        - running rasterize-batch with 2 browsers
+    Then
+        - every target is rendered over the 2 pooled browsers, which are quit at the end
+    """
+    drivers = []
+
+    def create_driver(*args, **kwargs):
+        drivers.append(ChromeStandIn())
+        return drivers[-1]
+
+    mocker.patch.object(webdriver, 'Chrome', side_effect=create_driver)
+    mocker.patch('rasterize.NETWORK_IDLE_TIME', 0)
+    mocker.patch.object(demisto, 'args', return_value={
+        'url': 'demisto.com,https://paloaltonetworks.com,example.com',
+        'htmlBodies': ['<b>first</b>', '<b>second</b>'],
+        'max_browsers': '2'
+    })
+    mocker.patch.object(demisto, 'results')
+    file_result = mocker.patch('rasterize.fileResult', side_effect=lambda filename, data: {'File': filename})
+    rasterize_batch_command()
+
+    results = demisto.results.call_args[0][0]
+    assert [res['File'] for res in results] == ['url_0_demisto.com.png', 'url_1_paloaltonetworks.com.png',
+                                                'url_2_example.com.png', 'email_0.png', 'email_1.png']
+    assert all(res['Type'] == entryTypes['image'] for res in results)
+    assert file_result.call_count == 5
+    assert len(drivers) == 2
+    assert all(driver.quit_called for driver in drivers)
+
+
+def test_get_batch_file_name():
+    """
+    Given
+        - URLs with a plain host, a port and credentials, and without a host
+    When
+        - building the file names of the rendered URLs
+    Then
+        - each name is unique by its index and holds the host, with characters unsafe for file names replaced
+    """
+    assert get_batch_file_name(0, 'https://demisto.com/path?q=1', 'png') == 'url_0_demisto.com.png'
+    assert get_batch_file_name(1, 'http://user@example.com:8080/', 'pdf') == 'url_1_user_example.com_8080.pdf'
+    assert get_batch_file_name(2, 'file:///tmp/page.html', 'png') == 'url_2_url.png'
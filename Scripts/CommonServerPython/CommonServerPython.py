@@ -9,8 +9,11 @@ import time
 import json
 import sys
 import os
+import io
 import re
 import base64
+import binascii
+import bisect
 import logging
 from collections import OrderedDict
 import xml.etree.cElementTree as ET
@@ -605,6 +608,8 @@ class IntegrationLogger(object):
         self.messages = []  # type: list
         self.write_buf = []  # type: list
         self.replace_strs = []  # type: list
+        self._replace_strs_set = set()  # type: set
+        self._replace_pattern = None
         self.buffering = True
         # if for some reason you don't want to auto add credentials.password to replace strings
         # set the os env COMMON_SERVER_NO_AUTO_REPLACE_STRS. Either in CommonServerUserPython, or docker env
@@ -622,7 +627,7 @@ class IntegrationLogger(object):
                                 pswrd = v.get('password')
                                 self.add_replace_strs(pswrd, b64_encode(pswrd))
 
-    def encode(self, message):
+    def _to_str(self, message):
         try:
             res = str(message)
         except UnicodeEncodeError as exception:
@@ -635,10 +640,60 @@ class IntegrationLogger(object):
                 res = message.encode('utf-8', 'replace')  # type: ignore
             else:
                 res = "Failed encoding message with error: {}".format(exception)
-        for s in self.replace_strs:
-            res = res.replace(s, '<XX_REPLACED>')
         return res
 
+    def encode(self, message):
+        res = self._to_str(message)
+        if self.replace_strs:
+            if self._replace_pattern is None:
+                self._replace_pattern = re.compile(self._build_replace_regex(self.replace_strs))
+            res = self._replace_pattern.sub('<XX_REPLACED>', res)
+        return res
+
+    @staticmethod
+    def _build_replace_regex(strs):
+        """
+        Builds a single regex matching all the given strings, factored by common prefixes (a trie), so a message
+        is scanned once no matter how many strings are replaced. Longer matches are preferred, so a string which
+        contains another sensitive string is replaced as a whole.
+
+        :type strs: ``list``
+        :param strs: The strings to match
+
+        :return: The regex
+        :rtype: ``str``
+        """
+        trie = {}  # type: dict
+        for s in strs:
+            node = trie
+            for char in s:
+                node = node.setdefault(char, {})
+            node[''] = True
+
+        def node_to_regex(node):
+            alternatives = []
+            for char in sorted(k for k in node if k):
+                child = node[char]
+                chain = re.escape(char)
+                # collapse the chars which have a single continuation, secrets such as keys may be long
+                while len(child) == 1 and '' not in child:
+                    next_char = next(iter(child))
+                    chain += re.escape(next_char)
+                    child = child[next_char]
+                if len(child) == 1:  # only the end of string marker
+                    alternatives.append(chain)
+                else:
+                    alternatives.append(chain + node_to_regex(child))
+            if not alternatives:
+                return ''
+            regex = alternatives[0] if len(alternatives) == 1 else '(?:{})'.format('|'.join(alternatives))
+            if '' in node:
+                # a string ends here, still prefer matching the longer strings first
+                regex = '(?:{})?'.format(regex)
+            return regex
+
+        return node_to_regex(trie)
+
     def __call__(self, message):
         text = self.encode(message)
         if self.buffering:
@@ -651,8 +706,13 @@ class IntegrationLogger(object):
             Add strings which will be replaced when logging.
             Meant for avoiding passwords and so forth in the log.
         '''
-        to_add = [self.encode(a) for a in args if a]
-        self.replace_strs.extend(to_add)
+        to_add = [self._to_str(a) for a in args if a]
+        to_add = [a for a in to_add if a not in self._replace_strs_set]
+        if to_add:
+            self.replace_strs.extend(to_add)
+            self._replace_strs_set.update(to_add)
+            # the replace pattern is rebuilt on the next logged message
+            self._replace_pattern = None
 
     def set_buffering(self, state):
         """
@@ -1366,6 +1426,61 @@ def xml2json(xmlstring, options={}, strip_ns=1, strip=1):
     return elem2json(elem, options, strip_ns=strip_ns, strip=strip)
 
 
+def xml2json_iter(xml_source, record_tag, strip_ns=1, strip=1):
+    """
+       Incrementally convert repeated records of an XML document into dictionaries.
+       The document is parsed with ``iterparse`` and every record is detached from the tree once converted,
+       so large XML exports can be processed with bounded memory.
+
+       >>> [r['id'] for r in xml2json_iter(b'<r><e><id>1</id></e><e><id>2</id></e></r>', 'e')]
+       ['1', '2']
+
+       :type xml_source: ``str`` or ``file``
+       :param xml_source: The XML string, or a file-like object opened for reading (required)
+
+       :type record_tag: ``str``
+       :param record_tag: The tag of the repeated element to yield, without namespace if strip_ns is set (required)
+
+       :type strip_ns: ``int``
+       :param strip_ns: Whether to strip the namespace from the tags
+
+       :type strip: ``int``
+       :param strip: Whether to strip leading and trailing whitespace from texts
+
+       :return: A generator of the converted records, in the same format elem_to_internal returns for a tag
+       :rtype: ``generator``
+    """
+    if hasattr(xml_source, 'read'):
+        source = xml_source
+    elif isinstance(xml_source, bytes):
+        source = io.BytesIO(xml_source)
+    else:
+        source = io.StringIO(xml_source)
+
+    stack = []  # type: list
+    open_records = 0
+    for event, elem in ET.iterparse(source, events=('start', 'end')):
+        tag = strip_tag(elem.tag) if strip_ns else elem.tag
+        if event == 'start':
+            stack.append(elem)
+            if tag == record_tag:
+                open_records += 1
+            continue
+
+        stack.pop()
+        if tag != record_tag:
+            continue
+        open_records -= 1
+        if open_records:
+            # nested record of the same tag, it is converted as part of its outer record
+            continue
+        yield elem_to_internal(elem, strip_ns=strip_ns, strip=strip)[tag]
+        # the record is always the last child of its parent when it ends, so detach it from the tree
+        elem.clear()
+        if stack:
+            del stack[-1][-1]
+
+
 def json2xml(json_data, factory=ET.Element):
     """Convert a JSON string into an XML string.
     Whatever Element implementation we could import will be used by
@@ -1464,6 +1579,95 @@ def is_ip_valid(s, accept_v6_ips=False):
         return True
 
 
+class IPRangeIndex(object):
+    """
+       Sorted interval index of IPv4 and IPv6 ranges, for matching many addresses against many ranges.
+       The ranges are parsed once and merged into disjoint intervals, so every address lookup is a binary search.
+
+       >>> index = IPRangeIndex(['10.0.0.0/8', '192.168.1.1', 'fd00::/8'])
+       >>> index.filter(['10.1.2.3', '172.16.0.1', 'fd00::1'])
+       ['10.1.2.3', 'fd00::1']
+
+       :type cidr_ranges: ``list``
+       :param cidr_ranges: The ranges in CIDR notation, a plain address is a range of a single address (required)
+
+       :raises ValueError: if one of the ranges is not a valid IPv4 or IPv6 CIDR
+    """
+    FAMILIES = ((socket.AF_INET, 32), (socket.AF_INET6, 128))
+
+    def __init__(self, cidr_ranges):
+        ranges = {family: [] for family, _ in self.FAMILIES}  # type: dict
+        for cidr in cidr_ranges:
+            address, _, prefix = cidr.strip().partition('/')
+            parsed = self.parse_address(address)
+            if not parsed:
+                raise ValueError('Invalid CIDR range: {}'.format(cidr))
+            family, number, bits = parsed
+            if not prefix:
+                prefix = str(bits)
+            if not prefix.isdigit() or int(prefix) > bits:
+                raise ValueError('Invalid CIDR range: {}'.format(cidr))
+            host_bits = bits - int(prefix)
+            start = number >> host_bits << host_bits
+            ranges[family].append((start, start + (1 << host_bits) - 1))
+
+        self._starts = {}  # type: dict
+        self._ends = {}  # type: dict
+        for family, intervals in ranges.items():
+            starts = []  # type: list
+            ends = []  # type: list
+            for start, end in sorted(intervals):
+                if ends and start <= ends[-1] + 1:
+                    ends[-1] = max(ends[-1], end)
+                else:
+                    starts.append(start)
+                    ends.append(end)
+            self._starts[family] = starts
+            self._ends[family] = ends
+
+    @classmethod
+    def parse_address(cls, address):
+        """
+           Parses an IPv4 or IPv6 address into its family, its integer value and its number of bits.
+
+           :type address: ``str``
+           :param address: The address to parse (required)
+
+           :return: The family, the value and the bits of the address, or None if it is not a valid address
+           :rtype: ``tuple``
+        """
+        for family, bits in cls.FAMILIES:
+            try:
+                return family, int(binascii.hexlify(socket.inet_pton(family, address.strip())), 16), bits
+            except (socket.error, ValueError, UnicodeError):
+                continue
+        return None
+
+    def __contains__(self, address):
+        parsed = self.parse_address(address)
+        if not parsed:
+            return False
+        family, number, _ = parsed
+        index = bisect.bisect_right(self._starts[family], number) - 1
+        return index >= 0 and number <= self._ends[family][index]
+
+    def filter(self, addresses, contained=True):
+        """
+           Filters a list of addresses by whether they are contained in the ranges.
+           Invalid addresses are considered as not contained in any range.
+
+           :type addresses: ``list``
+           :param addresses: The addresses to filter (required)
+
+           :type contained: ``bool``
+           :param contained: Whether to keep the addresses which are contained in the ranges, or the ones which are not
+
+           :return: The matching addresses, in their original order
+           :rtype: ``list``
+        """
+        return [address for address in addresses if (address in self) == contained]
+
+
 def return_outputs(readable_output, outputs=None, raw_response=None):
     """
     This function wraps the demisto.results(), makes the usage of returning results to the user more intuitively.
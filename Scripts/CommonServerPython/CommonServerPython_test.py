@@ -51,6 +51,28 @@ def test_xml():
     assert xmlActual == xml, "expected:\n{}\nto equal:\n{}".format(xml, xmlActual)
 
 
+def test_xml2json_iter():
+    from CommonServerPython import xml2json_iter
+    from io import BytesIO
+
+    xml = b'<report xmlns="urn:test"><host name="a"><item><port>22</port></item></host>' \
+          b'<meta>x</meta><host name="b"><host>nested</host></host></report>'
+    expected = [
+        {'@name': 'a', 'item': {'port': '22'}},
+        {'@name': 'b', 'host': 'nested'}
+    ]
+
+    assert [json.loads(json.dumps(r)) for r in xml2json_iter(xml, 'host')] == expected
+    assert [json.loads(json.dumps(r)) for r in xml2json_iter(BytesIO(xml), 'host')] == expected
+    assert list(xml2json_iter(xml, 'missing')) == []
+
+    # records match the conversion done by xml2json for the same elements
+    employees = json.loads(xml2json(b"<work><employee><id>100</id></employee><employee><id>200</id></employee></work>"))
+    streamed = xml2json_iter(b"<work><employee><id>100</id></employee><employee><id>200</id></employee></work>",
+                             'employee')
+    assert [json.loads(json.dumps(r)) for r in streamed] == employees['work']['employee']
+
+
 def toEntry(table):
     return {
 
@@ -578,6 +600,46 @@ def test_logger_replace_strs(mocker):
     assert ilog.messages[0] == '<XX_REPLACED> is <XX_REPLACED> and b64: <XX_REPLACED>'
 
 
+def test_logger_replace_strs_overlapping(mocker):
+    mocker.patch.object(demisto, 'params', return_value={})
+    ilog = IntegrationLogger()
+    ilog.add_replace_strs('pass', 'password', 'a.b')
+    ilog.add_replace_strs('pass')  # already added strings are ignored
+    assert ilog.replace_strs == ['pass', 'password', 'a.b']
+    ilog('password pass a.b axb')
+    assert ilog.messages[0] == '<XX_REPLACED> <XX_REPLACED> <XX_REPLACED> axb'
+
+
+@pytest.mark.parametrize('secrets_count', [10, 100, 1000])
+def test_logger_replace_strs_pattern_reuse(mocker, secrets_count):
+    """
+    Given:
+        - A logger with 10, 100 and 1000 sensitive strings
+    When:
+        - Logging several messages, and adding another sensitive string
+    Then:
+        - Every message is redacted with a single pattern, compiled once per added strings and reused by the messages
+    """
+    mocker.patch.object(demisto, 'params', return_value={})
+    ilog = IntegrationLogger()
+    secrets = ['secret_{}_value'.format(i) for i in range(secrets_count)]
+    for secret in secrets:
+        ilog.add_replace_strs(secret, b64_encode(secret))
+    message = 'fetched 50 incidents from the server using the key {} and the token {}. '
+    ilog(message.format(secrets[0], b64_encode(secrets[-1])))
+    pattern = ilog._replace_pattern
+    for i in range(1, 50):
+        ilog(message.format(secrets[i % secrets_count], b64_encode(secrets[-1])) * 10)
+    assert ilog._replace_pattern is pattern
+    assert len(ilog.messages) == 50
+    assert all('secret_' not in m for m in ilog.messages)
+
+    ilog.add_replace_strs('another_value')
+    ilog('another_value and {}'.format(secrets[-1]))
+    assert ilog._replace_pattern is not pattern
+    assert ilog.messages[-1] == '<XX_REPLACED> and <XX_REPLACED>'
+
+
 def test_is_mac_address():
     from CommonServerPython import is_mac_address
 
@@ -588,6 +650,78 @@ def test_is_mac_address():
     assert (is_mac_address(mac_address_true))
 
 
+def test_ip_range_index():
+    from CommonServerPython import IPRangeIndex
+
+    index = IPRangeIndex(['10.0.0.0/8', '10.1.0.0/16', '192.168.1.1', ' 172.16.5.4/12', '2001:db8::/32'])
+    assert '10.255.255.255' in index
+    assert '172.31.0.1' in index
+    assert '192.168.1.1' in index
+    assert '2001:db8:1::5' in index
+    assert '11.0.0.0' not in index
+    assert '192.168.1.2' not in index
+    assert '2001:db9::' not in index
+    assert '::ffff:10.0.0.1' not in index
+    assert 'not an ip' not in index
+    assert index.filter(['8.8.8.8', '10.0.0.1', 'fe80::1', '2001:db8::1']) == ['10.0.0.1', '2001:db8::1']
+    assert index.filter(['8.8.8.8', '10.0.0.1', 'fe80::1', '2001:db8::1'], contained=False) == ['8.8.8.8', 'fe80::1']
+    assert '1.2.3.4' in IPRangeIndex(['0.0.0.0/0'])
+    assert '1.2.3.4' not in IPRangeIndex([])
+
+    for cidr in ['10.0.0.0/33', '10.0.0/8', '10.0.0.0/a', '2001:db8::/129', 'test']:
+        with raises(ValueError):
+            IPRangeIndex([cidr])
+
+
+def test_ip_range_index_random_ranges():
+    """
+    Given:
+        - Random overlapping IPv4 and IPv6 ranges
+    When:
+        - Indexing them and matching random addresses against them
+    Then:
+        - The ranges are merged into sorted disjoint intervals per family
+        - The addresses are matched as a linear scan over the ranges does
+    """
+    import random
+    from CommonServerPython import IPRangeIndex
+
+    rand = random.Random(1)
+    ranges = []
+    for _ in range(250):
+        ranges.append('{}.{}.0.0/{}'.format(rand.randint(1, 8), rand.randint(0, 255), rand.randint(8, 24)))
+        ranges.append('2001:db8:{:x}::/{}'.format(rand.randint(0, 0xff), rand.randint(24, 40)))
+    addresses = []
+    for _ in range(1000):
+        addresses.append('{}.{}.{}.{}'.format(rand.randint(1, 16), rand.randint(0, 255), rand.randint(0, 255),
+                                              rand.randint(0, 255)))
+        addresses.append('2001:db{:x}:{:x}::{:x}'.format(rand.randint(7, 8), rand.randint(0, 0x1ff),
+                                                         rand.randint(0, 0xffff)))
+
+    index = IPRangeIndex(ranges)
+    contained = index.filter(addresses)
+
+    for family, _ in IPRangeIndex.FAMILIES:
+        starts, ends = index._starts[family], index._ends[family]
+        assert 0 < len(starts) < 250
+        assert all(start <= end for start, end in zip(starts, ends))
+        assert all(end + 1 < next_start for end, next_start in zip(ends, starts[1:]))
+
+    parsed_ranges = []
+    for cidr in ranges:
+        network, prefix = cidr.split('/')
+        family, number, bits = IPRangeIndex.parse_address(network)
+        parsed_ranges.append((family, number >> (bits - int(prefix)), bits - int(prefix)))
+
+    def linear_scan(address):
+        family, number, _ = IPRangeIndex.parse_address(address)
+        return any(family == network_family and number >> host_bits == network_prefix
+                   for network_family, network_prefix, host_bits in parsed_ranges)
+
+    assert [address for address in addresses if linear_scan(address)] == contained
+    assert 0 < len(contained) < len(addresses)
+
+
 def test_return_error_command(mocker):
     from CommonServerPython import return_error
     err_msg = "Testing unicode Ё"
@@ -5,8 +5,10 @@ import pickle
 from HTMLParser import HTMLParser
 from io import BytesIO, StringIO
 import base64
+import zlib
 
 import demisto_ml
+import numpy as np
 import pandas as pd
 
 DBOT_TEXT_FIELD = 'dbot_text'
@@ -19,6 +21,11 @@ HTML_PATTERNS = [
     re.compile(r"&nbsp;"),
     re.compile(r" +")
 ]
+# MinHash near duplicates detection parameters
+MINHASH_PERMUTATIONS = 128
+MINHASH_SHINGLE_SIZE = 3
+MINHASH_PRIME = (1 << 31) - 1
+MINHASH_CANDIDATE_PROBABILITY = 0.99
 
 # define global parsers
 html_parser = HTMLParser()
@@ -144,8 +151,64 @@ def remove_short_text(data, text_field, remove_short_threshold):
     return data, description
 
 
+def find_exact_duplicate_indices(texts):
+    seen_texts = set()
+    duplicate_indices = []
+    for i, text in enumerate(texts):
+        if text in seen_texts:
+            duplicate_indices.append(i)
+        else:
+            seen_texts.add(text)
+    return duplicate_indices
+
+
+def get_minhash_bands(threshold, num_perm=MINHASH_PERMUTATIONS):
+    # the fewest LSH bands for which texts as similar as the threshold are almost surely compared
+    for bands in [b for b in range(1, num_perm + 1) if num_perm % b == 0]:
+        rows = num_perm // bands
+        if 1 - (1 - threshold ** rows) ** bands >= MINHASH_CANDIDATE_PROBABILITY:
+            return bands
+    return num_perm
+
+
+def minhash_signature(text, a, b):
+    words = text.split(" ")
+    shingles = set(" ".join(words[i:i + MINHASH_SHINGLE_SIZE])
+                   for i in range(max(1, len(words) - MINHASH_SHINGLE_SIZE + 1)))
+    hashes = np.array([zlib.crc32(shingle.encode('utf-8') if isinstance(shingle, unicode) else shingle) & MINHASH_PRIME
+                       for shingle in shingles], dtype=np.int64)
+    return ((np.outer(a, hashes) + b[:, None]) % MINHASH_PRIME).min(axis=1)
+
+
+def find_near_duplicate_indices(texts, threshold, num_perm=MINHASH_PERMUTATIONS, seed=1):
+    random_state = np.random.RandomState(seed)
+    a = random_state.randint(1, MINHASH_PRIME, size=num_perm).astype(np.int64)
+    b = random_state.randint(0, MINHASH_PRIME, size=num_perm).astype(np.int64)
+    bands = get_minhash_bands(threshold, num_perm)
+    rows = num_perm // bands
+
+    buckets = [dict() for _ in range(bands)]  # type: List[Dict[bytes, List[int]]]
+    signatures = {}  # type: Dict[int, np.ndarray]
+    duplicate_indices = []
+    for i, text in enumerate(texts):
+        signature = minhash_signature(text, a, b)
+        band_keys = [signature[band * rows:(band + 1) * rows].tobytes() for band in range(bands)]
+        candidates = set()
+        for band_buckets, key in zip(buckets, band_keys):
+            candidates.update(band_buckets.get(key, []))
+        # a text is a duplicate if its estimated jaccard similarity to a kept text passes the threshold
+        if any(np.mean(signatures[j] == signature) >= threshold for j in candidates):
+            duplicate_indices.append(i)
+            continue
+        signatures[i] = signature
+        for band_buckets, key in zip(buckets, band_keys):
+            band_buckets.setdefault(key, []).append(i)
+    return duplicate_indices
+
+
 def remove_duplicate_by_indices(data, duplicate_indices):
     description = ""
+    duplicate_indices = set(duplicate_indices)
     data = [x for i, x in enumerate(data) if i not in duplicate_indices]
     dropped_count = len(duplicate_indices)
     if dropped_count > 0:
@@ -160,6 +223,7 @@ def main():
     hash_seed = int(demisto.args().get('hashSeed')) if demisto.args().get('hashSeed') else None
     remove_short_threshold = int(demisto.args().get('removeShortTextThreshold', 1))
     de_dup_threshold = float(demisto.args()['dedupThreshold'])
+    de_dup_method = demisto.args().get('dedupMethod', 'pairwise')
     pre_process_type = demisto.args()['preProcessType']
     remove_html_tags = demisto.args()['cleanHTML'] == 'true'
     whitelist_fields = demisto.args().get('whitelistFields').split(",") if demisto.args().get(
@@ -186,9 +250,17 @@ def main():
     # remove duplicates
     try:
         if 0 < de_dup_threshold < 1:
-
-            duplicate_indices = demisto_ml.find_duplicate_indices(map(lambda x: x[DBOT_PROCESSED_TEXT_FIELD], data),
-                                                                  de_dup_threshold)
+            texts = map(lambda x: x[DBOT_PROCESSED_TEXT_FIELD], data)
+            # exact duplicates are found first, so only the unique texts are compared for similarity
+            duplicate_indices = find_exact_duplicate_indices(texts)
+            exact_duplicate_indices = set(duplicate_indices)
+            unique_indices = [i for i in range(len(texts)) if i not in exact_duplicate_indices]
+            unique_texts = [texts[i] for i in unique_indices]
+            if de_dup_method == 'minhash':
+                similar_indices = find_near_duplicate_indices(unique_texts, de_dup_threshold)
+            else:
+                similar_indices = demisto_ml.find_duplicate_indices(unique_texts, de_dup_threshold)
+            duplicate_indices += [unique_indices[i] for i in similar_indices]
             data, desc = remove_duplicate_by_indices(data, duplicate_indices)
             description += desc
     except Exception:
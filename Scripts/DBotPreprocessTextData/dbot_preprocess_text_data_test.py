@@ -4,7 +4,8 @@ import pandas as pd
 
 from CommonServerPython import *
 from DBotPreprocessTextData import clean_html, remove_line_breaks, hash_word, read_file, \
-    concat_text_fields, whitelist_dict_fields, remove_short_text, remove_duplicate_by_indices, pre_process, main
+    concat_text_fields, whitelist_dict_fields, remove_short_text, remove_duplicate_by_indices, pre_process, main, \
+    find_exact_duplicate_indices, find_near_duplicate_indices
 
 
 def test_clean_html(mocker):
@@ -144,6 +145,28 @@ def test_remove_dups():
     assert len(data) == 2
 
 
+def test_find_exact_duplicate_indices():
+    texts = ['text1 text2', 'text3', 'text1 text2', 'text3', 'text1 text2', 'text4']
+    assert find_exact_duplicate_indices(texts) == [2, 3, 4]
+    data, desc = remove_duplicate_by_indices(texts, find_exact_duplicate_indices(texts))
+    assert data == ['text1 text2', 'text3', 'text4']
+    assert desc == "Dropped 3 samples duplicate to other samples\n"
+
+
+def test_find_near_duplicate_indices():
+    words = ['word%d' % i for i in range(50)]
+    texts = [
+        " ".join(words),
+        " ".join('other%d' % i for i in range(50)),
+        " ".join(words[:-1] + ['changed']),
+        " ".join(words[:25] + ['other%d' % i for i in range(25)]),
+        " ".join(words),
+    ]
+    assert find_near_duplicate_indices(texts, 0.8) == [2, 4]
+    assert find_near_duplicate_indices(texts, 0.99) == [4]
+    assert find_near_duplicate_indices([], 0.8) == []
+
+
 def test_pre_process():
     data = [
         {
@@ -28,3 +28,12 @@ def test_main(mocker):
     assert len(results) == 2
     assert results[0] == '172.16.0.1'
     assert results[1] == '4.2.2.2'
+
+    # IPv6 addresses and ranges
+    mocker.patch.object(demisto, 'args', return_value={
+        'value': ['fd00::1', '2001:db8::5', '10.0.0.5'],
+        'cidr_ranges': ['fc00::/7', '10.0.0.0/8']
+    })
+    mocker.patch.object(demisto, 'results')
+    main()
+    assert demisto.results.call_args[0][0] == ['2001:db8::5']
@@ -14,3 +14,8 @@ def test_main(mocker):
     cidr_ranges = '10.0.0.0/8,192.168.0.0/16'
     results = main(value, cidr_ranges)
     assert results is True
+
+    value = '2001:db8::1,8.8.8.8'
+    cidr_ranges = '10.0.0.0/8,2001:db8::/32'
+    results = main(value, cidr_ranges)
+    assert results is True
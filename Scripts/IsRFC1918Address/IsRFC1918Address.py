@@ -1,13 +1,13 @@
 import demistomock as demisto
+from CommonServerPython import *
 
+RFC1918_RANGES = IPRangeIndex(['10.0.0.0/8', '172.16.0.0/12', '192.168.0.0/16'])
 
-def main():
-    ADDRESS = demisto.args()['value']
-    RANGES = '10.0.0.0/8,172.16.0.0/12,192.168.0.0/16'
 
-    res = demisto.executeCommand('IsInCidrRanges', {'value': ADDRESS, 'cidr_ranges': RANGES})[0]
+def main():
+    ADDRESS_LIST = argToList(demisto.args()['value'])
 
-    demisto.results(res['Contents'])
+    demisto.results(any(addr in RFC1918_RANGES for addr in ADDRESS_LIST))
 
 
 if __name__ == "__builtin__" or __name__ == "builtins":
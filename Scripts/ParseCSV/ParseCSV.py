@@ -1,4 +1,5 @@
 import csv
+from itertools import islice
 
 from CommonServerPython import *
 
@@ -16,36 +17,17 @@ def remove_non_printable_chars(s):
     return s.replace(u'\ufeff', '').replace(u'\u200f', '')
 
 
-def unicode_dict_reader(csv_data, **kwargs):
+def unicode_dict_rows(csv_data, **kwargs):
     """
-    reads from csv file each row and converts to array of dictionaries.
+    reads from csv file each row and converts it to a dictionary, one row at a time.
     in case there are extra fields in a row and they have no column, then we will create NO_NAME_COLUMN_{NUMBER}
 
-    CSV Example:
-    aaa,bbb
-    1,2
-    3,4,5
-
-    ===>
-
-    [
-        {
-            "aaa": 1,
-            "bbb": 2,
-            "NO_NAME_COLUMN_3": ""
-        },
-        {
-            "aaa": 3,
-            "bbb": 4,
-            "NO_NAME_COLUMN_3": 5       <-- extra field/column
-        }
-    ]
+    yields the row dictionary and the number of NO_NAME_COLUMN_{NUMBER} columns created for it
     """
     csv_reader = csv.DictReader((line.replace('\0', '') for line in csv_data), **kwargs)
-    arr = []
-    no_name_columns_counter = 0
     for row in csv_reader:
         row_dict = {}
+        no_name_columns_counter = 0
 
         for key, value in row.iteritems():
             if key is None:
@@ -60,8 +42,7 @@ def unicode_dict_reader(csv_data, **kwargs):
                     row_dict[col_name] = unicode(val, codec_type)
                     counter += 1
 
-                if no_name_columns_counter < counter:
-                    no_name_columns_counter = counter
+                no_name_columns_counter = counter
 
             elif value is not None:
                 col_name = remove_non_printable_chars(unicode(key, codec_type))
@@ -70,20 +51,69 @@ def unicode_dict_reader(csv_data, **kwargs):
                 col_name = remove_non_printable_chars(unicode(key, codec_type))
                 row_dict[col_name] = None
 
-        arr.append(row_dict)
+        yield row_dict, no_name_columns_counter
+
+
+def unicode_dict_chunks(csv_data, chunk_size=None, limit=None, **kwargs):
+    """
+    reads from csv file the rows in chunks of chunk_size rows (all the rows in one chunk if not set),
+    up to limit rows (all the rows if not set), so only one chunk of the file is kept in memory.
+    each chunk is an array of dictionaries, in the format returned by unicode_dict_reader.
+    """
+    chunk = []  # type: list
+    no_name_columns_counter = 0
+    for row_dict, no_name_columns in islice(unicode_dict_rows(csv_data, **kwargs), limit):
+        chunk.append(row_dict)
+        no_name_columns_counter = max(no_name_columns_counter, no_name_columns)
+        if len(chunk) == chunk_size:
+            yield add_no_name_columns(chunk, no_name_columns_counter)
+            chunk = []
+            no_name_columns_counter = 0
+
+    if chunk:
+        yield add_no_name_columns(chunk, no_name_columns_counter)
 
+
+def add_no_name_columns(arr, no_name_columns_counter):
+    """
+    adding NO_NAME_COLUMN_{} to the first dict in the array
+    so that later in tableToMarkdown it will print all the columns
+    """
     if no_name_columns_counter > 0:
-        """
-        adding NO_NAME_COLUMN_{} to the first dict in the array
-        so that later in tableToMarkdown it will print all the columns
-        """
         first_row = arr[0]
         for counter in range(no_name_columns_counter):
             first_row['NO_NAME_COLUMN_{}'.format(counter)] = ""
-
     return arr
 
 
+def unicode_dict_reader(csv_data, **kwargs):
+    """
+    reads from csv file each row and converts to array of dictionaries.
+    in case there are extra fields in a row and they have no column, then we will create NO_NAME_COLUMN_{NUMBER}
+
+    CSV Example:
+    aaa,bbb
+    1,2
+    3,4,5
+
+    ===>
+
+    [
+        {
+            "aaa": 1,
+            "bbb": 2,
+            "NO_NAME_COLUMN_3": ""
+        },
+        {
+            "aaa": 3,
+            "bbb": 4,
+            "NO_NAME_COLUMN_3": 5       <-- extra field/column
+        }
+    ]
+    """
+    return next(unicode_dict_chunks(csv_data, **kwargs), [])
+
+
 def get_entry_by_file_name(file_name):
     entries = demisto.executeCommand('getEntries', {})
     for entry in reversed(entries):
@@ -101,6 +131,8 @@ csv_entry = None
 ip_count = 0
 domain_count = 0
 hash_count = 0
+# The number of rows returned in each entry, so the memory used doesn't depend on the size of the file
+ROWS_PER_ENTRY = 10000
 
 
 def is_one_dimension_list(all_csv):
@@ -115,10 +147,98 @@ def is_one_dimension_list(all_csv):
     return all(isinstance(entry, STRING_TYPES) for entry in all_csv) or not all_csv
 
 
+def return_parsed_csv(file_name, all_csv):
+    """ Returns parsed csv rows to the war room and to the context
+
+    Args:
+        file_name (str): name of the csv file
+        all_csv (list): the parsed rows
+    """
+    output = {
+        'ParseCSV.ParsedCSV': all_csv
+    }
+    if is_one_dimension_list(all_csv):
+        human_readable = tableToMarkdown(file_name, all_csv, headers=["CSV list"])
+    else:
+        human_readable = tableToMarkdown(file_name, all_csv)
+    demisto.results({
+        "Type": entryTypes["note"],
+        "ContentsFormat": formats["json"],
+        "ReadableContentsFormat": formats["markdown"],
+        "Contents": all_csv,
+        "EntryContext": output,
+        "HumanReadable": human_readable
+    })
+
+
+def get_context_list(context, key):
+    """ Gets the values of a key in the context as a set
+
+    Args:
+        context (dict): the investigation context
+        key (str): the key to get
+
+    Returns:
+        set: the values of the key, or an empty set if it doesn't exist
+    """
+    value = demisto.get(context, key)
+    return set(list(value)) if value else set()
+
+
+def return_parsed_indicators(md_header, content, md, ip_list, domain_list, hash_list, known_indicators):
+    """ Returns a chunk of parsed rows to the war room, and the indicators found in it which are not known yet
+    to the context
+
+    Args:
+        md_header (str): header of the markdown table of the parsed rows
+        content (list): the parsed rows as csv lines
+        md (list): the parsed rows as markdown table lines
+        ip_list (list): the IPs found in the rows
+        domain_list (list): the domains found in the rows
+        hash_list (list): the hashes found in the rows
+        known_indicators (dict): the IPs, domains and hashes which are known to the context, updated with the
+            indicators returned
+    """
+    context = {}  # type: dict
+    if ip_list:
+        ip_list = set(ip_list) - known_indicators['ips']
+        known_indicators['ips'].update(ip_list)
+        if len(ip_list) > 0:
+            context["IP"] = []
+            for ip in ip_list:
+                context["IP"].append({"Address": ip})
+
+    if domain_list:
+        domain_list = set(domain_list) - known_indicators['domains']
+        known_indicators['domains'].update(domain_list)
+        if len(domain_list) > 0:
+            context["Domain"] = []
+            for domain in domain_list:
+                context["Domain"].append({"Name": domain})
+
+    if hash_list:
+        hash_list = set(hash_list) - known_indicators['hashes']
+        known_indicators['hashes'].update(hash_list)
+        if len(hash_list) > 0:
+            context["File"] = []
+            for hash_string in hash_list:
+                if len(hash_string) == 32:
+                    context["File"].append({"MD5": hash_string})
+                if len(hash_string) == 64:
+                    context["File"].append({"SHA256": hash_string})
+                if len(hash_string) == 40:
+                    context["File"].append({"SHA1": hash_string})
+
+    demisto.results({
+        "Type": entryTypes["note"],
+        "ContentsFormat": formats["text"],
+        "Contents": ''.join(content),
+        "HumanReadable": md_header + ''.join(md),
+        "EntryContext": context
+    })
+
+
 def main():
-    ip_list = []
-    domain_list = []
-    hash_list = []
     d_args = demisto.args()
 
     entry_id = d_args['entryID'] if 'entryID' in d_args else None
@@ -127,6 +247,10 @@ def main():
     parse_domain = int(d_args['domains']) if 'domains' in d_args else -1
     parse_hash = int(d_args['hashes']) if 'hashes' in d_args else -1
     parse_all = True if d_args['parseAll'] == 'yes' else False
+    limit = int(d_args['limit']) if d_args.get('limit') else None
+
+    if limit is not None and limit < 1:
+        return_error('The limit argument must be a positive number.')
 
     if parse_ip == -1 and parse_domain == -1 and parse_hash == -1 and not parse_all:
         return_error('Select a field to extract or set parseAll=yes to parse the whole CSV file')
@@ -154,39 +278,31 @@ def main():
                 file_name))
 
     if parse_all:
-        all_csv = []
         with open(file_path) as f:
-            records = unicode_dict_reader(f)
-            # `records` is a list contains CSV rows (without headers)
-            # so if it doesn't exists - it can be empty or one-lined CSV
-            if records:
-                for row in records:
-                    all_csv.append(row)
-            else:  # Can be one-line csv
+            # the chunks contain the CSV rows (without headers)
+            # so if there are none - it can be empty or one-lined CSV
+            has_records = False
+            for records in unicode_dict_chunks(f, ROWS_PER_ENTRY, limit):
+                has_records = True
+                return_parsed_csv(file_name, records)
+
+            if not has_records:  # Can be one-line csv
                 f.seek(0)
                 line = f.read()
-                all_csv = line.split(',')
-
-        output = {
-            'ParseCSV.ParsedCSV': all_csv
-        }
-        if is_one_dimension_list(all_csv):
-            human_readable = tableToMarkdown(file_name, all_csv, headers=["CSV list"])
-        else:
-            human_readable = tableToMarkdown(file_name, all_csv)
-        demisto.results({
-            "Type": entryTypes["note"],
-            "ContentsFormat": formats["json"],
-            "ReadableContentsFormat": formats["markdown"],
-            "Contents": all_csv,
-            "EntryContext": output,
-            "HumanReadable": human_readable
-        })
+                return_parsed_csv(file_name, line.split(','))
 
     elif not (parse_ip == -1 and parse_domain == -1 and parse_hash == -1):
         # if need to parse ips/domains/hashes, keep the script running
-        if sum(1 for line in open(file_path)) <= 1:  # checks if there are less than one line
-            return_error('No data to parse. CSV file might be empty or one-lined. try the `ParseAll=yes` argument.')
+        with open(file_path) as f:
+            if sum(1 for line in islice(f, 2)) <= 1:  # checks if there are less than one line
+                return_error('No data to parse. CSV file might be empty or one-lined. try the `ParseAll=yes` argument.')
+
+        context = demisto.context()
+        known_indicators = {
+            'ips': get_context_list(context, 'ips'),
+            'domains': get_context_list(context, 'domains'),
+            'hashes': get_context_list(context, 'hashes')
+        }
 
         with open(file_path, 'rU') as f:
             has_header = csv.Sniffer().has_header(f.read(1024))
@@ -195,75 +311,44 @@ def main():
 
             if has_header:
                 next(csv_data)
+            csv_data = islice(csv_data, limit)
 
-            md = '### Parsed Data Table\n' + ('IPs |' if 'ips' in d_args else '') + (
+            md_header = '### Parsed Data Table\n' + ('IPs |' if 'ips' in d_args else '') + (
                 'Domains |' if 'domains' in d_args else '') + ('Hashes |' if 'hashes' in d_args else '') + '\n'
-            md += ('- |' if 'ips' in d_args else '') + ('- |' if 'domains' in d_args else '') + (
+            md_header += ('- |' if 'ips' in d_args else '') + ('- |' if 'domains' in d_args else '') + (
                 '- |' if 'hashes' in d_args else '') + '\n'
-            content = ''
-
-            for row in csv_data:
-                content += ','.join(row) + '\n'
-                if parse_ip != -1:
-                    md += (row[parse_ip] + '|' if row[parse_ip] else ' |')
-                    is_ip = re.search(r'([0-9]{1,3}\.){3}[0-9]{1,3}', row[parse_ip])
-                    is_valid = is_ip_valid(row[parse_ip])
-                    if is_ip and is_valid:
-                        ip_list.append(row[parse_ip])
-
-                if parse_domain != -1:
-                    md += (row[parse_domain] + '|' if row[parse_domain] else ' |')
-                    has_dot = '.' in row[parse_domain]
-                    no_spaces = ' ' not in row[parse_domain]
-                    if has_dot and no_spaces:
-                        domain_list.append(row[parse_domain])
-
-                if parse_hash != -1:
-                    md += (row[parse_hash] + '|' if row[parse_hash] else ' |')
-                    is_hash = re.search(r'[0-9A-Fa-f]{32,128}', row[parse_hash])
-                    if is_hash:
-                        hash_list.append(row[parse_hash])
-                md += '\n'
-
-        context = {}  # type: dict
-        if ip_list:
-            old_ip_list = list(demisto.get(demisto.context(), 'ips')) if demisto.get(demisto.context(), 'ips') else []
-            ip_list = list(set(ip_list) - set(old_ip_list))
-            if len(ip_list) > 0:
-                context["IP"] = []
-                for ip in ip_list:
-                    context["IP"].append({"Address": ip})
-
-        if domain_list:
-            old_domain_list = list(demisto.get(demisto.context(), 'domains')) if demisto.get(demisto.context(),
-                                                                                             'domains') else []
-            domain_list = list(set(domain_list) - set(old_domain_list))
-            if len(domain_list) > 0:
-                context["Domain"] = []
-                for domain in domain_list:
-                    context["Domain"].append({"Name": domain})
-
-        if hash_list:
-            old_hash_list = list(demisto.get(demisto.context(), 'hashes')) if demisto.get(demisto.context(),
-                                                                                          'hashes') else []
-            hash_list = list(set(hash_list) - set(old_hash_list))
-            if len(hash_list) > 0:
-                context["File"] = []
-                for hash_string in hash_list:
-                    if len(hash_string) == 32:
-                        context["File"].append({"MD5": hash_string})
-                    if len(hash_string) == 64:
-                        context["File"].append({"SHA256": hash_string})
-                    if len(hash_string) == 40:
-                        context["File"].append({"SHA1": hash_string})
-
-        demisto.results({
-            "Type": entryTypes["note"],
-            "ContentsFormat": formats["text"],
-            "Contents": content,
-            "HumanReadable": md,
-            "EntryContext": context
-        })
+
+            for rows in iter(lambda: list(islice(csv_data, ROWS_PER_ENTRY)), []):
+                content = []
+                md = []
+                ip_list = []
+                domain_list = []
+                hash_list = []
+
+                for row in rows:
+                    content.append(','.join(row) + '\n')
+                    if parse_ip != -1:
+                        md.append(row[parse_ip] + '|' if row[parse_ip] else ' |')
+                        is_ip = re.search(r'([0-9]{1,3}\.){3}[0-9]{1,3}', row[parse_ip])
+                        is_valid = is_ip_valid(row[parse_ip])
+                        if is_ip and is_valid:
+                            ip_list.append(row[parse_ip])
+
+                    if parse_domain != -1:
+                        md.append(row[parse_domain] + '|' if row[parse_domain] else ' |')
+                        has_dot = '.' in row[parse_domain]
+                        no_spaces = ' ' not in row[parse_domain]
+                        if has_dot and no_spaces:
+                            domain_list.append(row[parse_domain])
+
+                    if parse_hash != -1:
+                        md.append(row[parse_hash] + '|' if row[parse_hash] else ' |')
+                        is_hash = re.search(r'[0-9A-Fa-f]{32,128}', row[parse_hash])
+                        if is_hash:
+                            hash_list.append(row[parse_hash])
+                    md.append('\n')
+
+                return_parsed_indicators(md_header, content, md, ip_list, domain_list, hash_list, known_indicators)
 
 
 if __name__ in ('__builtin__', 'builtins'):
@@ -120,3 +120,69 @@ class TestParseCSV:
         main()
         result = self.get_demisto_results()
         assert result == expeced
+
+    def test_main_parse_all_in_chunks(self, mocker, tmpdir):
+        """
+        Given
+            - a csv file with more rows than returned in one entry
+        When
+            - parsing all of the file, and then parsing it with a limit
+        Then
+            - the rows are returned in several entries, up to the limit
+        """
+        import ParseCSV
+        csv_file = tmpdir.join("rows.csv")
+        csv_file.write("name,value\n" + "".join("row{},{}\n".format(i, i) for i in range(5)))
+        mocker.patch.object(ParseCSV, "ROWS_PER_ENTRY", 2)
+        self.mock_demisto(mocker, file_obj=self.create_file_object(str(csv_file)))
+        ParseCSV.main()
+        chunks = [call[0][0]["EntryContext"]["ParseCSV.ParsedCSV"] for call in demisto.results.call_args_list]
+        assert [[row["name"] for row in chunk] for chunk in chunks] == [["row0", "row1"], ["row2", "row3"], ["row4"]]
+
+        args = {"entryID": "entry_id", "parseAll": "yes", "codec": "utf-8", "limit": "3"}
+        self.mock_demisto(mocker, args_value=args, file_obj=self.create_file_object(str(csv_file)))
+        ParseCSV.main()
+        chunks = [call[0][0]["EntryContext"]["ParseCSV.ParsedCSV"] for call in demisto.results.call_args_list]
+        assert [[row["name"] for row in chunk] for chunk in chunks] == [["row0", "row1"], ["row2"]]
+
+    @pytest.mark.parametrize("limit", ["0", "-1"])
+    def test_main_invalid_limit(self, mocker, limit):
+        """
+        Given
+            - a limit which is not a positive number
+        When
+            - parsing a csv file
+        Then
+            - an error is returned instead of parsing the file
+        """
+        from ParseCSV import main
+        args = {"entryID": "entry_id", "parseAll": "yes", "codec": "utf-8", "limit": limit}
+        self.mock_demisto(mocker, args_value=args, file_obj=self.create_file_object("./TestData/simple.csv"))
+        with pytest.raises(SystemExit, match="0"):
+            main()
+        assert self.get_demisto_results()["Contents"] == "The limit argument must be a positive number."
+
+    def test_main_with_ips_in_chunks(self, mocker, tmpdir):
+        """
+        Given
+            - a csv file of IPs with more rows than returned in one entry, some of them repeating
+            - one of the IPs already in the context
+        When
+            - parsing the IPs column
+        Then
+            - every IP is added to the context once, in the entry of the first row it appears in
+        """
+        import ParseCSV
+        csv_file = tmpdir.join("ips.csv")
+        csv_file.write("host,ip\na,1.1.1.1\nb,2.2.2.2\nc,1.1.1.1\nd,3.3.3.3\ne,4.4.4.4\n")
+        mocker.patch.object(ParseCSV, "ROWS_PER_ENTRY", 2)
+        mocker.patch.object(demisto, "context", return_value={"ips": ["3.3.3.3"]})
+        args = {"entryID": "entry_id", "parseAll": "no", "codec": "utf-8", "ips": "1"}
+        self.mock_demisto(mocker, args_value=args, file_obj=self.create_file_object(str(csv_file)))
+        ParseCSV.main()
+        results = [call[0][0] for call in demisto.results.call_args_list]
+        assert [result["Contents"] for result in results] == ["a,1.1.1.1\nb,2.2.2.2\n", "c,1.1.1.1\nd,3.3.3.3\n",
+                                                              "e,4.4.4.4\n"]
+        assert sorted(ip["Address"] for ip in results[0]["EntryContext"]["IP"]) == ["1.1.1.1", "2.2.2.2"]
+        assert results[1]["EntryContext"] == {}
+        assert results[2]["EntryContext"] == {"IP": [{"Address": "4.4.4.4"}]}
@@ -43,6 +43,10 @@ reload(sys)
 sys.setdefaultencoding('utf8')  # pylint: disable=no-member
 
 MAX_DEPTH_CONST = 3
+# Attached emails bigger than this are spilled to a temporary file while they are parsed, smaller ones are parsed in memory
+MAX_IN_MEMORY_ATTACHMENT_SIZE = 10 * 1024 * 1024
+# The name of the last attachment found in the parsed file, set to the context once the whole file is parsed
+LAST_ATTACHMENT_NAME = None
 
 """
 https://github.com/vikramarsid/msg_parser
@@ -3093,6 +3097,7 @@ class MsOxMessage(object):
     """
 
     def __init__(self, msg_file_path):
+        # path of the msg file, or a file-like object of its content
         self.msg_file_path = msg_file_path
         self.include_attachment_data = False
 
@@ -3129,6 +3134,9 @@ class MsOxMessage(object):
         return self._message.get_attached_emails_hierarchy(max_depth)
 
     def is_valid_msg_file(self):
+        if hasattr(self.msg_file_path, 'read'):
+            return isOleFile(self.msg_file_path)
+
         if not os.path.exists(self.msg_file_path):
             return False
 
@@ -3295,24 +3303,30 @@ def save_attachments(attachments, root_email_file_name, max_depth):
             demisto.results(fileResult(display_name, attachment.data))
             name_lower = display_name.lower()
             if max_depth > 0 and (name_lower.endswith(".eml") or name_lower.endswith('.p7m')):
-                tf = tempfile.NamedTemporaryFile(delete=False)
+                inner_eml, attached_inner_emails = handle_eml(None, file_name=root_email_file_name,
+                                                              max_depth=max_depth, file_data=attachment.data)
+                if inner_eml:
+                    return_outputs(readable_output=data_to_md(inner_eml, attachment.DisplayName, root_email_file_name),
+                                   outputs=None)
+                    attached_emls.append(inner_eml)
+                if attached_inner_emails:
+                    attached_emls.extend(attached_inner_emails)
 
-                try:
-                    tf.write(attachment.data)
-                    tf.close()
+    return attached_emls
 
-                    inner_eml, attached_inner_emails = handle_eml(tf.name, file_name=root_email_file_name,
-                                                                  max_depth=max_depth)
-                    if inner_eml:
-                        return_outputs(readable_output=data_to_md(inner_eml, attachment.DisplayName, root_email_file_name),
-                                       outputs=None)
-                        attached_emls.append(inner_eml)
-                    if attached_inner_emails:
-                        attached_emls.extend(attached_inner_emails)
-                finally:
-                    os.remove(tf.name)
 
-    return attached_emls
+def spool_attachment(data):
+    """
+    Creates a file-like object of an attachment content, which is kept in memory unless it is bigger than
+    MAX_IN_MEMORY_ATTACHMENT_SIZE.
+
+    :param data: the attachment content
+    :return: the file-like object, positioned at its start
+    """
+    attachment_file = tempfile.SpooledTemporaryFile(max_size=MAX_IN_MEMORY_ATTACHMENT_SIZE)
+    attachment_file.write(data)
+    attachment_file.seek(0)
+    return attachment_file
 
 
 def get_utf_string(text, field):
@@ -3362,6 +3376,15 @@ def convert_to_unicode(s):
 
 
 def handle_msg(file_path, file_name, parse_only_headers=False, max_depth=3):
+    """
+    Parses a msg file and the emails attached to it.
+
+    :param file_path: the path of the msg file, or a file-like object of its content
+    :param file_name: the name of the msg file
+    :param parse_only_headers: whether to parse only the headers of the email
+    :param max_depth: the maximal depth of attached emails to parse
+    :return: the email data and the data of the emails attached to it
+    """
     if max_depth == 0:
         return None, []
 
@@ -3414,181 +3437,184 @@ def unfold(s):
     return re.sub(r'[ \t]*[\r\n][ \t\r\n]*', ' ', s).strip(' ')
 
 
-def handle_eml(file_path, b64=False, file_name=None, parse_only_headers=False, max_depth=3):
+def handle_eml(file_path, b64=False, file_name=None, parse_only_headers=False, max_depth=3, file_data=None):
+    """
+    Parses an eml file and the emails attached to it. Attached emails are parsed from memory.
+
+    :param file_path: the path of the eml file, not used if file_data is given
+    :param b64: whether the content of the file is base64 encoded
+    :param file_name: the name of the eml file
+    :param parse_only_headers: whether to parse only the headers of the email
+    :param max_depth: the maximal depth of attached emails to parse
+    :param file_data: the content of the eml file, if it was already read
+    :return: the email data and the data of the emails attached to it
+    """
     global ENCODINGS_TYPES
+    global LAST_ATTACHMENT_NAME
 
     if max_depth == 0:
         return None, []
 
-    with open(file_path, 'rb') as emlFile:
-
-        file_data = emlFile.read()
-        if b64:
-            file_data = b64decode(file_data)
-
-        parser = HeaderParser()
-        headers = parser.parsestr(file_data)
-
-        header_list = []
-        headers_map = {}  # type: dict
-        for item in headers.items():
-            value = unfold(convert_to_unicode(item[1]))
-            item_dict = {
-                "name": item[0],
-                "value": value
-            }
-
-            # old way to map headers
-            header_list.append(item_dict)
-
-            # new way to map headers - dictionary
-            if item[0] in headers_map:
-                # in case there is already such header
-                # then add that header value to value array
-                if not isinstance(headers_map[item[0]], list):
-                    # convert the existing value to array
-                    headers_map[item[0]] = [headers_map[item[0]]]
-
-                # add the new value to the value array
-                headers_map[item[0]].append(value)
-            else:
-                headers_map[item[0]] = value
+    if file_data is None:
+        with open(file_path, 'rb') as emlFile:
+            file_data = emlFile.read()
 
-        eml = message_from_string(file_data)
-        if not eml:
-            raise Exception("Could not parse eml file!")
+    if b64:
+        file_data = b64decode(file_data)
 
-        if parse_only_headers:
-            return {"HeadersMap": headers_map}, []
+    parser = HeaderParser()
+    headers = parser.parsestr(file_data)
 
-        html = ''
-        text = ''
-        attachment_names = []
+    header_list = []
+    headers_map = {}  # type: dict
+    for item in headers.items():
+        value = unfold(convert_to_unicode(item[1]))
+        item_dict = {
+            "name": item[0],
+            "value": value
+        }
 
-        attached_emails = []
-        parts = [eml]
-
-        while parts:
-            part = parts.pop()
-            if (part.is_multipart() or part.get_content_type().startswith('multipart')) \
-                    and "attachment" not in part.get("Content-Disposition", ""):
-                parts += part.get_payload()
-
-            elif part.get_filename() or "attachment" in part.get("Content-Disposition", ""):
-
-                attachment_file_name = convert_to_unicode(part.get_filename())
-                if attachment_file_name is None and part.get('filename'):
-                    attachment_file_name = os.path.normpath(part.get('filename'))
-                    if os.path.isabs(attachment_file_name):
-                        attachment_file_name = os.path.basename(attachment_file_name)
-
-                if "message/rfc822" in part.get("Content-Type", "") \
-                        or ("application/octet-stream" in part.get("Content-Type", "")
-                            and attachment_file_name.endswith(".eml")):
-
-                    # .eml files
-                    file_content = ""  # type: str
-                    base64_encoded = "base64" in part.get("Content-Transfer-Encoding", "")
-
-                    if isinstance(part.get_payload(), list) and len(part.get_payload()) > 0:
-                        if attachment_file_name is None or attachment_file_name == "":
-                            # in case there is no filename for the eml
-                            # we will try to use mail subject as file name
-                            # Subject will be in the email headers
-                            attachment_name = part.get_payload()[0].get('Subject', "no_name_mail_attachment")
-                            attachment_file_name = convert_to_unicode(attachment_name) + '.eml'
-
-                        if base64_encoded:
-                            file_content = b64decode(part.get_payload()[0].as_string())
-                        else:
-                            file_content = part.get_payload()[0].as_string()
-
-                    elif isinstance(part.get_payload(), basestring) and base64_encoded:
-                        file_content = part.get_payload(decode=True)
+        # old way to map headers
+        header_list.append(item_dict)
+
+        # new way to map headers - dictionary
+        if item[0] in headers_map:
+            # in case there is already such header
+            # then add that header value to value array
+            if not isinstance(headers_map[item[0]], list):
+                # convert the existing value to array
+                headers_map[item[0]] = [headers_map[item[0]]]
+
+            # add the new value to the value array
+            headers_map[item[0]].append(value)
+        else:
+            headers_map[item[0]] = value
+
+    eml = message_from_string(file_data)
+    if not eml:
+        raise Exception("Could not parse eml file!")
+
+    if parse_only_headers:
+        return {"HeadersMap": headers_map}, []
+
+    html = ''
+    text = ''
+    attachment_names = []
+
+    attached_emails = []
+    parts = [eml]
+
+    while parts:
+        part = parts.pop()
+        if (part.is_multipart() or part.get_content_type().startswith('multipart')) \
+                and "attachment" not in part.get("Content-Disposition", ""):
+            parts += part.get_payload()
+
+        elif part.get_filename() or "attachment" in part.get("Content-Disposition", ""):
+
+            attachment_file_name = convert_to_unicode(part.get_filename())
+            if attachment_file_name is None and part.get('filename'):
+                attachment_file_name = os.path.normpath(part.get('filename'))
+                if os.path.isabs(attachment_file_name):
+                    attachment_file_name = os.path.basename(attachment_file_name)
+
+            if "message/rfc822" in part.get("Content-Type", "") \
+                    or ("application/octet-stream" in part.get("Content-Type", "")
+                        and attachment_file_name.endswith(".eml")):
+
+                # .eml files
+                file_content = ""  # type: str
+                base64_encoded = "base64" in part.get("Content-Transfer-Encoding", "")
+
+                if isinstance(part.get_payload(), list) and len(part.get_payload()) > 0:
+                    if attachment_file_name is None or attachment_file_name == "":
+                        # in case there is no filename for the eml
+                        # we will try to use mail subject as file name
+                        # Subject will be in the email headers
+                        attachment_name = part.get_payload()[0].get('Subject', "no_name_mail_attachment")
+                        attachment_file_name = convert_to_unicode(attachment_name) + '.eml'
+
+                    if base64_encoded:
+                        file_content = b64decode(part.get_payload()[0].as_string())
                     else:
-                        demisto.debug("found eml attachment with Content-Type=message/rfc822 but has no payload")
-
-                    if file_content:
-                        # save the eml to war room as file entry
-                        demisto.results(fileResult(attachment_file_name, file_content))
-
-                    if file_content and max_depth - 1 > 0:
-                        f = tempfile.NamedTemporaryFile(delete=False)
-                        try:
-                            f.write(file_content)
-                            f.close()
-                            inner_eml, inner_attached_emails = handle_eml(file_path=f.name,
-                                                                          file_name=attachment_file_name,
-                                                                          max_depth=max_depth - 1)
-                            attached_emails.append(inner_eml)
-                            attached_emails.extend(inner_attached_emails)
-                            # if we are outter email is a singed attachment it is a wrapper and we don't return the output of
-                            # this inner email as it will be returned as part of the main result
-                            if 'multipart/signed' not in eml.get_content_type():
-                                return_outputs(readable_output=data_to_md(inner_eml, attachment_file_name, file_name),
-                                               outputs=None)
-                        finally:
-                            os.remove(f.name)
+                        file_content = part.get_payload()[0].as_string()
 
+                elif isinstance(part.get_payload(), basestring) and base64_encoded:
+                    file_content = part.get_payload(decode=True)
                 else:
-                    # .msg and other files (png, jpeg)
-                    if part.is_multipart() and part.get_content_type() == 'message/delivery-status' \
-                            and max_depth - 1 > 0:
-                        # email is DSN
-                        msg = part.get_payload(0).get_payload()  # human-readable section
-                        msg_info = base64.b64decode(msg).decode('utf-8')
-
-                        attached_emails.append(msg_info)
-                        demisto.results(fileResult(attachment_file_name, msg_info))
-                    else:
-                        file_content = part.get_payload(decode=True)
-                        demisto.results(fileResult(attachment_file_name, file_content))
-
-                        if attachment_file_name.endswith(".msg") and max_depth - 1 > 0:
-                            f = tempfile.NamedTemporaryFile(delete=False)
-                            try:
-                                f.write(file_content)
-                                f.close()
-                                inner_msg, inner_attached_emails = handle_msg(f.name, attachment_file_name, False,
-                                                                              max_depth - 1)
-                                attached_emails.append(inner_msg)
-                                attached_emails.extend(inner_attached_emails)
-
-                                # will output the inner email to the UI
-                                return_outputs(
-                                    readable_output=data_to_md(inner_msg, attachment_file_name, file_name),
-                                    outputs=None)
-                            finally:
-                                os.remove(f.name)
-
-                attachment_names.append(attachment_file_name)
-                demisto.setContext('AttachmentName', attachment_file_name)
-
-            elif part.get_content_type() == 'text/html':
-                html = get_utf_string(part.get_payload(decode=True), 'HTML')
-
-            elif part.get_content_type() == 'text/plain':
-                text = get_utf_string(part.get_payload(decode=True), 'TEXT')
-
-        email_data = None
-        # if we are parsing a singed attachment it is a wrapper and we can ignore the outter "email"
-        if 'multipart/signed' not in eml.get_content_type():
-            email_data = {
-                'To': extract_address_eml(eml, 'to'),
-                'CC': extract_address_eml(eml, 'cc'),
-                'From': extract_address_eml(eml, 'from'),
-                'Subject': convert_to_unicode(eml['Subject']),
-                'HTML': convert_to_unicode(html),
-                'Text': convert_to_unicode(text),
-                'Headers': header_list,
-                'HeadersMap': headers_map,
-                'Attachments': ','.join(attachment_names) if attachment_names else '',
-                'AttachmentNames': attachment_names if attachment_names else [],
-                'Format': eml.get_content_type(),
-                'Depth': MAX_DEPTH_CONST - max_depth
-            }
-
-        return email_data, attached_emails
+                    demisto.debug("found eml attachment with Content-Type=message/rfc822 but has no payload")
+
+                if file_content:
+                    # save the eml to war room as file entry
+                    demisto.results(fileResult(attachment_file_name, file_content))
+
+                if file_content and max_depth - 1 > 0:
+                    inner_eml, inner_attached_emails = handle_eml(None,
+                                                                  file_name=attachment_file_name,
+                                                                  max_depth=max_depth - 1,
+                                                                  file_data=file_content)
+                    attached_emails.append(inner_eml)
+                    attached_emails.extend(inner_attached_emails)
+                    # if we are outter email is a singed attachment it is a wrapper and we don't return the output of
+                    # this inner email as it will be returned as part of the main result
+                    if 'multipart/signed' not in eml.get_content_type():
+                        return_outputs(readable_output=data_to_md(inner_eml, attachment_file_name, file_name),
+                                       outputs=None)
+
+            else:
+                # .msg and other files (png, jpeg)
+                if part.is_multipart() and part.get_content_type() == 'message/delivery-status' \
+                        and max_depth - 1 > 0:
+                    # email is DSN
+                    msg = part.get_payload(0).get_payload()  # human-readable section
+                    msg_info = base64.b64decode(msg).decode('utf-8')
+
+                    attached_emails.append(msg_info)
+                    demisto.results(fileResult(attachment_file_name, msg_info))
+                else:
+                    file_content = part.get_payload(decode=True)
+                    demisto.results(fileResult(attachment_file_name, file_content))
+
+                    if attachment_file_name.endswith(".msg") and max_depth - 1 > 0:
+                        with spool_attachment(file_content) as f:
+                            inner_msg, inner_attached_emails = handle_msg(f, attachment_file_name, False,
+                                                                          max_depth - 1)
+                        attached_emails.append(inner_msg)
+                        attached_emails.extend(inner_attached_emails)
+
+                        # will output the inner email to the UI
+                        return_outputs(
+                            readable_output=data_to_md(inner_msg, attachment_file_name, file_name),
+                            outputs=None)
+
+            attachment_names.append(attachment_file_name)
+            LAST_ATTACHMENT_NAME = attachment_file_name
+
+        elif part.get_content_type() == 'text/html':
+            html = get_utf_string(part.get_payload(decode=True), 'HTML')
+
+        elif part.get_content_type() == 'text/plain':
+            text = get_utf_string(part.get_payload(decode=True), 'TEXT')
+
+    email_data = None
+    # if we are parsing a singed attachment it is a wrapper and we can ignore the outter "email"
+    if 'multipart/signed' not in eml.get_content_type():
+        email_data = {
+            'To': extract_address_eml(eml, 'to'),
+            'CC': extract_address_eml(eml, 'cc'),
+            'From': extract_address_eml(eml, 'from'),
+            'Subject': convert_to_unicode(eml['Subject']),
+            'HTML': convert_to_unicode(html),
+            'Text': convert_to_unicode(text),
+            'Headers': header_list,
+            'HeadersMap': headers_map,
+            'Attachments': ','.join(attachment_names) if attachment_names else '',
+            'AttachmentNames': attachment_names if attachment_names else [],
+            'Format': eml.get_content_type(),
+            'Depth': MAX_DEPTH_CONST - max_depth
+        }
+
+    return email_data, attached_emails
 
 
 def create_email_output(email_data, attached_emails):
@@ -3616,6 +3642,8 @@ def main():
     # not the best way to do it
     global MAX_DEPTH_CONST
     MAX_DEPTH_CONST = max_depth
+    global LAST_ATTACHMENT_NAME
+    LAST_ATTACHMENT_NAME = None
 
     if max_depth < 1:
         return_error('Minimum max_depth is 1, the script will parse just the top email')
@@ -3661,7 +3689,8 @@ def main():
 
                 if 'Content-Type:'.lower() in file_contents.lower():
                     email_data, attached_emails = handle_eml(file_path, b64=False, file_name=file_name,
-                                                             parse_only_headers=parse_only_headers, max_depth=max_depth)
+                                                             parse_only_headers=parse_only_headers, max_depth=max_depth,
+                                                             file_data=file_contents)
                     output = create_email_output(email_data, attached_emails)
                 else:
                     # Try a base64 decode
@@ -3669,7 +3698,7 @@ def main():
                     if 'Content-Type:'.lower() in file_contents.lower():
                         email_data, attached_emails = handle_eml(file_path, b64=True, file_name=file_name,
                                                                  parse_only_headers=parse_only_headers,
-                                                                 max_depth=max_depth)
+                                                                 max_depth=max_depth, file_data=file_contents)
                         output = create_email_output(email_data, attached_emails)
                     else:
                         return_error("Could not extract email from file. Base64 decode did not include rfc 822 strings")
@@ -3679,6 +3708,9 @@ def main():
                              .format(str(e), traceback.format_exc()))
         else:
             return_error("Unknown file format: [{}] for file: [{}]".format(file_type, file_name))
+        if LAST_ATTACHMENT_NAME is not None:
+            # set once for the whole file, with the attachment that was set last when parsing it
+            demisto.setContext('AttachmentName', LAST_ATTACHMENT_NAME)
         output = recursive_convert_to_unicode(output)
         email = output  # output may be a single email
         if isinstance(output, list) and len(output) > 0:
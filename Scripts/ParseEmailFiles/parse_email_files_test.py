@@ -398,6 +398,50 @@ def test_eml_contains_base64_encoded_eml(mocker, email_file):
     assert results[0]['EntryContext']['Email'][1]['Depth'] == 1
 
 
+@pytest.mark.parametrize('email_file, max_in_memory_size', [('DONT_OPEN-MALICIOS.eml', 10 * 1024 * 1024),
+                                                            ('eml_contains_base64_eml.eml', 10 * 1024 * 1024),
+                                                            ('eml_contains_msg.eml', 10 * 1024 * 1024),
+                                                            ('eml_contains_msg.eml', 1024)])
+def test_attached_emails_parsed_in_memory(mocker, email_file, max_in_memory_size):
+    """
+    Given
+        - an eml file with an attached eml or msg email, which is smaller or bigger than the in memory size limit
+    When
+        - parsing the file
+    Then
+        - the attached email is parsed without writing it to a named temporary file
+        - the attachment name is set to the context once
+    """
+    import tempfile
+    import ParseEmailFiles
+    spooled_files = []
+
+    def spooled_temporary_file(*args, **kwargs):
+        spooled_files.append(SpooledTemporaryFile(*args, **kwargs))
+        return spooled_files[-1]
+
+    SpooledTemporaryFile = tempfile.SpooledTemporaryFile
+    mocker.patch.object(ParseEmailFiles, 'MAX_IN_MEMORY_ATTACHMENT_SIZE', max_in_memory_size)
+    mocker.patch.object(tempfile, 'NamedTemporaryFile', side_effect=AssertionError('temporary file was created'))
+    mocker.patch.object(tempfile, 'SpooledTemporaryFile', side_effect=spooled_temporary_file)
+    mocker.patch.object(demisto, 'args', return_value={'entryid': 'test'})
+    mocker.patch.object(demisto, 'executeCommand', side_effect=exec_command_for_file(email_file))
+    mocker.patch.object(demisto, 'results')
+    mocker.patch.object(demisto, 'setContext')
+
+    main()
+    results = demisto.results.call_args[0]
+    assert results[0]['Type'] == entryTypes['note']
+    emails = results[0]['EntryContext']['Email']
+    assert emails[1]['Depth'] == 1
+    assert demisto.setContext.call_count == 1
+    assert demisto.setContext.call_args[0] == ('AttachmentName', emails[0]['AttachmentNames'][-1])
+    if email_file.endswith('msg.eml'):
+        # the attached msg is parsed from a spooled file, which is written to disk only when it is too big
+        assert len(spooled_files) == 1
+        assert spooled_files[0]._rolled == (max_in_memory_size < 1024 * 1024)
+
+
 # check that we parse an email with "data" type and eml extension
 @pytest.mark.parametrize('file_info', ['data', 'data\n'])
 def test_eml_data_type(mocker, file_info):
@@ -3,7 +3,9 @@ from CommonServerPython import *
 from CommonServerUserPython import *
 import zlib
 import pyshark
+from collections import deque, OrderedDict
 from datetime import datetime
+from itertools import islice
 import re
 
 # Used to convert pyshark keys to Demisto's conventions
@@ -40,6 +42,9 @@ PYSHARK_RES_TO_DEMISTO = {
     "http.content_encoding": "HttpContentEncoding",
 }
 
+# Maximal number of packets kept in memory while waiting for their request/response pair
+MAX_PENDING_PACKETS = 10000
+
 
 def _file_has_extension(file_name, extensions):
     """
@@ -115,25 +120,6 @@ def get_entry_from_args():
     return res, entry_id
 
 
-def _chunker(seq, size):
-    """
-    Function that groups items in a sequence for easier iteration of multiple items at once.
-
-    :param seq: the sequence (list/generator)
-    :param size: the size of the group (chunk)
-    :return: an iterator that outputs groups of items (chunks) from the sequence
-    """
-    ret = []
-    for i in range(0, len(seq), size):
-        chunk = seq[i: i + size]
-
-        # Make sure the chunks are with a specified size
-        padding = ["" for j in range(size - len(chunk))]
-        ret.append(chunk + padding)
-
-    return iter(ret)
-
-
 def decode_gzip(str_compressed):
     """
     Decode a hex string with gz decompression
@@ -155,80 +141,93 @@ def _date_to_ISO(strdate):
     return datetime.strptime(strdate, '%a, %d %b %Y %H:%M:%S %Z').isoformat()
 
 
-def get_next_matching_index(http_packets, tcp_src, tcp_dst, ip_src, ip_dst):
-    for i, p in enumerate(http_packets):
-        if p["TCP"].srcport == tcp_dst and \
-                p["TCP"].dstport == tcp_src and \
-                p["IP"].src == ip_dst and \
-                p["IP"].dst == ip_src:
-            return i
-    return None
+def _flow_direction(packet):
+    """
+    Get the direction of a packet in its TCP stream.
+
+    :param packet: a pyshark packet
+    :return: tcp stream index, ip source address and tcp source port
+    """
+    return packet["TCP"].stream, packet["IP"].src, packet["TCP"].srcport
 
 
-def fix_order(http_packets):
+def _reverse_flow_direction(packet):
     """
-    Re-organizes the http packets to be request-response pairs.
-    Sometimes pyshark doesn't put the packets in the order they are HTTP-wise.
-    So we are re-organizing them according to the tcp and ip information of the packets.
-    :param http_packets:
-    :return: http_packets
+    Get the direction opposite to the packet's direction in its TCP stream.
+
+    :param packet: a pyshark packet
+    :return: tcp stream index, ip destination address and tcp destination port
+    """
+    return packet["TCP"].stream, packet["IP"].dst, packet["TCP"].dstport
+
+
+def _pop_waiting_packet(waiting, direction):
+    """
+    Pop the earliest packet waiting in a direction, and forget the direction once no packets are waiting in it.
+
+    :param waiting: the queues of waiting packets by their direction
+    :param direction: the direction to pop a packet from
+    :return: the earliest packet waiting in the direction
+    """
+    packets = waiting[direction]
+    packet = packets.popleft()
+    if not packets:
+        del waiting[direction]
+    return packet
+
+
+def pair_http_packets(http_packets, max_pending=MAX_PENDING_PACKETS):
     """
-    new_order = []
+    Pairs the http packets to request-response pairs, yielding each pair as soon as it is complete.
+    Sometimes pyshark doesn't put the packets in the order they are HTTP-wise.
+    So each packet is paired with the earliest unpaired packet sent the opposite way in the same TCP stream.
+    Packets left unpaired are yielded without a response once the capture ends, or once more than
+    max_pending packets are waiting, so the memory used doesn't depend on the capture size.
 
-    # For each packet find the next one that matches the tcp,ip tuple.
-    while len(http_packets) > 0:
-        packet = http_packets[0]
-        tcp_src = packet["TCP"].srcport
-        tcp_dst = packet["TCP"].dstport
-        ip_src = packet["IP"].src
-        ip_dst = packet["IP"].dst
-        new_order.append(packet)
-        del http_packets[0]
+    :param http_packets: an iterable of http packets
+    :param max_pending: the maximal number of packets waiting for their pair
+    :return: a generator of (request, response) tuples
+    """
+    waiting = {}  # type: dict
+    # The waiting packets by their order in the capture, to evict the oldest one first
+    pending = OrderedDict()  # type: OrderedDict
+
+    for packet in http_packets:
+        reverse_direction = _reverse_flow_direction(packet)
+        if reverse_direction in waiting:
+            request = _pop_waiting_packet(waiting, reverse_direction)
+            del pending[id(request)]
+            yield request, packet
+            continue
 
-        next_matching_index = get_next_matching_index(http_packets, tcp_src, tcp_dst, ip_src, ip_dst)
-        if next_matching_index is None:
-            new_order.append(None)
-        else:
-            new_order.append(http_packets[next_matching_index])
-            del http_packets[next_matching_index]
+        waiting.setdefault(_flow_direction(packet), deque()).append(packet)
+        pending[id(packet)] = packet
+        if len(pending) > max_pending:
+            _, oldest = pending.popitem(last=False)
+            _pop_waiting_packet(waiting, _flow_direction(oldest))
+            yield oldest, None
 
-    return new_order
+    for packet in pending.values():
+        yield packet, None
 
 
 def get_http_flows(pcap_file_path):
     """
-    Return a list of HTTP requests/responses from pcap file
+    Return a generator of HTTP requests/responses from pcap file.
+    The packets are streamed from the capture, so only the packets waiting for their pair are kept in memory.
 
     :param pcap_file_path:
-    :return: list of requests/response pairs.
+    :return: generator of requests/response pairs.
     """
-    capture_object = pyshark.FileCapture(pcap_file_path, display_filter='tcp')
-
-    # Filter all non HTTP packets
-    http_packets = [p for p in capture_object if "HTTP" in p]
-
-    http_packets = fix_order(http_packets)
-
-    # Construct request <> response dicts
-    http_flows = []
-    for req, res in _chunker(http_packets, 2):
-        # GZ decompress if needed
-        # if res["HTTP"].get_field_value("Content-Encoding") == "gzip":
-        #
-        #     # Fix data not existing
-        #     if not hasattr(res["HTTP"], "data"):
-        #         res["HTTP"].data = res["HTTP"].get("file_data")
-        #     # else:
-        #         # try:
-        #         #     res["HTTP"].data = decode_gzip(res["HTTP"].data)
-        #         # except zlib.error:
-        #         #     res["HTTP"].data = "Couldn't decompress gzip data (incomplete or truncated stream)."
-
-        http_flows.append({
-            "Request": req,
-            "Response": res
-        })
-    return http_flows
+    capture_object = pyshark.FileCapture(pcap_file_path, display_filter='http', keep_packets=False)
+    try:
+        for req, res in pair_http_packets(p for p in capture_object if "HTTP" in p):
+            yield {
+                "Request": req,
+                "Response": res
+            }
+    finally:
+        capture_object.close()
 
 
 def get_flow_info(http_flow):
@@ -385,14 +384,10 @@ if __name__ == "builtins":
     else:
         ALLOWED_CONTENT_TYPES = tuple(demisto.args()["allowedContentTypes"].split(","))  # type: ignore
 
-    # Work on the pcap file and return a result
-    http_flows = get_http_flows(pcap_file_path_in_container)
-
-    # Cut results according to the user args (times 2, because we are working on pairs of requests and responses).
-    if START:
-        http_flows = http_flows[int(START):]
-    if LIMIT:
-        http_flows = http_flows[:int(LIMIT)]
+    # Work on the pcap file and return a result, reading the capture only up to the requested flows
+    start_index = int(START) if START else 0
+    stop_index = start_index + int(LIMIT) if LIMIT else None
+    http_flows = list(islice(get_http_flows(pcap_file_path_in_container), start_index, stop_index))
 
     # Format and get output representation of the flows
     formatted_http_flows = format_http_flows(http_flows, PYSHARK_RES_TO_DEMISTO, LIMIT_DATA, ALLOWED_CONTENT_TYPES)
@@ -0,0 +1,80 @@
+from collections import deque
+
+from PcapHTTPExtractor import pair_http_packets, _pop_waiting_packet
+
+
+class LayerStandIn(object):
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+
+class PacketStandIn(object):
+    def __init__(self, name, stream, src, srcport, dst, dstport):
+        self.name = name
+        self.layers = {
+            'TCP': LayerStandIn(stream=stream, srcport=srcport, dstport=dstport),
+            'IP': LayerStandIn(src=src, dst=dst)
+        }
+
+    def __getitem__(self, layer):
+        return self.layers[layer]
+
+
+def request(name, stream):
+    return PacketStandIn(name, stream, '10.0.0.1', str(50000 + int(stream)), '10.0.0.2', '80')
+
+
+def response(name, stream):
+    return PacketStandIn(name, stream, '10.0.0.2', '80', '10.0.0.1', str(50000 + int(stream)))
+
+
+def names(pairs):
+    return [(req.name, res.name if res else None) for req, res in pairs]
+
+
+def test_pair_http_packets():
+    """
+    Given:
+        Pipelined requests in one TCP stream, interleaved with a request and response of another stream.
+    When:
+        Pairing the packets.
+    Then:
+        Ensure each response is paired with the earliest request of its stream, and unpaired packets come last.
+    """
+    packets = [request('req1', '1'), request('req2', '1'), request('req3', '2'), response('res1', '1'),
+               response('res3', '2'), response('res2', '1'), request('req4', '2')]
+
+    assert names(pair_http_packets(packets)) == [('req1', 'res1'), ('req3', 'res3'), ('req2', 'res2'), ('req4', None)]
+
+
+def test_pair_http_packets_eviction():
+    """
+    Given:
+        More unpaired requests than the maximal number of pending packets.
+    When:
+        Pairing the packets.
+    Then:
+        Ensure the oldest request is yielded without a response once the limit is exceeded,
+        and a late response to it is not paired with another request.
+    """
+    packets = [request('req1', '1'), request('req2', '2'), request('req3', '3'), response('res2', '2'),
+               response('res1', '1')]
+    expected = [('req1', None), ('req2', 'res2'), ('req3', None), ('res1', None)]
+
+    assert names(pair_http_packets(packets, max_pending=2)) == expected
+
+
+def test_pop_waiting_packet():
+    """
+    Given:
+        Packets waiting in a direction.
+    When:
+        Popping all of them.
+    Then:
+        Ensure they are popped in order and the direction is removed once it has no waiting packets.
+    """
+    waiting = {('1', '10.0.0.1', '50001'): deque(['req1', 'req2'])}
+
+    assert _pop_waiting_packet(waiting, ('1', '10.0.0.1', '50001')) == 'req1'
+    assert _pop_waiting_packet(waiting, ('1', '10.0.0.1', '50001')) == 'req2'
+    assert waiting == {}
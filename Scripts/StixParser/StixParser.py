@@ -1,8 +1,8 @@
 import demistomock as demisto
 from CommonServerPython import *
+import io
 import json
 import re
-import tempfile
 from datetime import datetime
 
 from stix.core import STIXPackage
@@ -18,6 +18,10 @@ PATTERNS_DICT = {
     "registry-key:key": "Registry Path Reputation",
     "user-account": "Username"
 }
+# Matches the `<object path> = '<value>'` comparisons of a STIX2 pattern
+COMPARISON_REGEX = re.compile("(\\w.*?) = '(.*?)'")
+# Matches any of the PATTERNS_DICT keys in an object path, to get the indicator type of a comparison in one search
+INDICATOR_TYPE_REGEX = re.compile("|".join(re.escape(key) for key in PATTERNS_DICT))
 
 """ HELPER FUNCTIONS"""
 
@@ -218,20 +222,14 @@ def get_indicators(indicators):
         """
         pattern = stix_indicator.get("pattern")
         if pattern:
-            groups = regex.findall(pattern)
-            if groups:
-                for key, value in PATTERNS_DICT.items():
-                    for term in groups:
-                        '''
-                        term should be list with 2 argument parsed with regex
-                        [`pattern`, `indicator`]
-                        '''
-                        if len(term) == 2 and key in term[0]:
-                            new_indicator = term[1]
-                            if value in ("IP", "URL", "Domain"):
-                                new_indicator = ip_parser(new_indicator)
-                            patterns_lists[value].append(new_indicator)
-                            entries_dict[new_indicator] = stix_indicator
+            for object_path, new_indicator in COMPARISON_REGEX.findall(pattern):
+                type_match = INDICATOR_TYPE_REGEX.search(object_path)
+                if type_match:
+                    value = PATTERNS_DICT[type_match.group()]
+                    if value in ("IP", "URL", "Domain"):
+                        new_indicator = ip_parser(new_indicator)
+                    patterns_lists[value].append(new_indicator)
+                    entries_dict[new_indicator] = stix_indicator
         # Handle CVE
         elif stix_indicator.get("description") == "cve cvss score":
             new_indicator = stix_indicator.get("name")
@@ -239,7 +237,6 @@ def get_indicators(indicators):
                 patterns_lists["CVE CVSS Score"].append(new_indicator)
                 entries_dict[new_indicator] = stix_indicator
 
-    regex = re.compile("(\\w.*?) = '(.*?)'")
     patterns_lists = {
         "File": list(),
         "IP": list(),
@@ -324,7 +321,7 @@ def stix2_to_demisto(stx_obj):
     elif isinstance(stx_obj, list):
         for obj in stx_obj:
             indicators, indicators_dict = extract_indicators(obj)
-            entry = build_entry(obj, indicators, obj.get("id"))
+            entry = build_entry(indicators, indicators_dict, obj.get("id"))
             if entry:
                 if isinstance(entry, list):
                     data.extend(entry)
@@ -351,10 +348,7 @@ def main():
     if stx:
         stix2_to_demisto(stx)
     else:
-        with tempfile.NamedTemporaryFile() as temp:
-            temp.write(demisto.args()["iocXml"].encode("utf-8"))
-            temp.flush()
-            stix_package = STIXPackage.from_xml(temp.name)
+        stix_package = STIXPackage.from_xml(io.BytesIO(txt))
         data = list()  # type: list
         i = 0
 
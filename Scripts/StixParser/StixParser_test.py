@@ -233,3 +233,46 @@ def test_dict_no_stix(mocker):
     finally:
         if not is_exception:
             pytest.fail("System error not thrown!")
+
+
+def test_get_indicators_multiple_comparisons():
+    """
+    Given
+        - a STIX2 indicator which pattern compares several objects of different types
+    When
+        - extracting the indicators
+    Then
+        - each value is added to the list of its type, in the order of the pattern
+    """
+    from StixParser import get_indicators
+    stix_indicator = {
+        "id": "indicator--1",
+        "pattern": "[ipv4-addr:value = 'ip-1-1-1-1' OR url:value = 'http://example.com' OR "
+                   "file:hashes.'SHA-256' = 'abcd' OR email-addr:value = 'a@example.com' OR "
+                   "ipv4-addr:value = '2.2.2.2' OR x-custom:value = 'ignored']"
+    }
+    output, stix_objects = get_indicators([stix_indicator])
+    assert output["IP"] == ["1.1.1.1", "2.2.2.2"]
+    assert output["URL"] == ["http://example.com"]
+    assert output["File"] == ["abcd"]
+    assert output["Email"] == ["a@example.com"]
+    assert "ignored" not in stix_objects
+    assert stix_objects["1.1.1.1"] is stix_indicator
+
+
+def test_stix2_to_demisto_list_of_bundles(mocker):
+    """
+    Given
+        - a list of STIX2 bundles
+    When
+        - converting them to Demisto indicators
+    Then
+        - the indicators of all the bundles are returned, each with the ID of its bundle
+    """
+    from StixParser import stix2_to_demisto
+    stix_input, _ = _get_stix()
+    bundle_results = json.loads(_get_results_from_demisto(stix_input, stix2_to_demisto, mocker))
+    other_bundle = dict(stix_input, id="bundle--other")
+    results = json.loads(_get_results_from_demisto([stix_input, other_bundle], stix2_to_demisto, mocker))
+    assert len(results) == 2 * len(bundle_results)
+    assert {result["CustomFields"]["stixPackageId"] for result in results} == {stix_input["id"], "bundle--other"}